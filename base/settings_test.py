@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/3.0/ref/settings/
 import os
 import dj_database_url
 
+from catalog.db import use_pool
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -44,6 +46,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "catalog.middleware.QueryTimingMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -51,6 +54,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "catalog.middleware.ReplicaRoutingMiddleware",
 ]
 
 ROOT_URLCONF = "base.urls"
@@ -91,6 +95,68 @@ DATABASES = {
     }
 }
 
+# Set DB_POOL_SIZE to keep up to that many database connections per worker
+# process in a pool (see catalog/db/pool.py) instead of one per thread.
+if os.environ.get("DB_POOL_SIZE"):
+    use_pool(DATABASES["default"], MAX_SIZE=int(os.environ["DB_POOL_SIZE"]))
+
+# Read replicas for the read-only catalog pages (catalog.routers). Every
+# comma-separated URL in DATABASE_REPLICA_URLS becomes a "replicaN" alias.
+# To try it locally with two SQLite files, copy db.sqlite3 to replica.sqlite3
+# and set DATABASE_REPLICA_URLS=sqlite:////absolute/path/to/replica.sqlite3.
+CATALOG_REPLICAS = []
+for number, url in enumerate(
+    filter(None, os.environ.get("DATABASE_REPLICA_URLS", "").split(",")), 1
+):
+    alias = "replica%s" % number
+    DATABASES[alias] = dj_database_url.parse(url, conn_max_age=500)
+    DATABASES[alias]["TEST"] = {"MIRROR": "default"}
+    CATALOG_REPLICAS.append(alias)
+# "round-robin", or "least-lag" to prefer the replica furthest along, skipping
+# any more than CATALOG_REPLICA_MAX_LAG seconds behind (lag is re-measured
+# every CATALOG_REPLICA_LAG_TTL seconds).
+CATALOG_REPLICA_SELECTION = os.environ.get("CATALOG_REPLICA_SELECTION", "round-robin")
+CATALOG_REPLICA_MAX_LAG = 30
+CATALOG_REPLICA_LAG_TTL = 5
+CATALOG_REPLICA_VIEWS = [
+    "index",
+    "books",
+    "book-detail",
+    "authors",
+    "author-detail",
+    "genres",
+    "genre-detail",
+    "languages",
+    "language-detail",
+]
+# How long a client reads from the primary after a POST (read-your-writes).
+CATALOG_REPLICA_PIN_SECONDS = 10
+
+DATABASE_ROUTERS = ["catalog.routers.ReplicaRouter"]
+
+# Cache
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "DJANGO_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.environ.get("DJANGO_CACHE_LOCATION", "libraryapp"),
+    }
+}
+
+# Cache alias and lifetime (in seconds) of rendered book/author detail
+# fragments. Entries are invalidated by version bumps, the timeout only
+# reclaims space.
+CATALOG_CACHE = "default"
+CATALOG_FRAGMENT_TIMEOUT = 60 * 60 * 24
+# ISBN lookups are also kept in a per-process LRU, which can answer for up to
+# CATALOG_ISBN_LRU_TTL seconds after another process changed the book.
+CATALOG_ISBN_LRU_SIZE = 10000
+CATALOG_ISBN_LRU_TTL = 2
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
@@ -132,3 +198,35 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedStaticFilesStorage"
 
 
 LOGIN_REDIRECT_URL = "/"
+
+
+# Catalog list views page with keyset cursors by default; set to "offset" to
+# fall back to Django's numbered pages.
+CATALOG_PAGINATION = os.environ.get("CATALOG_PAGINATION", "keyset")
+
+# Unfiltered list pages of tables with at least this many rows take the row
+# count from planner statistics (pg_class / sqlite_stat1) instead of COUNT(*).
+CATALOG_ESTIMATED_COUNT_THRESHOLD = 100000
+
+# Text search configuration used for the PostgreSQL catalog search vector.
+CATALOG_SEARCH_CONFIG = os.environ.get("CATALOG_SEARCH_CONFIG", "simple")
+
+# Where the home page keeps its visit counter: "cookie" (a signed cookie, no
+# database write per hit) or "session".
+CATALOG_VISIT_COUNTER = os.environ.get("CATALOG_VISIT_COUNTER", "cookie")
+
+# Serve the home, book detail and author detail pages with the async views in
+# catalog.async_views, which run their independent queries concurrently.
+# base/asgi.py turns this on; under WSGI the sync views are faster.
+CATALOG_ASYNC_VIEWS = bool(os.environ.get("CATALOG_ASYNC_VIEWS", ""))
+
+# Per-request query/template timing (Server-Timing headers, "catalog.instrumentation"
+# log lines, percentiles via `manage.py catalog_timings`). Off by default.
+CATALOG_INSTRUMENTATION = bool(os.environ.get("CATALOG_INSTRUMENTATION", ""))
+CATALOG_INSTRUMENTATION_WINDOW = 1000
+CATALOG_INSTRUMENTATION_FLUSH_EVERY = 50
+
+# Fines charged by `manage.py process_overdue` per day a loan is overdue, and
+# the most a single loan can accrue.
+CATALOG_OVERDUE_FINE_PER_DAY = "0.25"
+CATALOG_OVERDUE_FINE_CAP = "10.00"
@@ -0,0 +1,278 @@
+"""
+In-process WSGI/ASGI load driver.
+
+Requests are built as WSGI environ dicts (or ASGI scopes) and handed straight
+to Django's WSGIHandler (or ASGIHandler), so a run measures the full
+middleware/view/template/database stack without a network or an application
+server in the way.
+"""
+import io
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.urls import reverse
+from django.utils.module_loading import import_string
+
+from catalog.instrumentation import percentile
+from catalog.models import Author, Book
+
+from .generate import LIBRARIAN
+
+# (name, weight, needs a logged-in librarian, url factory)
+MIX = (
+    ("index", 10, False, lambda ids, rng: reverse("index")),
+    ("books", 15, False, lambda ids, rng: reverse("books")),
+    (
+        "book-detail",
+        20,
+        False,
+        lambda ids, rng: reverse("book-detail", args=[rng.choice(ids["books"])]),
+    ),
+    ("authors", 8, False, lambda ids, rng: reverse("authors")),
+    (
+        "author-detail",
+        10,
+        False,
+        lambda ids, rng: reverse("author-detail", args=[rng.choice(ids["authors"])]),
+    ),
+    (
+        "search",
+        10,
+        False,
+        lambda ids, rng: "%s?q=%s" % (reverse("search"), rng.choice(ids["words"])),
+    ),
+    ("api-books", 5, False, lambda ids, rng: reverse("api-books")),
+    (
+        "api-book-detail",
+        5,
+        False,
+        lambda ids, rng: reverse("api-book-detail", args=[rng.choice(ids["books"])]),
+    ),
+    (
+        "api-book-availability",
+        5,
+        False,
+        lambda ids, rng: reverse(
+            "api-book-availability", args=[rng.choice(ids["books"])]
+        ),
+    ),
+    (
+        "isbn-lookup",
+        5,
+        False,
+        lambda ids, rng: reverse("isbn-lookup", args=[rng.choice(ids["isbns"])]),
+    ),
+    ("my-borrowed", 6, True, lambda ids, rng: reverse("my-borrowed")),
+    ("all-borrowed", 6, True, lambda ids, rng: reverse("all-borrowed")),
+)
+
+
+def login_cookie(username=LIBRARIAN):
+    user = User.objects.get(username=username)
+    session = import_string(settings.SESSION_ENGINE).SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.save()
+    return "%s=%s" % (settings.SESSION_COOKIE_NAME, session.session_key)
+
+
+def environ(url, cookie=None):
+    parts = urlsplit(url)
+    env = {
+        "REQUEST_METHOD": "GET",
+        "SCRIPT_NAME": "",
+        "PATH_INFO": parts.path,
+        "QUERY_STRING": parts.query,
+        "SERVER_NAME": "benchmark",
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "HTTP_HOST": "benchmark",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": "http",
+        "wsgi.input": io.BytesIO(),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    if cookie:
+        env["HTTP_COOKIE"] = cookie
+    return env
+
+
+def scope(url, cookie=None):
+    parts = urlsplit(url)
+    headers = [(b"host", b"benchmark")]
+    if cookie:
+        headers.append((b"cookie", cookie.encode()))
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": parts.path,
+        "raw_path": parts.path.encode(),
+        "query_string": parts.query.encode(),
+        "root_path": "",
+        "headers": headers,
+        "client": ("127.0.0.1", 0),
+        "server": ("benchmark", 80),
+    }
+
+
+def simulate_db_latency(seconds):
+    """Delay every query by ``seconds``, as if the database were further away."""
+
+    def delay(execute, sql, params, many, context):
+        time.sleep(seconds)
+        return execute(sql, params, many, context)
+
+    def install(sender, connection, **kwargs):
+        # The wrapper list outlives reconnects, so only add the delay once.
+        if delay not in connection.execute_wrappers:
+            connection.execute_wrappers.append(delay)
+
+    for alias in connections:
+        install(None, connections[alias])
+    connection_created.connect(install, weak=False)
+
+
+class LoadDriver:
+    def __init__(
+        self,
+        requests=1000,
+        concurrency=1,
+        warmup=50,
+        seed=0,
+        mix=MIX,
+        interface="wsgi",
+    ):
+        self.requests = requests
+        self.concurrency = concurrency
+        self.warmup = warmup
+        self.seed = seed
+        self.mix = mix
+        self.interface = interface
+        if interface == "asgi":
+            self.handler = ASGIHandler()
+            self.call = async_to_sync(self.call_asgi)
+        else:
+            self.handler = WSGIHandler()
+        self.lock = threading.Lock()
+
+    def load_ids(self):
+        words = set()
+        for title in Book.objects.values_list("title", flat=True)[:500]:
+            words.update(title.lower().split())
+        return {
+            "books": list(Book.objects.values_list("pk", flat=True)),
+            "isbns": list(Book.objects.values_list("isbn", flat=True)[:1000]),
+            "authors": list(Author.objects.values_list("pk", flat=True)),
+            "words": sorted(words) or ["book"],
+        }
+
+    def plan(self, count, rng, ids):
+        names = [entry for entry in self.mix]
+        weights = [entry[1] for entry in self.mix]
+        return [
+            (name, login, make_url(ids, rng))
+            for name, _, login, make_url in rng.choices(names, weights, k=count)
+        ]
+
+    def call(self, url, cookie):
+        status = []
+
+        def start_response(status_line, headers, exc_info=None):
+            status.append(int(status_line.split(" ", 1)[0]))
+
+        started = time.perf_counter()
+        response = self.handler(environ(url, cookie), start_response)
+        try:
+            for _ in response:
+                pass
+        finally:
+            response.close()
+        return status[0], time.perf_counter() - started
+
+    async def call_asgi(self, url, cookie):
+        status = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                status.append(message["status"])
+
+        started = time.perf_counter()
+        await self.handler(scope(url, cookie), receive, send)
+        return status[0], time.perf_counter() - started
+
+    def run(self):
+        rng = random.Random(self.seed)
+        ids = self.load_ids()
+        cookie = login_cookie()
+        warmup = self.plan(self.warmup, rng, ids)
+        requests = self.plan(self.requests, rng, ids)
+
+        for name, login, url in warmup:
+            self.call(url, cookie if login else None)
+
+        samples = defaultdict(list)
+        errors = defaultdict(int)
+
+        def work(request):
+            name, login, url = request
+            status, elapsed = self.call(url, cookie if login else None)
+            with self.lock:
+                samples[name].append(elapsed)
+                if status >= 400:
+                    errors[name] += 1
+
+        started = time.perf_counter()
+        if self.concurrency > 1:
+            with ThreadPoolExecutor(self.concurrency) as pool:
+                list(pool.map(work, requests))
+        else:
+            for request in requests:
+                work(request)
+        duration = time.perf_counter() - started
+
+        all_samples = [value for values in samples.values() for value in values]
+        endpoints = {
+            name: self.summarize(values, errors[name], duration)
+            for name, values in sorted(samples.items())
+        }
+        return {
+            "duration_s": round(duration, 3),
+            "total": self.summarize(all_samples, sum(errors.values()), duration),
+            "endpoints": endpoints,
+        }
+
+    @staticmethod
+    def summarize(values, errors, duration):
+        millis = [value * 1000 for value in values]
+        return {
+            "requests": len(values),
+            "errors": errors,
+            "throughput_rps": round(len(values) / duration, 2) if duration else 0.0,
+            "mean_ms": round(sum(millis) / len(millis), 3) if millis else 0.0,
+            "p50_ms": round(percentile(millis, 0.50), 3),
+            "p95_ms": round(percentile(millis, 0.95), 3),
+            "p99_ms": round(percentile(millis, 0.99), 3),
+        }
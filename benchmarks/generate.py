@@ -0,0 +1,149 @@
+import datetime
+import random
+
+from django.contrib.auth.models import Permission, User
+from django.contrib.auth.hashers import make_password
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.db import connection, transaction
+
+from catalog import search
+from catalog.isbn import isbn13_check_digit
+from catalog.models import Author, Book, BookInstance, CatalogStats, Genre, Language
+
+GENRES = ("Fantasy", "Science Fiction", "Mystery", "History", "Poetry", "Drama")
+LANGUAGES = ("English", "Spanish", "French", "German")
+WORDS = (
+    "shadow wind river stone glass winter harbor crown empire garden lantern "
+    "silence orchard machine ocean tower letter mountain fire archive"
+).split()
+
+LIBRARIAN = "librarian"
+PASSWORD = "benchmark"
+
+
+def isbn13(prefix):
+    return prefix + isbn13_check_digit(prefix)
+
+
+def title(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))).title()
+
+
+@transaction.atomic
+def generate(
+    authors=200,
+    books_per_author=5,
+    copies_per_book=3,
+    users=50,
+    loans=0.3,
+    seed=0,
+    batch_size=1000,
+):
+    """
+    Replace the contents of the database with a deterministic catalog: the
+    same arguments and seed always produce the same rows, so runs on
+    different commits are comparable.
+    """
+    rng = random.Random(seed)
+    call_command("flush", interactive=False, verbosity=0)
+
+    Language.objects.bulk_create(Language(name=name) for name in LANGUAGES)
+    languages = list(Language.objects.order_by("id"))
+    Genre.objects.bulk_create(Genre(name=name) for name in GENRES)
+    genres = list(Genre.objects.order_by("id"))
+
+    Author.objects.bulk_create(
+        (
+            Author(
+                first_name=rng.choice(WORDS).title(),
+                last_name="%s %05d" % (rng.choice(WORDS).title(), i),
+                date_of_birth=datetime.date(1900, 1, 1)
+                + datetime.timedelta(days=rng.randint(0, 365 * 90)),
+            )
+            for i in range(authors)
+        ),
+        batch_size=batch_size,
+    )
+    author_ids = list(Author.objects.order_by("id").values_list("id", flat=True))
+
+    Book.objects.bulk_create(
+        (
+            Book(
+                title=title(rng),
+                summary=" ".join(rng.choice(WORDS) for _ in range(30)),
+                isbn=isbn13("978%09d" % (i * books_per_author + j)),
+                author_id=author_id,
+                language=rng.choice(languages),
+            )
+            for i, author_id in enumerate(author_ids)
+            for j in range(books_per_author)
+        ),
+        batch_size=batch_size,
+    )
+    book_ids = list(Book.objects.order_by("id").values_list("id", flat=True))
+
+    Through = Book.genre.through
+    Through.objects.bulk_create(
+        (
+            Through(book_id=book_id, genre_id=genre.pk)
+            for book_id in book_ids
+            for genre in rng.sample(genres, rng.randint(1, 3))
+        ),
+        batch_size=batch_size,
+    )
+
+    password = make_password(PASSWORD)
+    User.objects.bulk_create(
+        (User(username="reader%05d" % i, password=password) for i in range(users)),
+        batch_size=batch_size,
+    )
+    librarian = User.objects.create(
+        username=LIBRARIAN, password=password, is_staff=True
+    )
+    librarian.user_permissions.set(
+        Permission.objects.filter(
+            codename__in=("can_mark_returned", "can_export_catalog")
+        )
+    )
+    user_ids = list(User.objects.order_by("id").values_list("id", flat=True))
+
+    today = datetime.date.today()
+
+    def copy(book_id):
+        if rng.random() < loans:
+            return BookInstance(
+                book_id=book_id,
+                imprint="Imprint %s" % rng.randint(1, 50),
+                status="o",
+                borrower_id=rng.choice(user_ids),
+                due_back=today + datetime.timedelta(days=rng.randint(-14, 21)),
+            )
+        return BookInstance(
+            book_id=book_id,
+            imprint="Imprint %s" % rng.randint(1, 50),
+            status=rng.choice("aaaamr"),
+        )
+
+    BookInstance.objects.bulk_create(
+        (copy(book_id) for book_id in book_ids for _ in range(copies_per_book)),
+        batch_size=batch_size,
+    )
+    Session.objects.all().delete()
+
+    Book.objects.recount_copies()
+    Genre.objects.recount_books()
+    Language.objects.recount_books()
+    CatalogStats.rebuild()
+    search.rebuild_index()
+    # Refresh planner statistics so list pages can use estimated counts.
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+    return {
+        "authors": authors,
+        "books": len(book_ids),
+        "copies": len(book_ids) * copies_per_book,
+        "users": len(user_ids),
+        "loan_ratio": loans,
+        "seed": seed,
+    }
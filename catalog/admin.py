@@ -1,37 +1,108 @@
 from django.contrib import admin
+from django.db.models import Prefetch
+from django.forms.models import BaseInlineFormSet
+from django.urls import reverse
+from django.utils.functional import cached_property
+from django.utils.http import urlencode
+
 from .models import Author, Genre, Book, BookInstance, Language
+from .pagination import EstimatedCountPaginator
 
 admin.site.register(Genre)
 admin.site.register(Language)
 
 
-class BookInline(admin.TabularInline):
+class CappedInlineFormSet(BaseInlineFormSet):
+    """
+    Only edit the first ``max_rows`` children inline; the rest stay untouched.
+    When the cap is hit, the inline says how many there are and links to the
+    changelist filtered to this parent.
+    """
+
+    max_rows = 20
+
+    def get_queryset(self):
+        if not hasattr(self, "_capped_queryset"):
+            self._capped_queryset = super().get_queryset()[: self.max_rows]
+        return self._capped_queryset
+
+    @cached_property
+    def total_count(self):
+        # Only counted when the cap may have cut rows off.
+        if len(self.get_queryset()) < self.max_rows:
+            return len(self.get_queryset())
+        return super().get_queryset().count()
+
+    @property
+    def hidden_count(self):
+        return self.total_count - len(self.get_queryset())
+
+    def changelist_url(self):
+        opts = self.model._meta
+        return "%s?%s" % (
+            reverse("admin:%s_%s_changelist" % (opts.app_label, opts.model_name)),
+            urlencode({"%s__id__exact" % self.fk.name: self.instance.pk}),
+        )
+
+
+class CappedTabularInline(admin.TabularInline):
+    formset = CappedInlineFormSet
+    template = "admin/catalog/capped_tabular.html"
+
+
+class BookInline(CappedTabularInline):
     model = Book
+    fields = ("title", "isbn", "language")
+    show_change_link = True
+    extra = 1
 
 
 class AuthorAdmin(admin.ModelAdmin):
     list_display = ("last_name", "first_name", "date_of_birth", "date_of_death")
     fields = ["first_name", "last_name", ("date_of_birth", "date_of_death")]
+    search_fields = ("last_name", "first_name")
     inlines = [BookInline]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 admin.site.register(Author, AuthorAdmin)
 
 
-class BooksInstanceInline(admin.TabularInline):
+class BooksInstanceInline(CappedTabularInline):
     model = BookInstance
+    raw_id_fields = ("borrower",)
+    show_change_link = True
+    extra = 1
 
 
 @admin.register(Book)
 class BookAdmin(admin.ModelAdmin):
     list_display = ("title", "author", "display_genre", "language")
+    list_select_related = ("author", "language")
+    search_fields = ("title", "isbn")
+    autocomplete_fields = ("author",)
     inlines = [BooksInstanceInline]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return (
+            super()
+            .get_queryset(request)
+            .prefetch_related(Prefetch("genre", queryset=Genre.objects.only("name")))
+        )
 
 
 @admin.register(BookInstance)
 class BookInstanceAdmin(admin.ModelAdmin):
     list_display = ("id", "book", "borrower", "status", "due_back")
     list_filter = ("status", "due_back")
+    list_select_related = ("book", "borrower")
+    autocomplete_fields = ("book",)
+    raw_id_fields = ("borrower",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     fieldsets = (
         (None, {"fields": ("book", "imprint", "id")}),
         ("Availability", {"fields": ("status", "due_back", "borrower")}),
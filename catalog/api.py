@@ -0,0 +1,217 @@
+"""
+Read-only JSON endpoints for the catalog.
+
+Every response carries an ETag and Last-Modified derived from the
+``modified`` stamp of the objects it is built from, so clients can
+revalidate with If-None-Match / If-Modified-Since and get a 304 without the
+payload being rebuilt.
+"""
+import zlib
+
+from django.db.models import Max
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import condition, require_safe
+
+from . import isbn
+from .models import Author, Book, CatalogStats
+from .pagination import KeysetPaginator
+
+PAGE_SIZE = 50
+
+
+def json_response(data, status=200):
+    return JsonResponse(
+        data, status=status, json_dumps_params={"separators": (",", ":")}
+    )
+
+
+def cached_stamp(request, key, compute):
+    stamps = request.__dict__.setdefault("_catalog_stamps", {})
+    if key not in stamps:
+        stamps[key] = compute()
+    return stamps[key]
+
+
+def stamp_conditions(stamp_func):
+    def last_modified(request, *args, **kwargs):
+        stamp = stamp_func(request, *args, **kwargs)
+        return stamp[0] if stamp else None
+
+    def etag(request, *args, **kwargs):
+        stamp = stamp_func(request, *args, **kwargs)
+        if stamp:
+            cursor = request.GET.get("cursor", "")
+            parts = stamp[1:] + (stamp[0].timestamp(), zlib.crc32(cursor.encode()))
+            return "-".join(str(part) for part in parts)
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def object_stamp(model):
+    def stamp(request, pk, **kwargs):
+        def compute():
+            modified = (
+                model.objects.filter(pk=pk).values_list("modified", flat=True).first()
+            )
+            return (modified, model._meta.model_name, pk) if modified else None
+
+        return cached_stamp(request, (model, pk), compute)
+
+    return stamp
+
+
+def list_stamp(model, count_field):
+    def stamp(request, **kwargs):
+        def compute():
+            modified = model.objects.aggregate(latest=Max("modified"))["latest"]
+            if modified is None:
+                return None
+            count = getattr(CatalogStats.load(), count_field)
+            return (modified, model._meta.model_name, count)
+
+        return cached_stamp(request, (model, "list"), compute)
+
+    return stamp
+
+
+def book_summary(book):
+    return {
+        "id": book.pk,
+        "title": book.title,
+        "isbn": book.isbn,
+        "author_id": book.author_id,
+        "url": book.get_absolute_url(),
+    }
+
+
+def book_with_counts(book):
+    data = book_summary(book)
+    data.update(
+        {
+            "copies": book.copies_total,
+            "available": book.copies_available,
+            "on_loan": book.copies_on_loan,
+        }
+    )
+    return data
+
+
+def author_summary(author):
+    return {
+        "id": author.pk,
+        "first_name": author.first_name,
+        "last_name": author.last_name,
+        "url": author.get_absolute_url(),
+    }
+
+
+def page_payload(request, queryset, ordering, serialize):
+    page = KeysetPaginator(queryset, PAGE_SIZE, ordering).page(
+        request.GET.get("cursor")
+    )
+    return {
+        "results": [serialize(obj) for obj in page.object_list],
+        "next": page.next_cursor,
+        "previous": page.previous_cursor,
+    }
+
+
+@require_safe
+@stamp_conditions(list_stamp(Book, "num_books"))
+def book_list(request):
+    books = Book.objects.only("title", "isbn", "author")
+    return json_response(page_payload(request, books, ("title", "id"), book_summary))
+
+
+@require_safe
+@stamp_conditions(object_stamp(Book))
+def book_detail(request, pk):
+    book = get_object_or_404(Book.objects.with_detail(), pk=pk)
+    data = book_summary(book)
+    data.update(
+        {
+            "summary": book.summary,
+            "author": str(book.author) if book.author else None,
+            "language": book.language.name if book.language else None,
+            "genres": [genre.name for genre in book.genre.all()],
+            "copies": [
+                {
+                    "id": str(copy.pk),
+                    "status": copy.status,
+                    "due_back": copy.due_back,
+                    "imprint": copy.imprint,
+                }
+                for copy in book.bookinstance_set.all()
+            ],
+        }
+    )
+    return json_response(data)
+
+
+@require_safe
+@stamp_conditions(object_stamp(Book))
+def book_availability(request, pk):
+    book = get_object_or_404(
+        Book.objects.only("copies_total", "copies_available", "copies_on_loan"),
+        pk=pk,
+    )
+    return json_response(
+        {
+            "id": book.pk,
+            "copies": book.copies_total,
+            "available": book.copies_available,
+            "on_loan": book.copies_on_loan,
+        }
+    )
+
+
+@require_safe
+@stamp_conditions(list_stamp(Author, "num_authors"))
+def author_list(request):
+    authors = Author.objects.only("first_name", "last_name")
+    return json_response(
+        page_payload(
+            request, authors, ("last_name", "first_name", "id"), author_summary
+        )
+    )
+
+
+@require_safe
+@stamp_conditions(object_stamp(Author))
+def author_detail(request, pk):
+    author = get_object_or_404(Author, pk=pk)
+    books = Book.objects.filter(author=author).only(
+        "title",
+        "isbn",
+        "author",
+        "copies_total",
+        "copies_available",
+        "copies_on_loan",
+    )
+    data = author_summary(author)
+    data.update(
+        {
+            "date_of_birth": author.date_of_birth,
+            "date_of_death": author.date_of_death,
+            "books": page_payload(request, books, ("title", "id"), book_with_counts),
+        }
+    )
+    return json_response(data)
+
+
+@require_safe
+def isbn_lookup(request, value):
+    """
+    Barcode-scanner lookup: the book id and availability for an ISBN-10 or
+    ISBN-13, with or without hyphens. Served from :func:`catalog.isbn.resolve`
+    without building a stamp, so most scans never reach the database.
+    """
+    try:
+        normalized = isbn.normalize(value)
+    except ValueError:
+        return json_response({"error": "Not a valid ISBN.", "isbn": value}, 400)
+    book = isbn.resolve(normalized)
+    if book is None:
+        return json_response({"error": "No book has this ISBN.", "isbn": value}, 404)
+    return json_response(book)
@@ -0,0 +1,153 @@
+"""
+Async versions of the read-only catalog pages, used instead of the ones in
+:mod:`catalog.views` when ``settings.CATALOG_ASYNC_VIEWS`` is set (the
+default under ``base.asgi``).
+
+The ORM is synchronous, so each query still runs on a thread, but queries
+that don't depend on each other run at the same time on separate threads and
+database connections: on a slow link a detail page costs one round trip
+instead of three. Templates render on the request's own thread, like any
+other sync code called from an async view.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import Page, Paginator
+from django.db import close_old_connections, connection
+from django.http import Http404
+from django.shortcuts import render
+
+from . import fragments, instrumentation, views
+from .models import Author, Book, BookInstance, CatalogStats, Genre
+
+
+def in_transaction():
+    return connection.in_atomic_block
+
+
+def on_own_connection(call):
+    """
+    Wrap ``call`` to run on an executor thread's connection, with its queries
+    counted into the request's timings (see QueryTimingMiddleware).
+
+    Executor threads are reused between requests, and with the settings'
+    ``conn_max_age=500`` each one keeps its own connection open for that
+    long: a process can hold one connection per executor thread and database
+    alias on top of its request threads' ones. Set ``DB_POOL_SIZE`` to cap
+    that with the pooled backends in :mod:`catalog.db`.
+    """
+    metrics = instrumentation.current_metrics.get()
+
+    def run():
+        try:
+            if metrics is None:
+                return call()
+            with instrumentation.timed_queries(metrics):
+                return call()
+        finally:
+            # Close the connection if it has outlived CONN_MAX_AGE or errored.
+            close_old_connections()
+
+    return run
+
+
+async def fan_out(*calls):
+    """
+    Run independent query callables concurrently and return their results in
+    order. Each callable must evaluate its queryset before returning.
+
+    Inside a transaction other connections can't see its uncommitted rows,
+    so the callables run one after another on the request's connection.
+    """
+    if await sync_to_async(in_transaction, thread_sensitive=True)():
+        return [await sync_to_async(call, thread_sensitive=True)() for call in calls]
+    return await asyncio.gather(
+        *(
+            sync_to_async(on_own_connection(call), thread_sensitive=False)()
+            for call in calls
+        )
+    )
+
+
+def cached_fragment(kind, pk, namespaces=(), variant=""):
+    key = fragments.fragment_key(kind, pk, namespaces, variant)
+    return key, fragments.get_cache().get(key)
+
+
+def store_fragment(key, fragment):
+    fragments.get_cache().set(key, fragment, fragments.fragment_timeout())
+
+
+async def index(request):
+    stats, num_visits = await fan_out(
+        CatalogStats.load, lambda: views.get_num_visits(request)
+    )
+    response = await sync_to_async(render, thread_sensitive=True)(
+        request, "index.html", context=views.index_context(stats, num_visits)
+    )
+    views.record_visit(request, response, num_visits)
+    return response
+
+
+async def book_detail(request, pk):
+    key, content = await sync_to_async(cached_fragment, thread_sensitive=True)(
+        "book", pk, namespaces=("genre", "language")
+    )
+    if content is None:
+        book, genres, copies = await fan_out(
+            lambda: Book.objects.with_detail()
+            .prefetch_related(None)
+            .filter(pk=pk)
+            .first(),
+            lambda: list(Genre.objects.filter(book=pk).only("name")),
+            lambda: list(
+                BookInstance.objects.filter(book=pk).only(
+                    "book", "imprint", "due_back", "status"
+                )
+            ),
+        )
+        if book is None:
+            raise Http404("No Book matches the given query.")
+        content = await sync_to_async(views.render_book_content, thread_sensitive=True)(
+            request, book, genres, copies
+        )
+        await sync_to_async(store_fragment, thread_sensitive=True)(key, content)
+    return await sync_to_async(render, thread_sensitive=True)(
+        request,
+        "books/book_detail.html",
+        context={"content": content, "book_id": pk},
+    )
+
+
+async def author_detail(request, pk):
+    page_number = await sync_to_async(views.author_page_number, thread_sensitive=True)(
+        request, pk
+    )
+    key, content = await sync_to_async(cached_fragment, thread_sensitive=True)(
+        "author", pk, variant=page_number
+    )
+    if content is None:
+        per_page = views.AUTHOR_BOOKS_PER_PAGE
+        books = views.author_books(pk)
+        offset = (page_number - 1) * per_page
+        author, count, rows = await fan_out(
+            lambda: Author.objects.filter(pk=pk).first(),
+            books.count,
+            lambda: list(books[offset : offset + per_page]),
+        )
+        if author is None:
+            raise Http404("No Author matches the given query.")
+        paginator = Paginator(books, per_page)
+        paginator.count = count
+        if page_number <= paginator.num_pages:
+            page_obj = Page(rows, page_number, paginator)
+        else:
+            # Out of range: show the last page, like Paginator.get_page().
+            page_obj = paginator.get_page(page_number)
+        content = await sync_to_async(
+            views.render_author_content, thread_sensitive=True
+        )(request, author, paginator, page_obj)
+        await sync_to_async(store_fragment, thread_sensitive=True)(key, content)
+    return await sync_to_async(render, thread_sensitive=True)(
+        request, "authors/author_detail.html", context={"content": content}
+    )
@@ -0,0 +1,32 @@
+"""
+Pooled versions of the PostgreSQL and SQLite backends (see
+:mod:`catalog.db.pool`). Select one with ``use_pool()`` in settings, or set
+ENGINE to ``catalog.db.postgresql`` / ``catalog.db.sqlite3`` and add a
+``POOL`` dict yourself.
+"""
+POOLED_ENGINES = {
+    "django.db.backends.postgresql": "catalog.db.postgresql",
+    "django.db.backends.postgresql_psycopg2": "catalog.db.postgresql",
+    "django.db.backends.sqlite3": "catalog.db.sqlite3",
+}
+
+
+def use_pool(settings_dict, **pool):
+    """
+    Switch a DATABASES entry to the pooled backend for its engine. Django
+    then "closes" (checks in) the connection at the end of every request, so
+    CONN_MAX_AGE is set to 0.
+    """
+    engine = settings_dict["ENGINE"]
+    if engine in POOLED_ENGINES.values():
+        pooled = engine
+    elif engine in POOLED_ENGINES:
+        pooled = POOLED_ENGINES[engine]
+    else:
+        raise ValueError("No pooled backend for %s." % engine)
+    settings_dict.update(
+        ENGINE=pooled,
+        CONN_MAX_AGE=0,
+        POOL=pool,
+    )
+    return settings_dict
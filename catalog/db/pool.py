@@ -0,0 +1,306 @@
+"""
+A per-process pool of raw database connections behind Django's own
+connection handling.
+
+Django keeps one connection per thread and, with ``CONN_MAX_AGE = 0``, closes
+it at the end of every request. The pooled backends in :mod:`catalog.db`
+turn that close into a check-in, so the next request on any thread reuses an
+open connection instead of paying for a new one, and cap how many connections
+one worker process can hold open. Configure them through a ``POOL`` entry in
+the database settings::
+
+    "POOL": {"MAX_SIZE": 10, "TIMEOUT": 10, "CHECK_INTERVAL": 30, "MAX_LIFETIME": 3600}
+
+Connections that sat idle for ``CHECK_INTERVAL`` seconds, or that saw an
+error, are pinged before being handed out again and replaced if the ping
+fails. Pool counters are published to the cache at the end of requests and
+read back by ``manage.py db_pool_stats`` through the same worker registry as
+the request timings in :mod:`catalog.instrumentation`; that needs a cache
+shared between processes and (to stay out of the pool's way) not backed by
+the database.
+"""
+import os
+import threading
+import time
+from collections import Counter, deque
+
+from django.core.signals import request_finished
+
+from ..workers import WorkerRegistry
+
+registry = WorkerRegistry("catalog:dbpool")
+PUBLISH_INTERVAL = 10
+
+DEFAULTS = {
+    "MAX_SIZE": 10,
+    "TIMEOUT": 10,
+    "CHECK_INTERVAL": 30,
+    "MAX_LIFETIME": None,
+}
+
+
+class PooledConnection:
+    def __init__(self, pool, connection):
+        self.pool = pool
+        self.connection = connection
+        self.created = time.monotonic()
+        self.checked = self.created
+        self.suspect = False
+
+
+def ping(connection):
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+    finally:
+        cursor.close()
+
+
+def discard(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        alias,
+        max_size=10,
+        timeout=10,
+        check_interval=30,
+        max_lifetime=None,
+        timeout_error=TimeoutError,
+    ):
+        self.alias = alias
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self.max_lifetime = max_lifetime
+        self.timeout_error = timeout_error
+        self.condition = threading.Condition()
+        self.idle = deque()
+        self.size = 0
+        self.stats = Counter()
+        self.pid = os.getpid()
+
+    def checkout(self, connect):
+        """
+        Return an open PooledConnection, reusing an idle one when possible and
+        calling ``connect()`` for a new raw connection otherwise. Waits up to
+        ``timeout`` seconds when ``max_size`` connections are already out.
+        """
+        started = time.monotonic()
+        with self.condition:
+            self.stats["checkouts"] += 1
+            waited = False
+            while not self.idle and self.size >= self.max_size:
+                remaining = self.timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self.stats["timeouts"] += 1
+                    raise self.timeout_error(
+                        "No database connection became free in %ss (pool of %s)."
+                        % (self.timeout, self.max_size)
+                    )
+                waited = True
+                self.condition.wait(remaining)
+            if waited:
+                self.stats["waits"] += 1
+                self.stats["wait_ms"] += round((time.monotonic() - started) * 1000)
+            if self.idle:
+                pooled = self.idle.pop()
+            else:
+                pooled = None
+                self.size += 1
+
+        if pooled is not None:
+            pooled = self.revalidate(pooled)
+            if pooled is not None:
+                return pooled
+        try:
+            pooled = PooledConnection(self, connect())
+        except BaseException:
+            self.release_slot()
+            raise
+        with self.condition:
+            self.stats["connects"] += 1
+        return pooled
+
+    def revalidate(self, pooled):
+        now = time.monotonic()
+        if self.max_lifetime is not None and now - pooled.created >= self.max_lifetime:
+            reason = "recycled"
+        elif pooled.suspect or now - pooled.checked >= self.check_interval:
+            try:
+                ping(pooled.connection)
+            except Exception:
+                reason = "reconnects"
+            else:
+                pooled.checked = now
+                pooled.suspect = False
+                with self.condition:
+                    self.stats["reuses"] += 1
+                return pooled
+        else:
+            with self.condition:
+                self.stats["reuses"] += 1
+            return pooled
+        # Keep the slot: the caller opens a replacement in its place.
+        discard(pooled.connection)
+        with self.condition:
+            self.stats[reason] += 1
+        return None
+
+    def checkin(self, pooled, healthy=True):
+        """Return a connection; rolls back anything left open first."""
+        try:
+            pooled.connection.rollback()
+        except Exception:
+            discard(pooled.connection)
+            self.release_slot("discarded")
+            return
+        pooled.suspect = not healthy
+        with self.condition:
+            self.idle.append(pooled)
+            self.condition.notify()
+
+    def release_slot(self, reason=None):
+        with self.condition:
+            self.size -= 1
+            if reason:
+                self.stats[reason] += 1
+            self.condition.notify()
+
+    def close_idle(self):
+        with self.condition:
+            idle, self.idle = list(self.idle), deque()
+            self.size -= len(idle)
+            self.condition.notify_all()
+        for pooled in idle:
+            discard(pooled.connection)
+
+    def snapshot(self):
+        with self.condition:
+            snapshot = {
+                "max_size": self.max_size,
+                "size": self.size,
+                "idle": len(self.idle),
+                "in_use": self.size - len(self.idle),
+            }
+            for name in (
+                "checkouts",
+                "connects",
+                "reuses",
+                "waits",
+                "wait_ms",
+                "timeouts",
+                "reconnects",
+                "recycled",
+                "discarded",
+            ):
+                snapshot[name] = self.stats[name]
+        return snapshot
+
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+def get_pool(alias, key, options, timeout_error):
+    """
+    Return the process's pool for one set of connection parameters. Pools are
+    per process: a pool inherited across fork() is dropped (not closed, the
+    parent still owns those sockets) and rebuilt.
+    """
+    with pools_lock:
+        pool = pools.get(key)
+        if pool is None or pool.pid != os.getpid():
+            config = dict(DEFAULTS, **options)
+            pool = pools[key] = ConnectionPool(
+                alias,
+                max_size=config["MAX_SIZE"],
+                timeout=config["TIMEOUT"],
+                check_interval=config["CHECK_INTERVAL"],
+                max_lifetime=config["MAX_LIFETIME"],
+                timeout_error=timeout_error,
+            )
+        return pool
+
+
+def close_idle(alias):
+    """Close the idle connections of every pool for ``alias`` in this process."""
+    for pool in list(pools.values()):
+        if pool.alias == alias and pool.pid == os.getpid():
+            pool.close_idle()
+
+
+def collect_local():
+    stats = {}
+    for pool in list(pools.values()):
+        if pool.pid == os.getpid():
+            merged = stats.setdefault(pool.alias, Counter())
+            merged.update(pool.snapshot())
+    return {alias: dict(counts) for alias, counts in stats.items()}
+
+
+def publish():
+    registry.publish(collect_local())
+
+
+last_published = 0.0
+
+
+def publish_periodically(sender, **kwargs):
+    global last_published
+    now = time.monotonic()
+    if pools and now - last_published >= PUBLISH_INTERVAL:
+        last_published = now
+        publish()
+
+
+request_finished.connect(publish_periodically, dispatch_uid="catalog.db.pool")
+
+
+def collect_stats():
+    """Per-worker pool stats from the cache, including this process's own."""
+    if pools:
+        publish()
+    return dict(sorted(registry.collect().items()))
+
+
+class PooledDatabaseWrapperMixin:
+    """
+    Mixed into a backend's DatabaseWrapper: new connections come from the
+    pool and closing a connection checks it back in.
+    """
+
+    pooled = None
+
+    def pool_key(self, conn_params):
+        # Test database setup connects the same alias to other databases
+        # ("postgres", test_<name>), so pools are keyed by what they connect to.
+        return (self.alias, repr(sorted(conn_params.items(), key=lambda item: item[0])))
+
+    def get_pool(self, conn_params):
+        return get_pool(
+            self.alias,
+            self.pool_key(conn_params),
+            self.settings_dict.get("POOL", {}),
+            self.Database.OperationalError,
+        )
+
+    def get_new_connection(self, conn_params):
+        pool = self.get_pool(conn_params)
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        parent = super()
+        self.pooled = pool.checkout(lambda: parent.get_new_connection(conn_params))
+        return self.pooled.connection
+
+    def _close(self):
+        pooled, self.pooled = self.pooled, None
+        if pooled is None or pooled.connection is not self.connection:
+            return super()._close()
+        pooled.pool.checkin(pooled, healthy=not self.errors_occurred)
@@ -0,0 +1,14 @@
+from django.db.backends.postgresql import base, creation
+
+from ..pool import PooledDatabaseWrapperMixin, close_idle
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # PostgreSQL won't drop a database with open connections.
+        close_idle(self.connection.alias)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    creation_class = DatabaseCreation
@@ -0,0 +1,12 @@
+from django.db.backends.sqlite3 import base
+
+from ..pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    def get_pool(self, conn_params):
+        # Django never closes in-memory databases (that would destroy them),
+        # so their connections would never come back to the pool.
+        if self.is_in_memory_db():
+            return None
+        return super().get_pool(conn_params)
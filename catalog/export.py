@@ -0,0 +1,122 @@
+import csv
+import json
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Book, BookInstance
+
+BOOK_FIELDS = [
+    "id",
+    "title",
+    "isbn",
+    "summary",
+    "author",
+    "language",
+    "genres",
+    "copies",
+    "copies_available",
+    "copies_on_loan",
+]
+COPY_FIELDS = ["id", "book_id", "isbn", "imprint", "status", "due_back", "borrower"]
+DATASETS = {"books": BOOK_FIELDS, "copies": COPY_FIELDS}
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_books(chunk_size=2000):
+    books = (
+        Book.objects.select_related("author", "language")
+        .order_by("pk")
+        .iterator(chunk_size=chunk_size)
+    )
+    for chunk in chunked(books, chunk_size):
+        genres = {}
+        through = Book.genre.through.objects.filter(
+            book_id__in=[book.pk for book in chunk]
+        ).values_list("book_id", "genre__name")
+        for book_id, name in through.order_by("book_id", "genre__name"):
+            genres.setdefault(book_id, []).append(name)
+        for book in chunk:
+            yield {
+                "id": book.pk,
+                "title": book.title,
+                "isbn": book.isbn,
+                "summary": book.summary,
+                "author": str(book.author) if book.author else "",
+                "language": str(book.language) if book.language else "",
+                "genres": genres.get(book.pk, []),
+                "copies": book.copies_total,
+                "copies_available": book.copies_available,
+                "copies_on_loan": book.copies_on_loan,
+            }
+
+
+def iter_copies(chunk_size=2000):
+    copies = (
+        BookInstance.objects.order_by("pk")
+        .values_list(
+            "pk",
+            "book_id",
+            "book__isbn",
+            "imprint",
+            "status",
+            "due_back",
+            "borrower__username",
+        )
+        .iterator(chunk_size=chunk_size)
+    )
+    for pk, book_id, isbn, imprint, status, due_back, borrower in copies:
+        yield {
+            "id": pk,
+            "book_id": book_id,
+            "isbn": isbn or "",
+            "imprint": imprint,
+            "status": status,
+            "due_back": due_back,
+            "borrower": borrower or "",
+        }
+
+
+def iter_records(dataset, chunk_size=2000):
+    if dataset == "books":
+        return iter_books(chunk_size)
+    return iter_copies(chunk_size)
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def iter_csv(records, fields):
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for record in records:
+        row = []
+        for field in fields:
+            value = record[field]
+            if isinstance(value, list):
+                value = "|".join(value)
+            row.append("" if value is None else value)
+        yield writer.writerow(row)
+
+
+def iter_jsonl(records):
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(",", ":"))
+    for record in records:
+        yield encoder.encode(record) + "\n"
+
+
+def iter_export(dataset, output_format, chunk_size=2000):
+    records = iter_records(dataset, chunk_size)
+    if output_format == "csv":
+        return iter_csv(records, DATASETS[dataset])
+    return iter_jsonl(records)
@@ -0,0 +1,103 @@
+"""
+Versioned caching of rendered detail-page fragments.
+
+Each cached fragment is keyed by the object id plus the current version
+counter of the object and of any namespaces it depends on (e.g. every book
+shows genre names, so renaming a genre bumps the "genre" namespace). Signal
+handlers bump the counters on change, which makes stale fragments
+unreachable without having to find and delete them.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from . import routers
+
+
+def get_cache():
+    return caches[getattr(settings, "CATALOG_CACHE", "default")]
+
+
+def fragment_timeout():
+    timeout = getattr(settings, "CATALOG_FRAGMENT_TIMEOUT", 60 * 60 * 24)
+    if routers.reading_from_replica():
+        # A lagging replica can render a fragment from rows older than the
+        # current version; don't keep it longer than the lag we tolerate.
+        timeout = min(timeout, getattr(settings, "CATALOG_REPLICA_MAX_LAG", 30))
+    return timeout
+
+
+def version_timeout():
+    # Counters restart from the clock (see initial_version()), so one that
+    # expires only costs a cache miss, and requests for ids that don't exist
+    # can't fill the cache with permanent keys.
+    return getattr(settings, "CATALOG_FRAGMENT_TIMEOUT", 60 * 60 * 24)
+
+
+def version_key(kind, pk):
+    return "catalog:version:%s:%s" % (kind, pk)
+
+
+def initial_version():
+    # Start from the clock rather than 1 so a counter that was evicted never
+    # restarts at a value an older fragment was cached under.
+    return time.time_ns() // 1000
+
+
+def _bump_now(kind, pks):
+    cache = get_cache()
+    for pk in pks:
+        key = version_key(kind, pk)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, initial_version(), version_timeout())
+
+
+def bump(kind, *pks):
+    pks = [pk for pk in pks if pk is not None]
+    if not pks:
+        return
+    _bump_now(kind, pks)
+    # Bump again once the change is visible to other connections, so a
+    # fragment rendered from the old rows in the meantime is discarded too.
+    transaction.on_commit(lambda: _bump_now(kind, pks))
+
+
+def bump_namespace(name):
+    bump("namespace", name)
+
+
+def get_versions(keys):
+    cache = get_cache()
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, initial_version(), version_timeout())
+        versions.update(cache.get_many(missing))
+    return [versions.get(key, 0) for key in keys]
+
+
+def fragment_key(kind, pk, namespaces=(), variant=""):
+    keys = [version_key(kind, pk)]
+    keys += [version_key("namespace", name) for name in namespaces]
+    versions = get_versions(keys)
+    return "catalog:fragment:%s:%s:%s:%s" % (
+        kind,
+        pk,
+        variant,
+        ".".join(str(version) for version in versions),
+    )
+
+
+def get_or_render(kind, pk, render, namespaces=(), variant=""):
+    key = fragment_key(kind, pk, namespaces, variant)
+    cache = get_cache()
+    fragment = cache.get(key)
+    if fragment is None:
+        fragment = render()
+        cache.set(key, fragment, fragment_timeout())
+    return fragment
@@ -0,0 +1,150 @@
+"""
+Per-request timing collected by :class:`catalog.middleware.QueryTimingMiddleware`.
+
+Samples are kept per URL name in bounded in-process windows and published to
+the Django cache every few requests, so ``manage.py catalog_timings`` can
+merge the windows of every worker (see :mod:`catalog.workers`). That needs
+a cache shared between processes (database, file, memcached...); with locmem
+each process only sees its own samples.
+"""
+import contextvars
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.template.base import Template
+
+from .workers import WorkerRegistry
+
+registry = WorkerRegistry("catalog:timings")
+
+current_metrics = contextvars.ContextVar("catalog_request_metrics", default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        # Async views run queries for one request on several threads.
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                self.db_time += elapsed
+                self.queries += 1
+
+
+@contextmanager
+def timed_queries(metrics):
+    """Count the queries run on this thread's connections into ``metrics``."""
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(metrics))
+        yield
+
+
+def timed_render(render):
+    def wrapper(self, context):
+        metrics = current_metrics.get()
+        if metrics is None:
+            return render(self, context)
+        metrics.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            metrics.template_depth -= 1
+            # Nested templates (extends/include) render inside the outermost
+            # one, so only the outermost render is counted.
+            if not metrics.template_depth:
+                metrics.template_time += time.perf_counter() - started
+
+    wrapper.catalog_timed = True
+    return wrapper
+
+
+def install_template_timer():
+    if not getattr(Template.render, "catalog_timed", False):
+        Template.render = timed_render(Template.render)
+
+
+def setting(name, default):
+    return getattr(settings, name, default)
+
+
+class TimingStore:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(self.new_window)
+        self.pending = 0
+
+    def new_window(self):
+        return deque(maxlen=setting("CATALOG_INSTRUMENTATION_WINDOW", 1000))
+
+    def add(self, url_name, total_ms, view_ms, db_ms, template_ms, queries):
+        self.samples[url_name].append((total_ms, view_ms, db_ms, template_ms, queries))
+        with self.lock:
+            self.pending += 1
+            flush = self.pending >= setting("CATALOG_INSTRUMENTATION_FLUSH_EVERY", 50)
+            if flush:
+                self.pending = 0
+        if flush:
+            self.flush()
+
+    def snapshot(self):
+        return {name: list(window) for name, window in list(self.samples.items())}
+
+    def flush(self):
+        registry.publish(self.snapshot())
+
+    def clear(self):
+        self.samples.clear()
+        self.pending = 0
+
+
+store = TimingStore()
+
+
+def collect_samples():
+    merged = defaultdict(list)
+    store.flush()
+    for samples in registry.collect().values():
+        for url_name, window in samples.items():
+            merged[url_name].extend(window)
+    return merged
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(int(math.ceil(fraction * len(ordered))) - 1, 0)
+    return ordered[rank]
+
+
+def summarize(samples):
+    summary = {}
+    for url_name, window in sorted(samples.items()):
+        totals = [sample[0] for sample in window]
+        summary[url_name] = {
+            "requests": len(window),
+            "p50_ms": round(percentile(totals, 0.50), 2),
+            "p95_ms": round(percentile(totals, 0.95), 2),
+            "p99_ms": round(percentile(totals, 0.99), 2),
+            "avg_db_ms": round(sum(s[2] for s in window) / len(window), 2),
+            "avg_template_ms": round(sum(s[3] for s in window) / len(window), 2),
+            "avg_queries": round(sum(s[4] for s in window) / len(window), 2),
+            "max_queries": max(s[4] for s in window),
+        }
+    return summary
@@ -0,0 +1,189 @@
+"""
+ISBN normalization and the cached ISBN -> book resolver behind the
+``/catalog/isbn/<isbn>/`` lookup.
+
+Books store their ISBN as the 13 digits of the ISBN-13, so the unique index
+on ``catalog_book.isbn`` is an index on the normalized value: hyphens and
+spaces are dropped and ISBN-10s are converted. :func:`normalize` raises for
+anything that is not a valid ISBN; :func:`coerce` keeps such values as they
+are, for catalog entries that predate validation. :class:`ISBNField`
+normalizes during model validation, so forms accept hyphenated input and
+the unique check compares normalized values.
+
+:func:`resolve` answers from a small per-process LRU first, then from the
+shared cache, then from the database. Signal handlers call :func:`forget`
+whenever a book or its copy counts change; other processes' LRU entries
+expire after ``CATALOG_ISBN_LRU_TTL`` seconds.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+
+from . import fragments
+
+SEPARATORS_RE = re.compile(r"[-\s]")
+ISBN10_RE = re.compile(r"^\d{9}[\dX]$")
+ISBN13_RE = re.compile(r"^97[89]\d{10}$")
+NOT_FOUND = "missing"
+# A hyphenated ISBN-13: "978-0-306-40615-7".
+INPUT_LENGTH = 17
+
+
+def isbn10_check_digit(digits):
+    total = sum((10 - position) * int(digit) for position, digit in enumerate(digits))
+    check = (11 - total % 11) % 11
+    return "X" if check == 10 else str(check)
+
+
+def isbn13_check_digit(digits):
+    total = sum(
+        (3 if position % 2 else 1) * int(d) for position, d in enumerate(digits)
+    )
+    return str((10 - total % 10) % 10)
+
+
+def normalize(value):
+    """Return ``value`` as a 13-digit ISBN-13, or raise ValueError."""
+    isbn = SEPARATORS_RE.sub("", str(value)).upper()
+    if ISBN10_RE.match(isbn):
+        if isbn10_check_digit(isbn[:9]) != isbn[9]:
+            raise ValueError("Invalid ISBN-10 check digit: %r" % value)
+        isbn = "978" + isbn[:9]
+        return isbn + isbn13_check_digit(isbn)
+    if ISBN13_RE.match(isbn):
+        if isbn13_check_digit(isbn[:12]) != isbn[12]:
+            raise ValueError("Invalid ISBN-13 check digit: %r" % value)
+        return isbn
+    raise ValueError("Not an ISBN: %r" % value)
+
+
+def coerce(value):
+    """Normalize ``value`` if it is a valid ISBN, otherwise strip it."""
+    try:
+        return normalize(value)
+    except ValueError:
+        return str(value).strip()
+
+
+def validate_isbn(value):
+    try:
+        normalize(value)
+    except ValueError:
+        raise ValidationError(
+            "%(value)s is not a valid ISBN-10 or ISBN-13.", params={"value": value}
+        )
+
+
+class ISBNField(models.CharField):
+    def to_python(self, value):
+        value = super().to_python(value)
+        return value if value is None else coerce(value)
+
+    def formfield(self, **kwargs):
+        return super().formfield(**{"max_length": INPUT_LENGTH, **kwargs})
+
+
+class LRUCache:
+    """A thread-safe LRU whose entries also expire after ``ttl`` seconds."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return default
+            if entry[0] <= time.monotonic():
+                del self.entries[key]
+                return default
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def discard(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_cache = LRUCache(
+    getattr(settings, "CATALOG_ISBN_LRU_SIZE", 10000),
+    getattr(settings, "CATALOG_ISBN_LRU_TTL", 2),
+)
+
+
+def cache_key(isbn):
+    return "catalog:isbn:%s" % isbn
+
+
+def load(isbn):
+    Book = apps.get_model("catalog", "Book")
+    book = (
+        Book.objects.filter(isbn=isbn)
+        .only("copies_total", "copies_available", "copies_on_loan")
+        .first()
+    )
+    if book is None:
+        return None
+    return {
+        "id": book.pk,
+        "isbn": isbn,
+        "url": book.get_absolute_url(),
+        "copies": book.copies_total,
+        "available": book.copies_available,
+        "on_loan": book.copies_on_loan,
+    }
+
+
+def resolve(isbn):
+    """
+    Return the id and copy counts of the book with the normalized ``isbn``,
+    or None if there is none. Unknown ISBNs are cached too, so a scanner
+    retrying a misread doesn't reach the database every time.
+    """
+    found = local_cache.get(isbn)
+    if found is None:
+        cache = fragments.get_cache()
+        key = cache_key(isbn)
+        found = cache.get(key)
+        if found is None:
+            found = load(isbn) or NOT_FOUND
+            cache.set(key, found, fragments.fragment_timeout())
+        local_cache.set(isbn, found)
+    return None if found == NOT_FOUND else found
+
+
+def _forget_now(isbns):
+    fragments.get_cache().delete_many([cache_key(isbn) for isbn in isbns])
+    for isbn in isbns:
+        local_cache.discard(isbn)
+
+
+def forget(*isbns):
+    # Only normalized ISBNs are ever resolved, and so cached.
+    isbns = [isbn for isbn in isbns if isbn and ISBN13_RE.match(isbn)]
+    if not isbns:
+        return
+    _forget_now(isbns)
+    # Like fragments.bump(): forget again once other connections see the
+    # change, in case a lookup cached the old row in between.
+    transaction.on_commit(lambda: _forget_now(isbns))
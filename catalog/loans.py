@@ -0,0 +1,257 @@
+"""
+Checkout, return, renew, reserve and cancel holds for book copies.
+
+Every state change is a conditional UPDATE that only matches the row while
+it is still in the expected state (compare-and-swap), so two librarians can
+never lend the same copy: the loser's UPDATE matches no row. Picking "any
+available copy" of a book locks a candidate with SELECT ... FOR UPDATE SKIP
+LOCKED, so concurrent checkouts of a popular title spread over its copies
+instead of queueing behind one row lock. A hold that was not picked up by
+its due date counts as available again.
+
+update() bypasses model signals, so the catalog and per-book counters,
+modified stamps and cached fragments are kept in step here. Only the copy
+row and its book's counters are written inside the loan's transaction; the
+shared CatalogStats row, the modified stamps and the fragment versions are
+updated in a short transaction of their own once it commits, so concurrent
+loans don't queue on them. That transaction is retried if it hits a lock
+timeout or deadlock, so the counters aren't left behind the loan.
+"""
+import datetime
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import OperationalError, transaction
+from django.db.models import Q
+
+from .models import BookInstance, CatalogStats
+from .signals import copies_changed, is_available, move_copy
+
+LOAN_PERIOD = datetime.timedelta(weeks=2)
+HOLD_PERIOD = datetime.timedelta(days=3)
+MAX_ATTEMPTS = 5
+COUNTER_ATTEMPTS = 20
+COUNTER_RETRY_DELAY = 0.005
+# Fines are kept on the copy while it is on loan; they are settled when it
+# comes back and never carried over to the next loan.
+SETTLED = {"fine": Decimal("0"), "fine_assessed_on": None}
+
+
+class LoanError(Exception):
+    pass
+
+
+class NoCopyAvailable(LoanError):
+    pass
+
+
+class CopyUnavailable(LoanError):
+    pass
+
+
+class AlreadyBorrowing(LoanError):
+    pass
+
+
+def _transition(
+    copy_id, from_status, held_by=None, book_id=None, expired_before=None, **changes
+):
+    to_status = changes.get("status", from_status)
+    expected = BookInstance.objects.filter(pk=copy_id, status=from_status)
+    if held_by is not None:
+        expected = expected.filter(borrower=held_by)
+    if expired_before is not None:
+        expected = expected.filter(due_back__lt=expired_before)
+    with transaction.atomic():
+        if not expected.update(**changes):
+            return None
+        if book_id is None:
+            book_id = (
+                BookInstance.objects.filter(pk=copy_id)
+                .values_list("book_id", flat=True)
+                .first()
+            )
+        move_copy(book_id, from_status, book_id, to_status)
+    available = is_available(to_status) - is_available(from_status)
+    transaction.on_commit(lambda: _after_transition(book_id, available))
+    return copy_id
+
+
+def _after_transition(book_id, available):
+    # Every loan would queue behind the single CatalogStats row (and the
+    # author row) if these ran inside the loan's transaction.
+    for attempt in range(1, COUNTER_ATTEMPTS + 1):
+        try:
+            with transaction.atomic():
+                CatalogStats.increment(num_instances_available=available)
+                copies_changed([book_id])
+            return
+        except OperationalError:
+            if attempt == COUNTER_ATTEMPTS:
+                raise
+            time.sleep(COUNTER_RETRY_DELAY * attempt)
+
+
+def _claimable(book_id):
+    """Available copies, and holds that were never picked up."""
+    return BookInstance.objects.filter(
+        Q(status="a") | Q(status="r", due_back__lt=datetime.date.today()),
+        book_id=book_id,
+    )
+
+
+def _claim(copy_id, current_status, book_id=None, **changes):
+    if current_status == "r":
+        return _transition(
+            copy_id,
+            "r",
+            book_id=book_id,
+            expired_before=datetime.date.today(),
+            **changes,
+        )
+    return _transition(copy_id, "a", book_id=book_id, **changes)
+
+
+def _claim_any(book_id, **changes):
+    tried = []
+    for _ in range(MAX_ATTEMPTS):
+        with transaction.atomic():
+            candidate = (
+                _claimable(book_id)
+                .exclude(pk__in=tried)
+                .order_by("pk")
+                .select_for_update(skip_locked=True)
+                .values_list("pk", "status")
+                .first()
+            )
+            if candidate is None:
+                break
+            copy_id, current_status = candidate
+            # The row lock makes the CAS a formality on PostgreSQL; on
+            # backends without SKIP LOCKED it is what resolves the race.
+            claimed = _claim(copy_id, current_status, book_id=book_id, **changes)
+            if claimed:
+                return claimed
+            tried.append(copy_id)
+    raise NoCopyAvailable("No copy of this book is available.")
+
+
+def _lock_borrower(borrower):
+    # Serializes one borrower's loans and holds (not anyone else's) so two
+    # quick POSTs can't both pass the one-copy-per-book check.
+    list(User.objects.select_for_update().filter(pk=borrower.pk).values_list("pk"))
+
+
+def _current_copies(book_id, borrower):
+    return BookInstance.objects.filter(
+        book_id=book_id, borrower=borrower, status__in=("o", "r")
+    ).values_list("pk", "status")
+
+
+def _new_loan(borrower, due_back):
+    return {
+        "status": "o",
+        "borrower": borrower,
+        "due_back": due_back or datetime.date.today() + LOAN_PERIOD,
+        **SETTLED,
+    }
+
+
+def checkout(book_id, borrower, due_back=None):
+    """
+    Lend the borrower their held copy of a book, or else any available one.
+    A borrower can have only one copy of a book on loan.
+    """
+    with transaction.atomic():
+        _lock_borrower(borrower)
+        current = dict(_current_copies(book_id, borrower))
+        held = [pk for pk, status in current.items() if status == "r"]
+        if held:
+            return checkout_copy(held[0], borrower, due_back)
+        if current:
+            raise AlreadyBorrowing("You already have a copy of this book.")
+        return _claim_any(book_id, **_new_loan(borrower, due_back))
+
+
+def checkout_copy(copy_id, borrower, due_back=None):
+    """Lend one specific copy; fails if it was taken in the meantime."""
+    changes = _new_loan(borrower, due_back)
+    claimed = (
+        _transition(copy_id, "r", held_by=borrower, **changes)
+        or _claim(copy_id, "a", **changes)
+        or _claim(copy_id, "r", **changes)
+    )
+    if not claimed:
+        raise CopyUnavailable("This copy is not available.")
+    return claimed
+
+
+def return_copy(copy_id):
+    returned = _transition(
+        copy_id,
+        "o",
+        status="a",
+        borrower=None,
+        due_back=None,
+        **SETTLED,
+    )
+    if not returned:
+        raise CopyUnavailable("This copy is not on loan.")
+    return returned
+
+
+def renew(copy_id, due_back, borrower=None):
+    renewed = _transition(copy_id, "o", held_by=borrower, due_back=due_back)
+    if not renewed:
+        raise CopyUnavailable("This copy is not on loan.")
+    return renewed
+
+
+def reserve(book_id, borrower):
+    """
+    Hold an available copy of a book for the borrower for HOLD_PERIOD. A
+    borrower can't hold a book they already have on loan or on hold.
+    """
+    with transaction.atomic():
+        _lock_borrower(borrower)
+        if _current_copies(book_id, borrower).exists():
+            raise AlreadyBorrowing("You already have a copy of this book.")
+        return _claim_any(
+            book_id,
+            status="r",
+            borrower=borrower,
+            due_back=datetime.date.today() + HOLD_PERIOD,
+        )
+
+
+def cancel_hold(copy_id, borrower):
+    cancelled = _transition(
+        copy_id, "r", held_by=borrower, status="a", borrower=None, due_back=None
+    )
+    if not cancelled:
+        raise CopyUnavailable("You are not holding this copy.")
+    return cancelled
+
+
+def release_expired_holds(today=None):
+    """
+    Make holds that were not picked up by their due date available again.
+    Checkouts already take such copies; this also puts them back in the
+    availability counts.
+    """
+    today = today or datetime.date.today()
+    expired = BookInstance.objects.filter(status="r", due_back__lt=today)
+    released = 0
+    for copy_id, book_id in expired.values_list("pk", "book_id").iterator():
+        if _transition(
+            copy_id,
+            "r",
+            book_id=book_id,
+            expired_before=today,
+            status="a",
+            borrower=None,
+            due_back=None,
+        ):
+            released += 1
+    return released
@@ -0,0 +1,55 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from catalog import instrumentation
+
+
+class Command(BaseCommand):
+    help = (
+        "Print rolling per-URL-name latency percentiles and query counts recorded "
+        "by the catalog instrumentation middleware (CATALOG_INSTRUMENTATION)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--json", action="store_true", help="Print the summary as JSON."
+        )
+
+    def handle(self, *args, **options):
+        summary = instrumentation.summarize(instrumentation.collect_samples())
+        if options["json"]:
+            self.stdout.write(json.dumps(summary, indent=2, sort_keys=True))
+            return
+        if not summary:
+            self.stdout.write("No samples recorded.")
+            return
+
+        row = "%-28s %8s %9s %9s %9s %9s %9s %8s"
+        self.stdout.write(
+            row
+            % (
+                "url name",
+                "requests",
+                "p50 ms",
+                "p95 ms",
+                "p99 ms",
+                "db ms",
+                "tpl ms",
+                "queries",
+            )
+        )
+        for url_name, stats in summary.items():
+            self.stdout.write(
+                row
+                % (
+                    url_name,
+                    stats["requests"],
+                    stats["p50_ms"],
+                    stats["p95_ms"],
+                    stats["p99_ms"],
+                    stats["avg_db_ms"],
+                    stats["avg_template_ms"],
+                    stats["avg_queries"],
+                )
+            )
@@ -0,0 +1,62 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from catalog.db import pool
+
+
+class Command(BaseCommand):
+    help = (
+        "Print the connection pool counters published by each worker process "
+        "using a pooled database backend (catalog.db)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--json", action="store_true", help="Print the stats as JSON."
+        )
+
+    def handle(self, *args, **options):
+        stats = pool.collect_stats()
+        if options["json"]:
+            self.stdout.write(json.dumps(stats, indent=2, sort_keys=True))
+            return
+        if not stats:
+            self.stdout.write("No pool stats published.")
+            return
+
+        row = "%-24s %-10s %5s %5s %7s %9s %8s %7s %8s %8s %10s"
+        self.stdout.write(
+            row
+            % (
+                "worker",
+                "alias",
+                "size",
+                "idle",
+                "in use",
+                "checkouts",
+                "connects",
+                "waits",
+                "wait ms",
+                "timeouts",
+                "reconnects",
+            )
+        )
+        for worker, aliases in stats.items():
+            for alias, counts in sorted(aliases.items()):
+                self.stdout.write(
+                    row
+                    % (
+                        worker,
+                        alias,
+                        "%s/%s" % (counts["size"], counts["max_size"]),
+                        counts["idle"],
+                        counts["in_use"],
+                        counts["checkouts"],
+                        counts["connects"],
+                        counts["waits"],
+                        counts["wait_ms"],
+                        counts["timeouts"],
+                        counts["reconnects"],
+                    )
+                )
@@ -0,0 +1,91 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef
+
+from catalog.models import Author, Book, BookInstance, Genre, Language
+
+
+class Command(BaseCommand):
+    help = (
+        "Print the query plans of the catalog's hot lookups. Run it before and "
+        "after 'migrate catalog' to compare plans with and without the lookup "
+        "indexes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--analyze",
+            action="store_true",
+            help="Execute the queries and report real timings (PostgreSQL only).",
+        )
+
+    def get_queries(self):
+        today = datetime.date.today()
+        borrower_id = (
+            BookInstance.objects.exclude(borrower=None)
+            .values_list("borrower_id", flat=True)
+            .first()
+        )
+        # The biggest genre/language is the page that used to be slowest.
+        genre_id = Genre.objects.order_by("-book_count").values_list("pk", flat=True)
+        language_id = Language.objects.order_by("-book_count").values_list(
+            "pk", flat=True
+        )
+        isbn = Book.objects.values_list("isbn", flat=True).first() or "0000000000000"
+        return [
+            (
+                "available copies count",
+                BookInstance.objects.filter(status__exact="a").order_by().values("pk"),
+            ),
+            (
+                "my borrowed books",
+                BookInstance.objects.filter(borrower_id=borrower_id)
+                .filter(status__exact="o")
+                .order_by("due_back"),
+            ),
+            (
+                "overdue loans",
+                BookInstance.objects.filter(status="o", due_back__lt=today).order_by(
+                    "due_back"
+                ),
+            ),
+            (
+                "loans dashboard",
+                BookInstance.objects.filter(status="o")
+                .select_related("book", "borrower")
+                .order_by("due_back", "id")[:10],
+            ),
+            ("copies by due date", BookInstance.objects.order_by("due_back")[:10]),
+            ("book by ISBN", Book.objects.filter(isbn=isbn)),
+            ("books by title", Book.objects.order_by("title", "id")[:10]),
+            (
+                "books by genre",
+                Book.objects.filter(
+                    Exists(
+                        Book.genre.through.objects.filter(
+                            book=OuterRef("pk"), genre=genre_id.first()
+                        )
+                    )
+                )
+                .select_related("author")
+                .order_by("title", "id")[:10],
+            ),
+            (
+                "books by language",
+                Book.objects.filter(language=language_id.first())
+                .select_related("author")
+                .order_by("title", "id")[:10],
+            ),
+            (
+                "authors by name",
+                Author.objects.order_by("last_name", "first_name", "id")[:10],
+            ),
+        ]
+
+    def handle(self, *args, **options):
+        explain_options = {"analyze": True} if options["analyze"] else {}
+        for label, queryset in self.get_queries():
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self.stdout.write(queryset.explain(**explain_options))
+            self.stdout.write("")
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog import export
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream the catalog as CSV or JSON lines. Rows are read through "
+        "server-side cursors, so memory use does not grow with the table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=sorted(export.DATASETS))
+        parser.add_argument("--format", choices=["csv", "jsonl"], default="csv")
+        parser.add_argument(
+            "--output", help="File to write to. Defaults to standard output."
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Rows fetched from the database per round trip.",
+        )
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+        lines = export.iter_export(
+            options["dataset"], options["format"], options["chunk_size"]
+        )
+        if options["output"]:
+            with open(options["output"], "w", newline="", encoding="utf-8") as fh:
+                fh.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending="")
@@ -0,0 +1,315 @@
+import csv
+import io
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+
+from catalog import fragments, search
+from catalog.isbn import forget as forget_isbns, normalize as normalize_isbn
+from catalog.models import Author, Book, BookInstance, CatalogStats, Genre, Language
+from catalog.signals import authors_changed
+
+STATUSES = dict(BookInstance.LOAN_STATUS)
+TITLE_LENGTH = Book._meta.get_field("title").max_length
+LANGUAGE_LENGTH = Language._meta.get_field("name").max_length
+
+
+class Command(BaseCommand):
+    help = (
+        "Import books, authors, genres and copies from a CSV or JSON-lines feed. "
+        "Columns: title, summary, isbn, author_first_name, author_last_name, "
+        "language, genres (separated by '|' in CSV), copies, imprint, status. "
+        "ISBN-10s are stored as ISBN-13s; rows without a valid ISBN are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Feed to import, or '-' for stdin.")
+        parser.add_argument(
+            "--format",
+            choices=["csv", "jsonl"],
+            help="Input format. Guessed from the file extension by default.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Rows written per bulk insert and per transaction.",
+        )
+        parser.add_argument(
+            "--state-file",
+            help="Where to record progress. Defaults to '<path>.progress'.",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore any recorded progress and start from the first row.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        input_format = options["format"] or self.guess_format(path)
+        state_file = options["state_file"] or (
+            None if path == "-" else path + ".progress"
+        )
+        done = 0 if options["restart"] else self.read_state(state_file, path)
+
+        self.authors = {}
+        self.languages = {}
+        self.genres = {}
+        self.totals = {"rows": 0, "books": 0, "copies": 0, "skipped": 0}
+        started = time.monotonic()
+
+        with self.open_input(path) as stream:
+            rows = self.read_rows(stream, input_format)
+            batch = []
+            for position, row in enumerate(rows, start=1):
+                if position <= done:
+                    continue
+                batch.append((position, row))
+                if len(batch) >= batch_size:
+                    self.commit_batch(batch, state_file, path, started)
+                    batch = []
+            if batch:
+                self.commit_batch(batch, state_file, path, started)
+
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Imported %(books)s books and %(copies)s copies from %(rows)s rows "
+                "(%(skipped)s skipped)" % self.totals
+                + " in %.1fs, %.0f rows/sec." % (elapsed, self.totals["rows"] / elapsed)
+            )
+        )
+
+    def guess_format(self, path):
+        if path.endswith((".jsonl", ".ndjson", ".json")):
+            return "jsonl"
+        if path.endswith(".csv") or path == "-":
+            return "csv"
+        raise CommandError("Cannot guess the format of %s, pass --format." % path)
+
+    def open_input(self, path):
+        if path == "-":
+            return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8")
+        try:
+            return open(path, newline="", encoding="utf-8")
+        except OSError as exc:
+            raise CommandError("Cannot open %s: %s" % (path, exc))
+
+    def read_rows(self, stream, input_format):
+        if input_format == "csv":
+            yield from csv.DictReader(stream)
+        else:
+            for line in stream:
+                if line.strip():
+                    yield json.loads(line)
+
+    def read_state(self, state_file, path):
+        if not state_file or not os.path.exists(state_file):
+            return 0
+        with open(state_file) as fh:
+            state = json.load(fh)
+        if state.get("source") != os.path.abspath(path):
+            raise CommandError(
+                "%s records progress for another feed, pass --restart or "
+                "--state-file." % state_file
+            )
+        self.stdout.write("Resuming after row %s." % state["rows"])
+        return state["rows"]
+
+    def write_state(self, state_file, path, rows):
+        if not state_file:
+            return
+        tmp = state_file + ".tmp"
+        with open(tmp, "w") as fh:
+            json.dump({"source": os.path.abspath(path), "rows": rows}, fh)
+        os.replace(tmp, state_file)
+
+    def commit_batch(self, batch, state_file, path, started):
+        with transaction.atomic():
+            books, copies = self.write_batch([row for _, row in batch])
+        self.totals["rows"] += len(batch)
+        self.totals["books"] += books
+        self.totals["copies"] += copies
+        self.write_state(state_file, path, batch[-1][0])
+
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(
+            "Committed rows %s-%s: %s books, %s copies (%.0f rows/sec)"
+            % (batch[0][0], batch[-1][0], books, copies, self.totals["rows"] / elapsed)
+        )
+
+    def write_batch(self, rows):
+        records = []
+        seen = set()
+        for row in rows:
+            record = self.clean_row(row)
+            if record is None or record["isbn"] in seen:
+                self.totals["skipped"] += 1
+                continue
+            seen.add(record["isbn"])
+            records.append(record)
+
+        existing = set(
+            Book.objects.filter(isbn__in=seen).values_list("isbn", flat=True)
+        )
+        self.totals["skipped"] += len(existing)
+        records = [r for r in records if r["isbn"] not in existing]
+        if not records:
+            return 0, 0
+
+        new_authors = self.resolve_authors(
+            {r["author"] for r in records if r["author"]}
+        )
+        self.resolve_named(
+            Language, self.languages, {r["language"] for r in records if r["language"]}
+        )
+        new_genres = self.resolve_named(
+            Genre, self.genres, {g for r in records for g in r["genres"]}
+        )
+
+        Book.objects.bulk_create(
+            [
+                Book(
+                    title=r["title"],
+                    summary=r["summary"],
+                    isbn=r["isbn"],
+                    author_id=self.authors.get(r["author"]),
+                    language_id=self.languages.get(r["language"]),
+                    copies_total=r["copies"],
+                    copies_available=r["copies"] if r["status"] == "a" else 0,
+                    copies_on_loan=r["copies"] if r["status"] == "o" else 0,
+                )
+                for r in records
+            ],
+            batch_size=len(records),
+        )
+        book_ids = dict(
+            Book.objects.filter(isbn__in=[r["isbn"] for r in records]).values_list(
+                "isbn", "pk"
+            )
+        )
+
+        links = [
+            Book.genre.through(book_id=book_ids[r["isbn"]], genre_id=genre_id)
+            for r in records
+            for genre_id in {self.genres[g] for g in r["genres"]}
+        ]
+        Book.genre.through.objects.bulk_create(links)
+        self.count_books(Genre, Counter(link.genre_id for link in links))
+        self.count_books(
+            Language,
+            Counter(self.languages[r["language"]] for r in records if r["language"]),
+        )
+        copies = [
+            BookInstance(
+                book_id=book_ids[r["isbn"]], imprint=r["imprint"], status=r["status"]
+            )
+            for r in records
+            for _ in range(r["copies"])
+        ]
+        BookInstance.objects.bulk_create(copies, batch_size=max(len(copies), 1))
+
+        CatalogStats.increment(
+            num_books=len(records),
+            num_instances=len(copies),
+            num_instances_available=sum(1 for c in copies if c.status == "a"),
+            num_authors=new_authors,
+            num_genres=new_genres,
+        )
+        search.index_books(book_ids.values())
+        forget_isbns(*book_ids)
+        # bulk_create() skips the signals that keep these fresh.
+        authors_changed(self.authors[r["author"]] for r in records if r["author"])
+        if links:
+            fragments.bump_namespace("genre")
+        if any(r["language"] for r in records):
+            fragments.bump_namespace("language")
+        return len(records), len(copies)
+
+    def count_books(self, model, counts):
+        for pk, count in counts.items():
+            model.objects.filter(pk=pk).update(book_count=F("book_count") + count)
+
+    def clean_row(self, row):
+        title = (row.get("title") or "").strip()
+        try:
+            isbn = normalize_isbn(row.get("isbn") or "")
+        except ValueError:
+            isbn = None
+        status = (row.get("status") or "a").strip()
+        try:
+            copies = int(row.get("copies") or 0)
+        except (TypeError, ValueError):
+            copies = -1
+        language = (row.get("language") or "").strip()
+        if (
+            not title
+            or not isbn
+            or status not in STATUSES
+            or copies < 0
+            or len(title) > TITLE_LENGTH
+            or len(language) > LANGUAGE_LENGTH
+        ):
+            self.stderr.write("Skipping invalid row: %r" % (row,))
+            return None
+
+        first_name = (row.get("author_first_name") or "").strip()
+        last_name = (row.get("author_last_name") or "").strip()
+        genres = row.get("genres") or []
+        if isinstance(genres, str):
+            genres = genres.split("|")
+        return {
+            "title": title,
+            "summary": (row.get("summary") or "").strip(),
+            "isbn": isbn,
+            "author": (first_name, last_name) if first_name or last_name else None,
+            "language": language,
+            "genres": {g.strip() for g in genres if g and g.strip()},
+            "copies": copies,
+            "imprint": (row.get("imprint") or "").strip(),
+            "status": status,
+        }
+
+    def resolve_authors(self, names):
+        missing = names - self.authors.keys()
+        if not missing:
+            return 0
+        self.load_authors(missing)
+        to_create = missing - self.authors.keys()
+        Author.objects.bulk_create(
+            [Author(first_name=first, last_name=last) for first, last in to_create]
+        )
+        self.load_authors(to_create)
+        return len(to_create)
+
+    def load_authors(self, names):
+        if not names:
+            return
+        authors = (
+            Author.objects.filter(last_name__in={last for _, last in names})
+            .order_by("-pk")
+            .values_list("first_name", "last_name", "pk")
+        )
+        for first_name, last_name, pk in authors:
+            if (first_name, last_name) in names:
+                self.authors[(first_name, last_name)] = pk
+
+    def resolve_named(self, model, cache, names):
+        missing = names - cache.keys()
+        if not missing:
+            return 0
+        cache.update(model.objects.filter(name__in=missing).values_list("name", "pk"))
+        to_create = missing - cache.keys()
+        model.objects.bulk_create([model(name=name) for name in to_create])
+        cache.update(model.objects.filter(name__in=to_create).values_list("name", "pk"))
+        return len(to_create)
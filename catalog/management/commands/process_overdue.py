@@ -0,0 +1,123 @@
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.mail import send_mass_mail
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from catalog import loans as loan_service
+from catalog.models import BookInstance
+
+
+class Command(BaseCommand):
+    help = (
+        "Release holds that were not picked up, then assess fines on overdue "
+        "loans in locked chunks and print a digest per "
+        "borrower. Safe to run from several nodes at once: rows locked by another "
+        "run are skipped, and a loan is assessed at most once per day."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Loans locked and updated per transaction.",
+        )
+        parser.add_argument(
+            "--date",
+            type=datetime.date.fromisoformat,
+            help="Assess as of this date (YYYY-MM-DD) instead of today.",
+        )
+        parser.add_argument(
+            "--notify",
+            action="store_true",
+            help="Email each borrower their digest.",
+        )
+
+    def handle(self, *args, **options):
+        today = options["date"] or datetime.date.today()
+        rate = Decimal(getattr(settings, "CATALOG_OVERDUE_FINE_PER_DAY", "0.25"))
+        cap = Decimal(getattr(settings, "CATALOG_OVERDUE_FINE_CAP", "10.00"))
+        released = loan_service.release_expired_holds(today)
+        self.stdout.write("Released %s expired holds." % released)
+        pending = BookInstance.objects.filter(
+            Q(fine_assessed_on__isnull=True) | Q(fine_assessed_on__lt=today),
+            status="o",
+            due_back__lt=today,
+        ).order_by("due_back", "id")
+
+        digests = defaultdict(list)
+        processed = 0
+        while True:
+            with transaction.atomic():
+                loans = list(
+                    pending.select_for_update(skip_locked=True).values_list(
+                        "id", "due_back"
+                    )[: options["chunk_size"]]
+                )
+                if not loans:
+                    break
+
+                by_fine = defaultdict(list)
+                for pk, due_back in loans:
+                    days = (today - due_back).days
+                    by_fine[min(rate * days, cap)].append(pk)
+                for fine, ids in by_fine.items():
+                    BookInstance.objects.filter(id__in=ids).update(
+                        fine=fine, fine_assessed_on=today
+                    )
+
+                rows = BookInstance.objects.filter(
+                    id__in=[pk for pk, _ in loans]
+                ).values_list(
+                    "borrower__username",
+                    "borrower__email",
+                    "book__title",
+                    "due_back",
+                    "fine",
+                )
+                for username, email, title, due_back, fine in rows:
+                    digests[(username, email)].append((title, due_back, fine))
+            processed += len(loans)
+
+        for (username, email), items in sorted(
+            digests.items(), key=lambda item: item[0][0] or ""
+        ):
+            self.stdout.write(self.format_digest(username, items))
+
+        if options["notify"]:
+            sent = send_mass_mail(
+                [
+                    (
+                        "Overdue library books",
+                        self.format_digest(username, items),
+                        None,
+                        [email],
+                    )
+                    for (username, email), items in digests.items()
+                    if email
+                ]
+            )
+            self.stdout.write("Sent %s digests." % sent)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Assessed %s overdue loans for %s borrowers."
+                % (processed, len(digests))
+            )
+        )
+
+    def format_digest(self, username, items):
+        total = sum(fine for _, _, fine in items)
+        lines = [
+            "%s: %s overdue, %s due" % (username or "(no borrower)", len(items), total)
+        ]
+        for title, due_back, fine in sorted(items, key=lambda item: item[1]):
+            lines.append(
+                "  %s (due %s) %s" % (title or "(unknown book)", due_back, fine)
+            )
+        return "\n".join(lines)
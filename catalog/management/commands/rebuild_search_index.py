@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from catalog import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index for every book in the catalog."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help="Database to rebuild the index on.",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic(using=options["database"]):
+            count = search.rebuild_index(using=options["database"])
+        self.stdout.write(self.style.SUCCESS("Indexed %s books." % count))
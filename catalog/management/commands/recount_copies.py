@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from catalog.models import Book
+from catalog.signals import copies_changed
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the per-book copies_total/copies_available/copies_on_loan "
+        "counters from BookInstance rows, repairing any drift."
+    )
+
+    def handle(self, *args, **options):
+        drifted = list(Book.objects.with_copy_drift().values_list("pk", flat=True))
+        for start in range(0, len(drifted), BATCH_SIZE):
+            batch = drifted[start : start + BATCH_SIZE]
+            Book.objects.filter(pk__in=batch).recount_copies()
+            # update() skips the stamps, fragments and ISBN lookups that
+            # show these counters.
+            copies_changed(batch)
+        self.stdout.write(
+            self.style.SUCCESS("Recounted copies for %s drifted books." % len(drifted))
+        )
@@ -0,0 +1,120 @@
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from . import instrumentation, routers
+
+logger = logging.getLogger("catalog.instrumentation")
+
+
+class QueryTimingMiddleware:
+    """
+    Record SQL query count, database time, template render time and view time
+    for every request. Enabled with ``settings.CATALOG_INSTRUMENTATION``; when
+    disabled the middleware removes itself from the stack at startup.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "CATALOG_INSTRUMENTATION", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        instrumentation.install_template_timer()
+
+    def __call__(self, request):
+        metrics = instrumentation.RequestMetrics()
+        token = instrumentation.current_metrics.set(metrics)
+        started = time.perf_counter()
+        try:
+            with instrumentation.timed_queries(metrics):
+                response = self.get_response(request)
+        finally:
+            instrumentation.current_metrics.reset(token)
+        total = time.perf_counter() - started
+
+        view_started = getattr(request, "_catalog_view_started", None)
+        view = (started + total - view_started) if view_started else 0.0
+        self.report(request, response, metrics, total, view)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._catalog_view_started = time.perf_counter()
+
+    def report(self, request, response, metrics, total, view):
+        total_ms = total * 1000
+        view_ms = view * 1000
+        db_ms = metrics.db_time * 1000
+        template_ms = metrics.template_time * 1000
+        response["Server-Timing"] = ", ".join(
+            [
+                'db;dur=%.2f;desc="%s queries"' % (db_ms, metrics.queries),
+                "tpl;dur=%.2f" % template_ms,
+                "view;dur=%.2f" % view_ms,
+                "total;dur=%.2f" % total_ms,
+            ]
+        )
+
+        match = getattr(request, "resolver_match", None)
+        url_name = (match.url_name if match else None) or "<unresolved>"
+        instrumentation.store.add(
+            url_name, total_ms, view_ms, db_ms, template_ms, metrics.queries
+        )
+        logger.info(
+            json.dumps(
+                {
+                    "url_name": url_name,
+                    "path": request.path,
+                    "method": request.method,
+                    "status": response.status_code,
+                    "queries": metrics.queries,
+                    "db_ms": round(db_ms, 2),
+                    "template_ms": round(template_ms, 2),
+                    "view_ms": round(view_ms, 2),
+                    "total_ms": round(total_ms, 2),
+                },
+                sort_keys=True,
+            )
+        )
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Route the catalog reads of the views in ``settings.CATALOG_REPLICA_VIEWS``
+    to a read replica (see :mod:`catalog.routers`), and pin clients to the
+    primary for a while after they POST. Removes itself when
+    ``settings.CATALOG_REPLICAS`` is empty.
+    """
+
+    pin_cookie = "catalog_primary"
+
+    def __init__(self, get_response):
+        if not getattr(settings, "CATALOG_REPLICAS", []):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = routers.read_alias.set(None)
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.read_alias.reset(token)
+        if request.method not in ("GET", "HEAD", "OPTIONS", "TRACE"):
+            response.set_cookie(
+                self.pin_cookie,
+                "1",
+                max_age=getattr(settings, "CATALOG_REPLICA_PIN_SECONDS", 10),
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (
+            request.method in ("GET", "HEAD")
+            and request.resolver_match.url_name
+            in getattr(settings, "CATALOG_REPLICA_VIEWS", ())
+            and self.pin_cookie not in request.COOKIES
+        ):
+            routers.read_alias.set(routers.choose_replica())
@@ -0,0 +1,56 @@
+# Generated by Django 3.1.3 on 2026-10-18 18:20
+
+from django.db import migrations, models
+
+
+def populate_stats(apps, schema_editor):
+    Author = apps.get_model("catalog", "Author")
+    Book = apps.get_model("catalog", "Book")
+    BookInstance = apps.get_model("catalog", "BookInstance")
+    CatalogStats = apps.get_model("catalog", "CatalogStats")
+    Genre = apps.get_model("catalog", "Genre")
+    CatalogStats.objects.update_or_create(
+        pk=1,
+        defaults={
+            "num_books": Book.objects.count(),
+            "num_instances": BookInstance.objects.count(),
+            "num_instances_available": BookInstance.objects.filter(
+                status__exact="a"
+            ).count(),
+            "num_authors": Author.objects.count(),
+            "num_genres": Genre.objects.count(),
+        },
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0003_auto_20201010_1426"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CatalogStats",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("num_books", models.IntegerField(default=0)),
+                ("num_instances", models.IntegerField(default=0)),
+                ("num_instances_available", models.IntegerField(default=0)),
+                ("num_authors", models.IntegerField(default=0)),
+                ("num_genres", models.IntegerField(default=0)),
+            ],
+            options={
+                "verbose_name_plural": "catalog stats",
+            },
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+from catalog import search
+
+
+def create_search_index(apps, schema_editor):
+    search.create_index(schema_editor)
+    search.rebuild_index(
+        book_model=apps.get_model("catalog", "Book"),
+        using=schema_editor.connection.alias,
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    search.drop_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0004_catalogstats"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 3.1.3 on 2026-10-18 18:25
+
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_duplicate_isbns(apps, schema_editor):
+    # Which of two books sharing an ISBN is the real one (and where their
+    # copies belong) is for a librarian to decide, so refuse to guess.
+    Book = apps.get_model("catalog", "Book")
+    duplicated = (
+        Book.objects.values("isbn").annotate(books=Count("pk")).filter(books__gt=1)
+    )
+    books = defaultdict(list)
+    for isbn, pk in (
+        Book.objects.filter(isbn__in=duplicated.values("isbn"))
+        .order_by("isbn", "pk")
+        .values_list("isbn", "pk")
+    ):
+        books[isbn].append(str(pk))
+    if books:
+        raise RuntimeError(
+            "These books share an ISBN, which is about to become unique; merge "
+            "or correct them first:\n%s"
+            % "\n".join(
+                "  ISBN %r: books %s" % (isbn, ", ".join(pks))
+                for isbn, pks in books.items()
+            )
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0005_book_search_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_isbns, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="book",
+            name="isbn",
+            field=models.CharField(
+                help_text="13 Caracteres <a href='https://www.isbn-international.org/content/what-isbn'>ISBN number</a>",
+                max_length=13,
+                unique=True,
+                verbose_name="ISBN",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="book",
+            name="title",
+            field=models.CharField(db_index=True, max_length=200),
+        ),
+        migrations.AddIndex(
+            model_name="author",
+            index=models.Index(
+                fields=["last_name", "first_name", "id"], name="author_name_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="bookinstance",
+            index=models.Index(fields=["due_back"], name="bookinstance_due_back_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="bookinstance",
+            index=models.Index(
+                fields=["status", "due_back"], name="bookinstance_status_due_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="bookinstance",
+            index=models.Index(
+                fields=["borrower", "status", "due_back"],
+                name="bookinstance_borrower_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="bookinstance",
+            index=models.Index(
+                condition=models.Q(status="o"),
+                fields=["due_back"],
+                name="bookinstance_on_loan_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.3 on 2026-10-18 18:27
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0006_lookup_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="book",
+            options={"permissions": (("can_export_catalog", "Export the catalog"),)},
+        ),
+    ]
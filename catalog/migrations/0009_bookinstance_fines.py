@@ -0,0 +1,26 @@
+# Generated by Django 3.1.3 on 2026-10-18 18:37
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0008_modified_stamps"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bookinstance",
+            name="fine",
+            field=models.DecimalField(
+                decimal_places=2, default=Decimal("0"), max_digits=7
+            ),
+        ),
+        migrations.AddField(
+            model_name="bookinstance",
+            name="fine_assessed_on",
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+    ]
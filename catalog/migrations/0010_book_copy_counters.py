@@ -0,0 +1,55 @@
+# Generated by Django 3.1.3 on 2026-10-18 18:42
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    Book = apps.get_model("catalog", "Book")
+    BookInstance = apps.get_model("catalog", "BookInstance")
+    copies = BookInstance.objects.filter(book=OuterRef("pk")).order_by()
+
+    def count(**filters):
+        counted = (
+            copies.filter(**filters).values("book").annotate(n=Count("pk")).values("n")
+        )
+        return Coalesce(Subquery(counted), 0)
+
+    Book.objects.update(
+        copies_total=count(),
+        copies_available=count(status="a"),
+        copies_on_loan=count(status="o"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0009_bookinstance_fines"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="book",
+            name="copies_available",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="copies_on_loan",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="copies_total",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(
+                fields=["-copies_available", "title", "id"], name="book_available_idx"
+            ),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
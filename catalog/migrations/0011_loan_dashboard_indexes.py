@@ -0,0 +1,36 @@
+# Generated by Django 3.1.3 on 2026-10-18 18:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0010_book_copy_counters"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="bookinstance",
+            name="bookinstance_borrower_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="bookinstance",
+            name="bookinstance_on_loan_idx",
+        ),
+        migrations.AddIndex(
+            model_name="bookinstance",
+            index=models.Index(
+                fields=["borrower", "status", "due_back", "id"],
+                name="bookinstance_borrower_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="bookinstance",
+            index=models.Index(
+                condition=models.Q(status="o"),
+                fields=["due_back", "id"],
+                name="bookinstance_on_loan_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 3.1.3 on 2026-10-18 19:31
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_book_counts(apps, schema_editor):
+    Book = apps.get_model("catalog", "Book")
+    Genre = apps.get_model("catalog", "Genre")
+    Language = apps.get_model("catalog", "Language")
+
+    def count(queryset, field):
+        counted = (
+            queryset.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(n=Count("pk"))
+            .values("n")
+        )
+        return Coalesce(Subquery(counted), 0)
+
+    Genre.objects.update(book_count=count(Book.genre.through.objects, "genre"))
+    Language.objects.update(book_count=count(Book.objects, "language"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0011_loan_dashboard_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="genre",
+            name="book_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="language",
+            name="book_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(
+                fields=["language", "title", "id"], name="book_language_title_idx"
+            ),
+        ),
+        # The auto-created through table can't declare Meta.indexes. Its
+        # unique (book_id, genre_id) index serves book -> genres; genre pages
+        # go the other way and read only these two columns.
+        migrations.RunSQL(
+            "CREATE INDEX book_genre_genre_book_idx "
+            "ON catalog_book_genre (genre_id, book_id)",
+            "DROP INDEX book_genre_genre_book_idx",
+        ),
+        migrations.RunPython(populate_book_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.1.3 on 2026-10-18 19:38
+
+import catalog.isbn
+from django.db import migrations, models
+
+
+def normalize_isbns(apps, schema_editor):
+    Book = apps.get_model("catalog", "Book")
+    taken = set(Book.objects.values_list("isbn", flat=True))
+    for pk, isbn in Book.objects.values_list("pk", "isbn").iterator():
+        normalized = catalog.isbn.coerce(isbn)
+        # Two spellings of one ISBN can't share the unique index; leave the
+        # second one for a librarian to merge.
+        if normalized != isbn and normalized not in taken:
+            Book.objects.filter(pk=pk).update(isbn=normalized)
+            taken.add(normalized)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0012_browse_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="book",
+            name="isbn",
+            field=models.CharField(
+                help_text="13 Caracteres <a href='https://www.isbn-international.org/content/what-isbn'>ISBN number</a>",
+                max_length=13,
+                unique=True,
+                validators=[catalog.isbn.validate_isbn],
+                verbose_name="ISBN",
+            ),
+        ),
+        migrations.RunPython(normalize_isbns, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.1.3 on 2026-10-18 19:58
+
+import catalog.isbn
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0013_normalize_isbn"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="book",
+            name="isbn",
+            field=catalog.isbn.ISBNField(
+                help_text="13 Caracteres <a href='https://www.isbn-international.org/content/what-isbn'>ISBN number</a>",
+                max_length=13,
+                unique=True,
+                validators=[catalog.isbn.validate_isbn],
+                verbose_name="ISBN",
+            ),
+        ),
+    ]
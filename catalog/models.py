@@ -1,51 +1,177 @@
 from django.contrib.auth.models import User
 from django.urls import reverse
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models import Count, F, OuterRef, Prefetch, Q, Subquery
+from django.db.models.functions import Coalesce
 from datetime import date
+from decimal import Decimal
 import uuid
 
+from .isbn import ISBNField, coerce as coerce_isbn, validate_isbn
+
+
+class GenreQuerySet(models.QuerySet):
+    def recount_books(self):
+        links = (
+            Book.genre.through.objects.filter(genre=OuterRef("pk"))
+            .order_by()
+            .values("genre")
+            .annotate(n=Count("pk"))
+            .values("n")
+        )
+        return self.update(book_count=Coalesce(Subquery(links), 0))
+
 
 class Genre(models.Model):
     name = models.CharField(
         max_length=200,
         help_text="Ingrese el nombre del género (p. ej. Ciencia Ficción, Poesía Francesa, etc.)",
     )
+    book_count = models.IntegerField(default=0, editable=False)
+
+    objects = GenreQuerySet.as_manager()
 
     def __str__(self):
         return self.name
 
+    def get_absolute_url(self):
+        return reverse("genre-detail", args=[str(self.id)])
+
+
+class LanguageQuerySet(models.QuerySet):
+    def recount_books(self):
+        books = (
+            Book.objects.filter(language=OuterRef("pk"))
+            .order_by()
+            .values("language")
+            .annotate(n=Count("pk"))
+            .values("n")
+        )
+        return self.update(book_count=Coalesce(Subquery(books), 0))
+
 
 class Language(models.Model):
     name = models.CharField(
         max_length=20,
         help_text="Ingrese el nombre del lenguaje (p. ej. Ingles, Español, etc.)",
     )
+    book_count = models.IntegerField(default=0, editable=False)
+
+    objects = LanguageQuerySet.as_manager()
 
     def __str__(self):
         return self.name
 
+    def get_absolute_url(self):
+        return reverse("language-detail", args=[str(self.id)])
+
+
+class BookQuerySet(models.QuerySet):
+    def with_detail(self):
+        return (
+            self.select_related("author", "language")
+            .only(
+                "title",
+                "summary",
+                "isbn",
+                "copies_total",
+                "copies_available",
+                "copies_on_loan",
+                "author__first_name",
+                "author__last_name",
+                "language__name",
+            )
+            .prefetch_related(
+                Prefetch("genre", queryset=Genre.objects.only("name")),
+                Prefetch(
+                    "bookinstance_set",
+                    queryset=BookInstance.objects.only(
+                        "book", "imprint", "due_back", "status"
+                    ),
+                ),
+            )
+        )
+
+    def with_copy_counts(self):
+        return self.annotate(
+            num_copies=Count("bookinstance"),
+            num_available=Count("bookinstance", filter=Q(bookinstance__status="a")),
+            num_on_loan=Count("bookinstance", filter=Q(bookinstance__status="o")),
+        )
+
+    def with_copy_drift(self):
+        return self.with_copy_counts().exclude(
+            copies_total=F("num_copies"),
+            copies_available=F("num_available"),
+            copies_on_loan=F("num_on_loan"),
+        )
+
+    def recount_copies(self):
+        copies = BookInstance.objects.filter(book=OuterRef("pk")).order_by()
+
+        def count(**filters):
+            counted = (
+                copies.filter(**filters)
+                .values("book")
+                .annotate(n=Count("pk"))
+                .values("n")
+            )
+            return Coalesce(Subquery(counted), 0)
+
+        return self.update(
+            copies_total=count(),
+            copies_available=count(status="a"),
+            copies_on_loan=count(status="o"),
+        )
+
 
 class Book(models.Model):
-    title = models.CharField(max_length=200)
+    title = models.CharField(max_length=200, db_index=True)
     author = models.ForeignKey(
         "Author", on_delete=models.SET_NULL, null=True, blank=True
     )
     summary = models.TextField(
         max_length=1000, help_text="Ingrese una breve descripción del libro"
     )
-    isbn = models.CharField(
+    isbn = ISBNField(
         "ISBN",
         max_length=13,
+        unique=True,
+        validators=[validate_isbn],
         help_text="13 Caracteres <a href='https://www.isbn-international.org/content/what-isbn'>ISBN number</a>",
     )
     genre = models.ManyToManyField(
         Genre, help_text="Seleccione un genero para este libro"
     )
     language = models.ForeignKey("Language", on_delete=models.SET_NULL, null=True)
+    modified = models.DateTimeField(auto_now=True, db_index=True)
+    copies_total = models.IntegerField(default=0, editable=False)
+    copies_available = models.IntegerField(default=0, editable=False)
+    copies_on_loan = models.IntegerField(default=0, editable=False)
+
+    objects = BookQuerySet.as_manager()
+
+    class Meta:
+        permissions = (("can_export_catalog", "Export the catalog"),)
+        indexes = [
+            models.Index(
+                fields=["-copies_available", "title", "id"],
+                name="book_available_idx",
+            ),
+            models.Index(
+                fields=["language", "title", "id"], name="book_language_title_idx"
+            ),
+        ]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        # Leave a deferred isbn alone rather than loading it.
+        if self.__dict__.get("isbn"):
+            self.isbn = coerce_isbn(self.isbn)
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse("book-detail", args=[str(self.id)])
 
@@ -80,10 +206,35 @@ class BookInstance(models.Model):
         default="m",
         help_text="Disponibilidad del libro",
     )
+    fine = models.DecimalField(max_digits=7, decimal_places=2, default=Decimal("0"))
+    fine_assessed_on = models.DateField(null=True, blank=True, editable=False)
 
     class Meta:
         ordering = ["due_back"]
         permissions = (("can_mark_returned", "Set book as returned"),)
+        indexes = [
+            models.Index(fields=["due_back"], name="bookinstance_due_back_idx"),
+            models.Index(
+                fields=["status", "due_back"], name="bookinstance_status_due_idx"
+            ),
+            models.Index(
+                fields=["borrower", "status", "due_back", "id"],
+                name="bookinstance_borrower_idx",
+            ),
+            models.Index(
+                fields=["due_back", "id"],
+                condition=Q(status="o"),
+                name="bookinstance_on_loan_idx",
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Django sends post_save after the row is written and outside any
+        # transaction of its own; wrapping the save keeps the copy counters
+        # kept by the post_save handler atomic with the row.
+        using = kwargs.get("using") or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
 
     @property
     def is_overdue(self):
@@ -100,9 +251,58 @@ class Author(models.Model):
     last_name = models.CharField(max_length=100)
     date_of_birth = models.DateField(null=True, blank=True)
     date_of_death = models.DateField("Died", null=True, blank=True)
+    modified = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["last_name", "first_name", "id"], name="author_name_idx"
+            ),
+        ]
 
     def get_absolute_url(self):
         return reverse("author-detail", args=[str(self.id)])
 
     def __str__(self):
         return "%s, %s" % (self.last_name, self.first_name)
+
+
+class CatalogStats(models.Model):
+    num_books = models.IntegerField(default=0)
+    num_instances = models.IntegerField(default=0)
+    num_instances_available = models.IntegerField(default=0)
+    num_authors = models.IntegerField(default=0)
+    num_genres = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "catalog stats"
+
+    @classmethod
+    def load(cls):
+        stats = cls.objects.filter(pk=1).first()
+        if stats is None:
+            stats = cls.rebuild()
+        return stats
+
+    @classmethod
+    def increment(cls, **deltas):
+        changes = {name: F(name) + delta for name, delta in deltas.items() if delta}
+        if changes and not cls.objects.filter(pk=1).update(**changes):
+            cls.rebuild()
+
+    @classmethod
+    def rebuild(cls):
+        counts = {
+            "num_books": Book.objects.count(),
+            "num_instances": BookInstance.objects.count(),
+            "num_instances_available": BookInstance.objects.filter(
+                status__exact="a"
+            ).count(),
+            "num_authors": Author.objects.count(),
+            "num_genres": Genre.objects.count(),
+        }
+        stats, _ = cls.objects.update_or_create(pk=1, defaults=counts)
+        return stats
+
+    def __str__(self):
+        return "%s books, %s copies" % (self.num_books, self.num_instances)
@@ -0,0 +1,334 @@
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, Paginator
+from django.db import connections
+from django.db.models import F, Q
+from django.http import Http404, QueryDict
+from django.utils.functional import cached_property
+
+CURSOR_SALT = "catalog.pagination.cursor"
+
+
+class KeysetPage:
+    def __init__(self, object_list, has_next, has_previous, ordering, params):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.ordering = ordering
+        self.params = params
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next and self.object_list:
+            return encode_cursor("n", self.ordering, self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous and self.object_list:
+            return encode_cursor("p", self.ordering, self.object_list[0])
+
+    @property
+    def next_page_query(self):
+        return self._query_for(self.next_cursor)
+
+    @property
+    def previous_page_query(self):
+        return self._query_for(self.previous_cursor)
+
+    def _query_for(self, cursor):
+        if cursor is None:
+            return ""
+        params = self.params.copy()
+        params.pop("page", None)
+        params["cursor"] = cursor
+        return "?" + params.urlencode()
+
+
+class KeysetPaginator:
+    """
+    Paginate by seeking past the last row seen instead of using OFFSET, so
+    every page costs the same. ``ordering`` must end in a unique, non-null
+    column (usually the primary key) for the seek to be stable. Nullable
+    columns before it sort NULLs last (first when descending) on every
+    database.
+    """
+
+    def __init__(self, queryset, per_page, ordering):
+        self.ordering = tuple(ordering)
+        self.nullable = nullable_fields(queryset.model, self.ordering)
+        self.queryset = queryset.order_by(
+            *order_expressions(self.ordering, self.nullable)
+        )
+        self.per_page = per_page
+
+    def page(self, cursor=None, params=None):
+        params = params if params is not None else QueryDict()
+        if not cursor:
+            rows = list(self.queryset[: self.per_page + 1])
+            return KeysetPage(
+                rows[: self.per_page],
+                len(rows) > self.per_page,
+                False,
+                self.ordering,
+                params,
+            )
+
+        direction, values = decode_cursor(cursor, self.queryset.model, self.ordering)
+        if direction == "p":
+            queryset = self.queryset.filter(
+                seek_filter(
+                    self.ordering, values, backwards=True, nullable=self.nullable
+                )
+            ).reverse()
+            rows = list(queryset[: self.per_page + 1])
+            return KeysetPage(
+                rows[: self.per_page][::-1],
+                True,
+                len(rows) > self.per_page,
+                self.ordering,
+                params,
+            )
+
+        queryset = self.queryset.filter(
+            seek_filter(self.ordering, values, nullable=self.nullable)
+        )
+        rows = list(queryset[: self.per_page + 1])
+        return KeysetPage(
+            rows[: self.per_page],
+            len(rows) > self.per_page,
+            True,
+            self.ordering,
+            params,
+        )
+
+
+def model_field(model, name):
+    return model._meta.pk if name == "pk" else model._meta.get_field(name)
+
+
+def nullable_fields(model, ordering):
+    names = (field.lstrip("-") for field in ordering)
+    return frozenset(name for name in names if model_field(model, name).null)
+
+
+def order_expressions(ordering, nullable):
+    expressions = []
+    for field in ordering:
+        name = field.lstrip("-")
+        if name not in nullable:
+            expressions.append(field)
+        elif field.startswith("-"):
+            expressions.append(F(name).desc(nulls_first=True))
+        else:
+            expressions.append(F(name).asc(nulls_last=True))
+    return expressions
+
+
+def equal_to(name, value):
+    if value is None:
+        return Q(**{"%s__isnull" % name: True})
+    return Q(**{name: value})
+
+
+def beyond(name, value, descending, nullable):
+    # NULLs sort after every value going forwards on an ascending column.
+    if value is None:
+        return Q(**{"%s__isnull" % name: False}) if descending else Q(pk__in=[])
+    step = Q(**{"%s__%s" % (name, "lt" if descending else "gt"): value})
+    if name in nullable and not descending:
+        step |= Q(**{"%s__isnull" % name: True})
+    return step
+
+
+def leading_bound(ordering, values, backwards, nullable):
+    # Databases can't start an index range scan from the OR in seek_filter();
+    # repeating the first column's bound as a plain AND term lets them seek
+    # straight to the cursor instead of sorting everything after it.
+    field = ordering[0]
+    name = field.lstrip("-")
+    if values[0] is None or name in nullable:
+        return Q()
+    descending = field.startswith("-") != backwards
+    return Q(**{"%s__%s" % (name, "lte" if descending else "gte"): values[0]})
+
+
+def seek_filter(ordering, values, backwards=False, nullable=frozenset()):
+    condition = Q()
+    for position, field in enumerate(ordering):
+        name = field.lstrip("-")
+        descending = field.startswith("-") != backwards
+        step = beyond(name, values[position], descending, nullable)
+        for previous, value in zip(ordering[:position], values):
+            step &= equal_to(previous.lstrip("-"), value)
+        condition |= step
+    return leading_bound(ordering, values, backwards, nullable) & condition
+
+
+def encode_cursor(direction, ordering, obj):
+    values = []
+    for field in ordering:
+        value = getattr(obj, field.lstrip("-"))
+        if value is not None and not isinstance(value, (int, str)):
+            value = str(value)
+        values.append(value)
+    return signing.dumps([direction, values], salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(cursor, model, ordering):
+    try:
+        direction, raw_values = signing.loads(cursor, salt=CURSOR_SALT)
+        if direction not in ("n", "p") or len(raw_values) != len(ordering):
+            raise ValueError(cursor)
+        values = []
+        for field, value in zip(ordering, raw_values):
+            if value is not None:
+                value = model_field(model, field.lstrip("-")).to_python(value)
+            values.append(value)
+    except (signing.BadSignature, ValidationError, ValueError, TypeError):
+        raise Http404("Invalid cursor")
+    return direction, values
+
+
+def is_unfiltered(queryset):
+    query = getattr(queryset, "query", None)
+    return (
+        query is not None
+        and not query.where
+        and not query.distinct
+        and not query.combinator
+        and query.group_by is None
+        and query.low_mark == 0
+        and query.high_mark is None
+    )
+
+
+def postgresql_estimate(cursor, connection, table):
+    cursor.execute(
+        "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+        [connection.ops.quote_name(table)],
+    )
+    row = cursor.fetchone()
+    # reltuples is -1 (or 0) until the table has been vacuumed or analyzed.
+    return row[0] if row else None
+
+
+def sqlite_estimate(cursor, connection, table):
+    # sqlite_stat1 only exists once ANALYZE has been run; the first number of
+    # each stat row is the table's row count when it was last analyzed.
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+    if cursor.fetchone() is None:
+        return None
+    cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s", [table])
+    counts = [int(stat.split()[0]) for (stat,) in cursor.fetchall()]
+    return max(counts) if counts else None
+
+
+ESTIMATORS = {
+    "postgresql": postgresql_estimate,
+    "sqlite": sqlite_estimate,
+}
+
+
+def estimated_count(queryset):
+    """
+    Return the planner's row estimate for an unfiltered queryset's table, or
+    None when there isn't a usable one.
+    """
+    if not is_unfiltered(queryset):
+        return None
+    connection = connections[queryset.db]
+    estimator = ESTIMATORS.get(connection.vendor)
+    if estimator is None:
+        return None
+    with connection.cursor() as cursor:
+        estimate = estimator(cursor, connection, queryset.model._meta.db_table)
+    return estimate if estimate and estimate > 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that trusts the database's row estimate instead of running
+    COUNT(*) when listing a whole table with at least
+    ``settings.CATALOG_ESTIMATED_COUNT_THRESHOLD`` rows. Filtered querysets,
+    small tables and tables without statistics are counted exactly.
+
+    The estimate is as old as the last ANALYZE, so it only sizes the pages in
+    between: the estimate's last page, any page past it and any page that
+    comes back short are counted exactly, so rows added since are still
+    reachable and removed ones don't leave empty pages.
+    """
+
+    estimated = False
+
+    def get_threshold(self):
+        return getattr(settings, "CATALOG_ESTIMATED_COUNT_THRESHOLD", 100000)
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is not None and estimate >= self.get_threshold():
+            self.estimated = True
+            return estimate
+        return super().count
+
+    def count_exactly(self):
+        self.estimated = False
+        self.__dict__.pop("num_pages", None)
+        self.__dict__["count"] = Paginator.count.func(self)
+
+    def page(self, number):
+        try:
+            page = super().page(number)
+        except EmptyPage:
+            if not self.estimated:
+                raise
+            page = None
+        if self.estimated and (
+            page is None or page.number >= self.num_pages or len(page) < self.per_page
+        ):
+            self.count_exactly()
+            page = super().page(number)
+        return page
+
+
+class KeysetPaginationMixin:
+    """
+    ListView mixin that switches ``paginate_by`` to keyset pagination unless
+    ``settings.CATALOG_PAGINATION`` is set to ``"offset"``.
+    """
+
+    keyset_ordering = ("pk",)
+    cursor_kwarg = "cursor"
+    paginator_class = EstimatedCountPaginator
+
+    def get_pagination_mode(self):
+        return getattr(settings, "CATALOG_PAGINATION", "keyset")
+
+    def get_keyset_ordering(self):
+        return self.keyset_ordering
+
+    def paginate_queryset(self, queryset, page_size):
+        ordering = self.get_keyset_ordering()
+        queryset = queryset.order_by(*ordering)
+        if self.get_pagination_mode() != "keyset":
+            return super().paginate_queryset(queryset, page_size)
+
+        paginator = KeysetPaginator(queryset, page_size, ordering)
+        page = paginator.page(self.request.GET.get(self.cursor_kwarg), self.request.GET)
+        return (None, page, page.object_list, page.has_other_pages())
@@ -0,0 +1,125 @@
+"""
+Send the read-only catalog pages to read replicas.
+
+:class:`catalog.middleware.ReplicaRoutingMiddleware` picks a replica for
+GET/HEAD requests to the views named in ``settings.CATALOG_REPLICA_VIEWS``
+and :class:`ReplicaRouter` sends that request's catalog reads to it.
+Everything else (writes, auth and sessions, other views, reads inside a
+transaction) stays on the primary. After a POST the middleware pins the
+client to the primary for ``CATALOG_REPLICA_PIN_SECONDS`` so it reads its
+own writes.
+
+Replicas are chosen round-robin, or with ``CATALOG_REPLICA_SELECTION =
+"least-lag"`` by measured replication lag, skipping replicas more than
+``CATALOG_REPLICA_MAX_LAG`` seconds behind.
+"""
+import contextvars
+import itertools
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+read_alias = contextvars.ContextVar("catalog_read_alias", default=None)
+
+LAG_SQL = {
+    # A caught-up standby has replayed everything it received; otherwise the
+    # last replayed transaction's age is how far behind it is.
+    "postgresql": (
+        "SELECT CASE WHEN NOT pg_is_in_recovery() "
+        "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+        "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+    ),
+}
+
+
+def setting(name, default):
+    return getattr(settings, name, default)
+
+
+def replicas():
+    return setting("CATALOG_REPLICAS", [])
+
+
+def measure_lag(alias):
+    connection = connections[alias]
+    sql = LAG_SQL.get(connection.vendor)
+    if sql is None:
+        # No replication to measure (e.g. SQLite copies).
+        return 0.0
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql)
+            lag = cursor.fetchone()[0]
+    except DatabaseError:
+        return math.inf
+    return float(lag or 0)
+
+
+class LagMonitor:
+    """Per-process replication lag, re-measured every CATALOG_REPLICA_LAG_TTL seconds."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.measured = {}
+
+    def lag(self, alias):
+        now = time.monotonic()
+        with self.lock:
+            cached = self.measured.get(alias)
+        if cached and now - cached[1] < setting("CATALOG_REPLICA_LAG_TTL", 5):
+            return cached[0]
+        lag = measure_lag(alias)
+        with self.lock:
+            self.measured[alias] = (lag, now)
+        return lag
+
+    def clear(self):
+        with self.lock:
+            self.measured.clear()
+
+
+monitor = LagMonitor()
+turns = itertools.count()
+
+
+def choose_replica():
+    """Return the replica alias to read from, or None for the primary."""
+    aliases = replicas()
+    if not aliases:
+        return None
+    if setting("CATALOG_REPLICA_SELECTION", "round-robin") == "least-lag":
+        lag, alias = min((monitor.lag(alias), alias) for alias in aliases)
+        return alias if lag <= setting("CATALOG_REPLICA_MAX_LAG", 30) else None
+    return aliases[next(turns) % len(aliases)]
+
+
+def reading_from_replica():
+    return read_alias.get() is not None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = read_alias.get()
+        if alias is None or model._meta.app_label != "catalog":
+            return None
+        # A transaction on the primary must see its own uncommitted rows.
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replicas():
+            return False
+        return None
@@ -0,0 +1,221 @@
+"""
+Full-text search over the book catalog.
+
+PostgreSQL keeps a ``search_vector`` tsvector column on ``catalog_book``
+behind a GIN index. SQLite keeps an FTS5 shadow table keyed by book id.
+Both are written by :func:`index_books`, which the signal handlers call
+whenever a book, its author or its genres change. Other backends fall back
+to ``icontains`` lookups.
+"""
+import re
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+
+FTS_TABLE = "catalog_book_fts"
+VECTOR_COLUMN = "search_vector"
+VECTOR_INDEX = "catalog_book_search_vector_idx"
+BATCH_SIZE = 500
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def search_config():
+    return getattr(settings, "CATALOG_SEARCH_CONFIG", "simple")
+
+
+def create_index(schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute(
+            "ALTER TABLE catalog_book ADD COLUMN %s tsvector" % VECTOR_COLUMN
+        )
+        schema_editor.execute(
+            "CREATE INDEX %s ON catalog_book USING gin (%s)"
+            % (VECTOR_INDEX, VECTOR_COLUMN)
+        )
+    elif vendor == "sqlite":
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE %s USING fts5("
+            "title, summary, isbn, authors, genres, tokenize = 'unicode61')" % FTS_TABLE
+        )
+
+
+def drop_index(schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS %s" % VECTOR_INDEX)
+        schema_editor.execute(
+            "ALTER TABLE catalog_book DROP COLUMN IF EXISTS %s" % VECTOR_COLUMN
+        )
+    elif vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS %s" % FTS_TABLE)
+
+
+def build_documents(book_model, book_ids, using="default"):
+    documents = {}
+    books = (
+        book_model.objects.using(using)
+        .filter(pk__in=book_ids)
+        .values_list(
+            "pk", "title", "summary", "isbn", "author__first_name", "author__last_name"
+        )
+    )
+    for pk, title, summary, isbn, first_name, last_name in books:
+        documents[pk] = {
+            "title": title,
+            "summary": summary,
+            "isbn": isbn,
+            "authors": " ".join(name for name in (first_name, last_name) if name),
+            "genres": [],
+        }
+    genres = (
+        book_model.genre.through.objects.using(using)
+        .filter(book_id__in=documents)
+        .values_list("book_id", "genre__name")
+    )
+    for pk, name in genres:
+        documents[pk]["genres"].append(name)
+    for document in documents.values():
+        document["genres"] = " ".join(document["genres"])
+    return documents
+
+
+def index_books(book_ids, book_model=None, using="default"):
+    book_model = book_model or apps.get_model("catalog", "Book")
+    connection = connections[using]
+    book_ids = list(book_ids)
+    for start in range(0, len(book_ids), BATCH_SIZE):
+        batch = book_ids[start : start + BATCH_SIZE]
+        documents = build_documents(book_model, batch, using=using)
+        if connection.vendor == "postgresql":
+            _write_vectors(connection, documents)
+        elif connection.vendor == "sqlite":
+            _write_fts_rows(connection, batch, documents)
+
+
+def unindex_books(book_ids, using="default"):
+    connection = connections[using]
+    book_ids = list(book_ids)
+    if connection.vendor == "sqlite" and book_ids:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM %s WHERE rowid IN (%s)"
+                % (FTS_TABLE, ", ".join(["%s"] * len(book_ids))),
+                book_ids,
+            )
+
+
+def rebuild_index(book_model=None, using="default"):
+    book_model = book_model or apps.get_model("catalog", "Book")
+    connection = connections[using]
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM %s" % FTS_TABLE)
+    book_ids = list(
+        book_model.objects.using(using).order_by("pk").values_list("pk", flat=True)
+    )
+    index_books(book_ids, book_model=book_model, using=using)
+    return len(book_ids)
+
+
+def _write_vectors(connection, documents):
+    sql = (
+        "UPDATE catalog_book SET {column} = "
+        "setweight(to_tsvector(config, %s), 'A') || "
+        "setweight(to_tsvector(config, %s), 'A') || "
+        "setweight(to_tsvector(config, %s), 'B') || "
+        "setweight(to_tsvector(config, %s), 'C') || "
+        "setweight(to_tsvector(config, %s), 'D') "
+        "FROM (SELECT %s::regconfig AS config) search_config "
+        "WHERE id = %s"
+    ).format(column=VECTOR_COLUMN)
+    config = search_config()
+    rows = [
+        (d["title"], d["isbn"], d["authors"], d["genres"], d["summary"], config, pk)
+        for pk, d in documents.items()
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def _write_fts_rows(connection, book_ids, documents):
+    rows = [
+        (pk, d["title"], d["summary"], d["isbn"], d["authors"], d["genres"])
+        for pk, d in documents.items()
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "DELETE FROM %s WHERE rowid IN (%s)"
+            % (FTS_TABLE, ", ".join(["%s"] * len(book_ids))),
+            book_ids,
+        )
+        cursor.executemany(
+            "INSERT INTO %s (rowid, title, summary, isbn, authors, genres) "
+            "VALUES (%%s, %%s, %%s, %%s, %%s, %%s)" % FTS_TABLE,
+            rows,
+        )
+
+
+def prefix_tsquery(tokens):
+    """
+    Match every token as a prefix, like the SQLite branch's ``"token"*``.
+    TOKEN_RE leaves no tsquery operators or quotes in a token.
+    """
+    return " & ".join("'%s':*" % token for token in tokens)
+
+
+def search_book_ids(query, offset=0, limit=10, using="default"):
+    """
+    Return the ids of the books matching ``query``, best match first.
+    """
+    tokens = TOKEN_RE.findall(query)
+    if not tokens:
+        return []
+
+    connection = connections[using]
+    if connection.vendor == "postgresql":
+        sql = (
+            "SELECT id FROM catalog_book, to_tsquery(%s::regconfig, %s) query "
+            "WHERE {column} @@ query "
+            "ORDER BY ts_rank({column}, query) DESC, id LIMIT %s OFFSET %s"
+        ).format(column=VECTOR_COLUMN)
+        params = [search_config(), prefix_tsquery(tokens), limit, offset]
+    elif connection.vendor == "sqlite":
+        sql = (
+            "SELECT rowid FROM {table} WHERE {table} MATCH %s "
+            "ORDER BY bm25({table}, 10.0, 1.0, 10.0, 5.0, 2.0), rowid "
+            "LIMIT %s OFFSET %s"
+        ).format(table=FTS_TABLE)
+        params = [" ".join('"%s"*' % token for token in tokens), limit, offset]
+    else:
+        return _fallback_search_ids(tokens, offset, limit, using)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _fallback_search_ids(tokens, offset, limit, using):
+    Book = apps.get_model("catalog", "Book")
+    condition = Q()
+    for token in tokens:
+        condition &= (
+            Q(title__icontains=token)
+            | Q(summary__icontains=token)
+            | Q(isbn__icontains=token)
+            | Q(author__first_name__icontains=token)
+            | Q(author__last_name__icontains=token)
+            | Q(genre__name__icontains=token)
+        )
+    books = Book.objects.using(using).filter(condition).distinct().order_by("title")
+    return list(books.values_list("pk", flat=True)[offset : offset + limit])
+
+
+def search_books(query, offset=0, limit=10, using="default"):
+    Book = apps.get_model("catalog", "Book")
+    ids = search_book_ids(query, offset=offset, limit=limit, using=using)
+    books = Book.objects.using(using).select_related("author").in_bulk(ids)
+    return [books[pk] for pk in ids if pk in books]
@@ -0,0 +1,289 @@
+from django.db.models import DEFERRED, F
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_init,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import fragments, isbn, search
+from .models import Author, Book, BookInstance, CatalogStats, Genre, Language
+
+
+def is_available(status):
+    return 1 if status == "a" else 0
+
+
+def is_on_loan(status):
+    return 1 if status == "o" else 0
+
+
+def touch(model, **filters):
+    model.objects.filter(**filters).update(modified=timezone.now())
+
+
+def books_changed(book_ids):
+    book_ids = {pk for pk in book_ids if pk is not None}
+    if book_ids:
+        touch(Book, pk__in=book_ids)
+        fragments.bump("book", *book_ids)
+
+
+def authors_changed(author_ids):
+    author_ids = {pk for pk in author_ids if pk is not None}
+    if author_ids:
+        touch(Author, pk__in=author_ids)
+        fragments.bump("author", *author_ids)
+
+
+def copies_changed(book_ids):
+    book_ids = {pk for pk in book_ids if pk is not None}
+    if book_ids:
+        books_changed(book_ids)
+        books = list(
+            Book.objects.filter(pk__in=book_ids).values_list("author_id", "isbn")
+        )
+        author_ids, isbns = zip(*books) if books else ((), ())
+        authors_changed(author_ids)
+        isbn.forget(*isbns)
+
+
+# Read straight from __dict__ so deferred fields don't trigger a query.
+@receiver(post_init, sender=BookInstance)
+def remember_loaded_copy_state(sender, instance, **kwargs):
+    instance._loaded_status = instance.__dict__.get("status", DEFERRED)
+    instance._loaded_book_id = instance.__dict__.get("book_id", DEFERRED)
+
+
+# ...and only look the stored state up when a deferred copy is about to change.
+@receiver(pre_save, sender=BookInstance)
+@receiver(pre_delete, sender=BookInstance)
+def load_deferred_copy_state(sender, instance, using, **kwargs):
+    loaded = (instance._loaded_status, instance._loaded_book_id)
+    if DEFERRED in loaded and not instance._state.adding:
+        stored = (
+            BookInstance.objects.using(using)
+            .filter(pk=instance.pk)
+            .values_list("status", "book_id")
+            .first()
+        )
+        instance._loaded_status, instance._loaded_book_id = stored or (None, None)
+
+
+def count_books(model, pks, delta):
+    pks = {pk for pk in pks if pk is not None}
+    if pks and delta:
+        model.objects.filter(pk__in=pks).update(book_count=F("book_count") + delta)
+
+
+@receiver(post_init, sender=Book)
+def remember_loaded_book_state(sender, instance, **kwargs):
+    instance._loaded_author_id = instance.__dict__.get("author_id")
+    instance._loaded_isbn = instance.__dict__.get("isbn")
+    instance._loaded_language_id = instance.__dict__.get("language_id", DEFERRED)
+
+
+@receiver(pre_save, sender=Book)
+def load_deferred_language(sender, instance, using, **kwargs):
+    if instance._loaded_language_id is DEFERRED and not instance._state.adding:
+        instance._loaded_language_id = (
+            Book.objects.using(using)
+            .filter(pk=instance.pk)
+            .values_list("language_id", flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Book)
+def book_saved(sender, instance, created, using, **kwargs):
+    if created:
+        CatalogStats.increment(num_books=1)
+        count_books(Language, [instance.language_id], 1)
+    elif (
+        "language_id" in instance.__dict__
+        and instance.language_id != instance._loaded_language_id
+    ):
+        count_books(Language, [instance._loaded_language_id], -1)
+        count_books(Language, [instance.language_id], 1)
+    search.index_books([instance.pk], using=using)
+    fragments.bump("book", instance.pk)
+    authors_changed([instance.author_id, instance._loaded_author_id])
+    isbn.forget(instance._loaded_isbn, instance.__dict__.get("isbn"))
+    instance._loaded_author_id = instance.author_id
+    instance._loaded_isbn = instance.__dict__.get("isbn", instance._loaded_isbn)
+    instance._loaded_language_id = instance.__dict__.get(
+        "language_id", instance._loaded_language_id
+    )
+
+
+@receiver(pre_delete, sender=Book)
+def remember_book_genres(sender, instance, using, **kwargs):
+    load_deferred_language(sender, instance, using)
+    # The genre links are gone by post_delete.
+    instance._counted_genre_ids = list(instance.genre.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Book)
+def book_deleted(sender, instance, using, **kwargs):
+    CatalogStats.increment(num_books=-1)
+    count_books(Language, [instance._loaded_language_id], -1)
+    count_books(Genre, instance.__dict__.pop("_counted_genre_ids", []), -1)
+    search.unindex_books([instance.pk], using=using)
+    fragments.bump("book", instance.pk)
+    authors_changed([instance.author_id])
+    isbn.forget(instance.__dict__.get("isbn", instance._loaded_isbn))
+
+
+def linked(instance, reverse, pk_set):
+    """The pk_set members actually linked to instance, before a remove."""
+    Link = Book.genre.through
+    if reverse:
+        links = Link.objects.filter(genre=instance, book__in=pk_set)
+        return list(links.values_list("book_id", flat=True))
+    links = Link.objects.filter(book=instance, genre__in=pk_set)
+    return list(links.values_list("genre_id", flat=True))
+
+
+def count_genre_links(instance, reverse, pks, delta):
+    if reverse:
+        count_books(Genre, [instance.pk], delta * len(pks))
+    else:
+        count_books(Genre, pks, delta)
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def book_genres_changed(sender, instance, action, reverse, pk_set, using, **kwargs):
+    if action == "pre_remove":
+        instance._removed_link_ids = linked(instance, reverse, pk_set)
+    elif action == "pre_clear":
+        if reverse:
+            related = instance.book_set
+        else:
+            related = instance.genre
+        instance._removed_link_ids = list(related.values_list("pk", flat=True))
+    elif action in ("post_add", "post_remove", "post_clear"):
+        if action == "post_add":
+            count_genre_links(instance, reverse, pk_set, 1)
+        else:
+            removed = instance.__dict__.pop("_removed_link_ids", [])
+            count_genre_links(instance, reverse, removed, -1)
+        if not reverse:
+            book_ids = [instance.pk]
+        elif action == "post_clear":
+            book_ids = removed
+        else:
+            book_ids = pk_set
+        search.index_books(book_ids, using=using)
+        books_changed(book_ids)
+
+
+@receiver(post_save, sender=Author)
+def author_saved(sender, instance, created, using, **kwargs):
+    if created:
+        CatalogStats.increment(num_authors=1)
+    else:
+        book_ids = list(instance.book_set.values_list("pk", flat=True))
+        search.index_books(book_ids, using=using)
+        books_changed(book_ids)
+    fragments.bump("author", instance.pk)
+
+
+@receiver(pre_delete, sender=Author)
+@receiver(pre_delete, sender=Genre)
+def remember_indexed_books(sender, instance, **kwargs):
+    instance._search_book_ids = list(instance.book_set.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Author)
+def author_deleted(sender, instance, using, **kwargs):
+    book_ids = instance.__dict__.pop("_search_book_ids", [])
+    CatalogStats.increment(num_authors=-1)
+    search.index_books(book_ids, using=using)
+    books_changed(book_ids)
+    fragments.bump("author", instance.pk)
+
+
+@receiver(post_save, sender=Genre)
+def genre_saved(sender, instance, created, using, **kwargs):
+    if created:
+        CatalogStats.increment(num_genres=1)
+    else:
+        search.index_books(instance.book_set.values_list("pk", flat=True), using=using)
+        touch(Book, genre=instance)
+        fragments.bump_namespace("genre")
+
+
+@receiver(post_delete, sender=Genre)
+def genre_deleted(sender, instance, using, **kwargs):
+    book_ids = instance.__dict__.pop("_search_book_ids", [])
+    CatalogStats.increment(num_genres=-1)
+    search.index_books(book_ids, using=using)
+    touch(Book, pk__in=book_ids)
+    fragments.bump_namespace("genre")
+
+
+@receiver(post_save, sender=Language)
+@receiver(pre_delete, sender=Language)
+def language_changed(sender, instance, created=False, **kwargs):
+    if not created:
+        touch(Book, language=instance)
+        fragments.bump_namespace("language")
+
+
+def count_copy(book_id, status, sign):
+    if book_id is not None:
+        Book.objects.filter(pk=book_id).update(
+            copies_total=F("copies_total") + sign,
+            copies_available=F("copies_available") + sign * is_available(status),
+            copies_on_loan=F("copies_on_loan") + sign * is_on_loan(status),
+        )
+
+
+def move_copy(old_book_id, old_status, new_book_id, new_status):
+    if (old_book_id, old_status) != (new_book_id, new_status):
+        count_copy(old_book_id, old_status, -1)
+        count_copy(new_book_id, new_status, 1)
+
+
+@receiver(post_save, sender=BookInstance)
+def bookinstance_saved(sender, instance, created, update_fields=None, **kwargs):
+    def saved(*names):
+        return update_fields is None or not update_fields.isdisjoint(names)
+
+    status_saved = "status" in instance.__dict__ and saved("status")
+    book_saved = "book_id" in instance.__dict__ and saved("book", "book_id")
+    status = instance.status if status_saved else instance._loaded_status
+    book_id = instance.book_id if book_saved else instance._loaded_book_id
+
+    # BookInstance.save() runs this in the transaction that wrote the row.
+    if created:
+        CatalogStats.increment(
+            num_instances=1,
+            num_instances_available=is_available(status),
+        )
+        count_copy(book_id, status, 1)
+    else:
+        CatalogStats.increment(
+            num_instances_available=is_available(status)
+            - is_available(instance._loaded_status)
+        )
+        move_copy(instance._loaded_book_id, instance._loaded_status, book_id, status)
+    copies_changed([book_id, instance._loaded_book_id])
+
+    instance._loaded_status = status
+    instance._loaded_book_id = book_id
+
+
+@receiver(post_delete, sender=BookInstance)
+def bookinstance_deleted(sender, instance, using, **kwargs):
+    # The deletion collector sends post_delete inside its own transaction.
+    CatalogStats.increment(
+        num_instances=-1,
+        num_instances_available=-is_available(instance._loaded_status),
+    )
+    count_copy(instance._loaded_book_id, instance._loaded_status, -1)
+    copies_changed([instance._loaded_book_id])
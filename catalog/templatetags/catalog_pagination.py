@@ -0,0 +1,15 @@
+from django import template
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def page_query(context, number):
+    """
+    The current query string with ``page`` set to ``number``, so offset page
+    links keep the list's filters and sort order.
+    """
+    params = context["request"].GET.copy()
+    params.pop("cursor", None)
+    params["page"] = number
+    return "?" + params.urlencode()
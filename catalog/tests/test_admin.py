@@ -0,0 +1,170 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog.admin import CappedInlineFormSet
+from catalog.models import Author, Book, BookInstance, Genre, Language
+from catalog.pagination import EstimatedCountPaginator, is_unfiltered
+
+
+class AdminChangelistTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "admin@example.com", "x")
+        cls.language = Language.objects.create(name="English")
+        cls.genres = [Genre.objects.create(name="Genre %s" % i) for i in range(4)]
+        cls.author = Author.objects.create(first_name="Iain", last_name="Banks")
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_books(self, count, copies=1):
+        for _ in range(count):
+            num = Book.objects.count()
+            book = Book.objects.create(
+                title="Culture %s" % num,
+                summary="",
+                isbn="ISBN%s" % num,
+                author=self.author,
+                language=self.language,
+            )
+            book.genre.set(self.genres)
+            for _ in range(copies):
+                BookInstance.objects.create(
+                    book=book, imprint="Orbit", status="o", borrower=self.admin
+                )
+        return book
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        self.add_books(1)
+        urls = [
+            reverse("admin:catalog_book_changelist"),
+            reverse("admin:catalog_bookinstance_changelist"),
+            reverse("admin:catalog_author_changelist"),
+        ]
+        small = [self.count_queries(url) for url in urls]
+        self.add_books(15)
+        Author.objects.bulk_create(
+            Author(first_name="Extra", last_name="Author %s" % i) for i in range(15)
+        )
+        self.assertEqual([self.count_queries(url) for url in urls], small)
+
+    def test_book_list_shows_genres(self):
+        self.add_books(1)
+        resp = self.client.get(reverse("admin:catalog_book_changelist"))
+        self.assertContains(resp, "Genre 0, Genre 1, Genre 2")
+
+    def test_inlines_are_capped(self):
+        book = self.add_books(1, copies=CappedInlineFormSet.max_rows + 5)
+        resp = self.client.get(reverse("admin:catalog_book_change", args=[book.pk]))
+        formset = resp.context["inline_admin_formsets"][0].formset
+        self.assertEqual(formset.initial_form_count(), CappedInlineFormSet.max_rows)
+        changelist = reverse("admin:catalog_bookinstance_changelist")
+        self.assertContains(resp, "Showing the first 20 of 25 book instances.")
+        self.assertContains(resp, "%s?book__id__exact=%s" % (changelist, book.pk))
+        resp = self.client.get(changelist + "?book__id__exact=%s" % book.pk)
+        self.assertEqual(resp.context["cl"].result_count, 25)
+
+    def test_uncapped_inlines_have_no_note(self):
+        book = self.add_books(1, copies=3)
+        resp = self.client.get(reverse("admin:catalog_book_change", args=[book.pk]))
+        self.assertNotContains(resp, "Showing the first")
+
+
+class AdminEstimatedCountTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "admin@example.com", "x")
+        Author.objects.bulk_create(
+            Author(first_name="Analyzed", last_name="Author %03d" % i)
+            for i in range(150)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        Author.objects.bulk_create(
+            Author(first_name="New", last_name="Author %03d" % i) for i in range(100)
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    @override_settings(CATALOG_ESTIMATED_COUNT_THRESHOLD=1)
+    def test_rows_added_since_analyze_are_listed(self):
+        url = reverse("admin:catalog_author_changelist")
+        resp = self.client.get(url)
+        self.assertEqual(resp.context["cl"].result_count, 150)
+        resp = self.client.get(url + "?p=1")
+        self.assertEqual(len(resp.context["cl"].result_list), 100)
+        resp = self.client.get(url + "?p=2")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.context["cl"].result_list), 50)
+        self.assertEqual(resp.context["cl"].paginator.num_pages, 3)
+
+
+class EstimatedCountPaginatorTest(TestCase):
+    def setUp(self):
+        Author.objects.create(first_name="Ann", last_name="Leckie")
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        Author.objects.create(first_name="Martha", last_name="Wells")
+
+    @override_settings(CATALOG_ESTIMATED_COUNT_THRESHOLD=1)
+    def test_uses_estimate_above_threshold(self):
+        self.analyze()
+        self.assertEqual(
+            EstimatedCountPaginator(Author.objects.order_by("pk"), 10).count, 1
+        )
+        filtered = Author.objects.filter(last_name__startswith="W").order_by("pk")
+        self.assertEqual(EstimatedCountPaginator(filtered, 10).count, 1)
+
+    @override_settings(CATALOG_ESTIMATED_COUNT_THRESHOLD=100)
+    def test_counts_small_tables_exactly(self):
+        self.analyze()
+        self.assertEqual(
+            EstimatedCountPaginator(Author.objects.order_by("pk"), 10).count, 2
+        )
+
+    @override_settings(CATALOG_ESTIMATED_COUNT_THRESHOLD=1)
+    def test_counts_exactly_without_statistics(self):
+        self.assertEqual(
+            EstimatedCountPaginator(Author.objects.order_by("pk"), 10).count, 1
+        )
+
+    @override_settings(CATALOG_ESTIMATED_COUNT_THRESHOLD=1)
+    def test_last_page_is_counted_exactly(self):
+        Author.objects.bulk_create(
+            Author(first_name="Extra", last_name="Author %s" % i) for i in range(19)
+        )
+        self.analyze()
+        paginator = EstimatedCountPaginator(Author.objects.order_by("pk"), 10)
+        self.assertEqual(paginator.page(1).has_next(), True)
+        self.assertEqual(paginator.count, 20)
+        page = paginator.page(2)
+        self.assertEqual((paginator.count, len(page)), (21, 10))
+        self.assertEqual(len(paginator.page(3)), 1)
+
+    @override_settings(CATALOG_ESTIMATED_COUNT_THRESHOLD=1)
+    def test_short_page_is_counted_exactly(self):
+        Author.objects.bulk_create(
+            Author(first_name="Extra", last_name="Author %s" % i) for i in range(19)
+        )
+        self.analyze()
+        Author.objects.filter(first_name="Extra").delete()
+        paginator = EstimatedCountPaginator(Author.objects.order_by("pk"), 10)
+        page = paginator.page(1)
+        self.assertEqual((len(page), page.has_next(), paginator.count), (2, False, 2))
+
+    def test_only_whole_tables_are_estimated(self):
+        self.assertTrue(is_unfiltered(Author.objects.order_by("last_name")))
+        self.assertFalse(is_unfiltered(Author.objects.filter(last_name="Leckie")))
+        self.assertFalse(is_unfiltered(Author.objects.all()[:5]))
@@ -0,0 +1,117 @@
+import datetime
+
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.models import Author, Book, BookInstance, Genre, Language
+
+
+class CatalogApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name="Ursula", last_name="Le Guin")
+        cls.language = Language.objects.create(name="English")
+        cls.genre = Genre.objects.create(name="Fantasy")
+        cls.book = Book.objects.create(
+            title="A Wizard of Earthsea",
+            summary="A young mage.",
+            isbn="9780547722023",
+            author=cls.author,
+            language=cls.language,
+        )
+        cls.book.genre.add(cls.genre)
+        for status in "aao":
+            BookInstance.objects.create(
+                book=cls.book,
+                imprint="Parnassus",
+                status=status,
+                due_back=datetime.date.today(),
+            )
+        for book_num in range(60):
+            Book.objects.create(
+                title="Book %02d" % book_num,
+                summary="Summary",
+                isbn="97800000000%02d" % book_num,
+            )
+
+    def revalidate(self, url):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first.has_header("ETag"))
+        self.assertTrue(first.has_header("Last-Modified"))
+        return first, self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+
+    def test_book_detail_payload(self):
+        url = reverse("api-book-detail", args=[self.book.pk])
+        with self.assertNumQueries(4):
+            data = self.client.get(url).json()
+        self.assertEqual(data["title"], "A Wizard of Earthsea")
+        self.assertEqual(data["author"], "Le Guin, Ursula")
+        self.assertEqual(data["language"], "English")
+        self.assertEqual(data["genres"], ["Fantasy"])
+        self.assertEqual(len(data["copies"]), 3)
+
+    def test_book_detail_revalidates_with_304(self):
+        url = reverse("api-book-detail", args=[self.book.pk])
+        first, second = self.revalidate(url)
+        self.assertEqual(second.status_code, 304)
+
+    def test_copy_changes_invalidate_book_and_author_etags(self):
+        book_url = reverse("api-book-availability", args=[self.book.pk])
+        author_url = reverse("api-author-detail", args=[self.author.pk])
+        book_etag = self.client.get(book_url)["ETag"]
+        author_etag = self.client.get(author_url)["ETag"]
+
+        copy = BookInstance.objects.filter(book=self.book, status="a").first()
+        copy.status = "o"
+        copy.save()
+
+        resp = self.client.get(book_url, HTTP_IF_NONE_MATCH=book_etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["available"], 1)
+        resp = self.client.get(author_url, HTTP_IF_NONE_MATCH=author_etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["books"]["results"][0]["on_loan"], 2)
+
+    def test_related_renames_invalidate_book_etag(self):
+        url = reverse("api-book-detail", args=[self.book.pk])
+        for obj, field in ((self.genre, "name"), (self.language, "name")):
+            etag = self.client.get(url)["ETag"]
+            setattr(obj, field, getattr(obj, field) + "!")
+            obj.save()
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(resp.status_code, 200)
+
+    def test_book_list_is_keyset_paginated(self):
+        data = self.client.get(reverse("api-books")).json()
+        self.assertEqual(len(data["results"]), 50)
+        self.assertIsNone(data["previous"])
+        resp = self.client.get(reverse("api-books"), {"cursor": data["next"]})
+        self.assertEqual(len(resp.json()["results"]), 11)
+
+    def test_book_list_etag_changes_when_a_book_is_deleted(self):
+        first, second = self.revalidate(reverse("api-books"))
+        self.assertEqual(second.status_code, 304)
+        Book.objects.get(title="Book 00").delete()
+        resp = self.client.get(reverse("api-books"), HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(resp.status_code, 200)
+
+    def test_author_list_and_detail(self):
+        first, second = self.revalidate(reverse("api-authors"))
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(first.json()["results"][0]["last_name"], "Le Guin")
+
+        data = self.client.get(
+            reverse("api-author-detail", args=[self.author.pk])
+        ).json()
+        self.assertEqual(data["books"]["results"][0]["copies"], 3)
+
+    def test_missing_objects_return_404(self):
+        resp = self.client.get(reverse("api-book-detail", args=[9999]))
+        self.assertEqual(resp.status_code, 404)
+        resp = self.client.get(reverse("api-author-detail", args=[9999]))
+        self.assertEqual(resp.status_code, 404)
+
+    def test_rejects_writes(self):
+        resp = self.client.post(reverse("api-books"))
+        self.assertEqual(resp.status_code, 405)
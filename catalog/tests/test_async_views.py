@@ -0,0 +1,96 @@
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import Http404
+from django.test import RequestFactory, TestCase, TransactionTestCase
+
+from catalog import async_views, instrumentation
+from catalog.models import Author, Book, BookInstance, Genre, Language
+
+
+def get(view, path="/", **kwargs):
+    request = RequestFactory().get(path)
+    request.user = AnonymousUser()
+    return async_to_sync(view)(request, **kwargs)
+
+
+class AsyncViewsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name="Ursula", last_name="Le Guin")
+        cls.book = Book.objects.create(
+            title="The Dispossessed",
+            summary="Anarres and Urras.",
+            isbn="9780061054884",
+            author=cls.author,
+            language=Language.objects.create(name="English"),
+        )
+        cls.book.genre.add(Genre.objects.create(name="Science Fiction"))
+        BookInstance.objects.create(book=cls.book, imprint="Harper", status="a")
+        for num in range(11):
+            Book.objects.create(
+                title="Earthsea %s" % num, summary="", isbn=str(num), author=cls.author
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_index_shows_stats(self):
+        resp = get(async_views.index)
+        self.assertContains(resp, "<strong>Books:</strong> 12", html=False)
+        self.assertIn("num_visits", resp.cookies)
+
+    def test_book_detail(self):
+        resp = get(async_views.book_detail, pk=self.book.pk)
+        self.assertContains(resp, "The Dispossessed")
+        self.assertContains(resp, "Science Fiction")
+        self.assertContains(resp, "Harper")
+        self.assertContains(resp, "1 of 1 available")
+
+    def test_book_detail_is_cached(self):
+        get(async_views.book_detail, pk=self.book.pk)
+        Book.objects.filter(pk=self.book.pk).update(title="Changed behind our back")
+        resp = get(async_views.book_detail, pk=self.book.pk)
+        self.assertContains(resp, "The Dispossessed")
+
+    def test_missing_book_is_404(self):
+        with self.assertRaises(Http404):
+            get(async_views.book_detail, pk=self.book.pk + 100)
+
+    def test_author_detail_pages_books(self):
+        resp = get(async_views.author_detail, pk=self.author.pk)
+        self.assertContains(resp, "Page 1 of 2.")
+        self.assertContains(resp, "Earthsea 0")
+        self.assertNotContains(resp, "The Dispossessed")
+
+        resp = get(async_views.author_detail, "/?page=9", pk=self.author.pk)
+        self.assertContains(resp, "Page 2 of 2.")
+        self.assertContains(resp, "The Dispossessed")
+
+    def test_missing_author_is_404(self):
+        with self.assertRaises(Http404):
+            get(async_views.author_detail, pk=self.author.pk + 100)
+
+
+class AsyncFanOutTest(TransactionTestCase):
+    def test_queries_run_on_their_own_connections(self):
+        author = Author.objects.create(first_name="Stanisław", last_name="Lem")
+        Book.objects.create(title="Solaris", summary="", isbn="1", author=author)
+        cache.clear()
+
+        resp = get(async_views.author_detail, pk=author.pk)
+        self.assertContains(resp, "Solaris")
+
+        results = async_to_sync(async_views.fan_out)(
+            lambda: Author.objects.get().last_name, Book.objects.count
+        )
+        self.assertEqual(results, ["Lem", 1])
+
+    def test_queries_are_counted_into_the_request_timings(self):
+        metrics = instrumentation.RequestMetrics()
+        token = instrumentation.current_metrics.set(metrics)
+        try:
+            async_to_sync(async_views.fan_out)(Author.objects.count, Book.objects.count)
+        finally:
+            instrumentation.current_metrics.reset(token)
+        self.assertEqual(metrics.queries, 2)
@@ -0,0 +1,316 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+import datetime
+from decimal import Decimal
+
+from django.contrib.auth.models import Permission, User
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog import fragments, search
+from catalog.models import Author, Book, BookInstance, CatalogStats, Genre, Language
+
+CSV_FEED = """title,summary,isbn,author_first_name,author_last_name,language,genres,copies,imprint,status
+A Wizard of Earthsea,Young mage,9780547722023,Ursula,Le Guin,English,Fantasy|Classics,3,Parnassus,a
+The Tombs of Atuan,Priestess,9780689845369,Ursula,Le Guin,English,Fantasy,1,Atheneum,o
+Bad Row,,,,,,,,,
+Ficciones,Labyrinths,0-8021-3030-5,Jorge Luis,Borges,Spanish,,0,,a
+"""
+
+
+class ImportCatalogCommandTest(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def write_feed(self, name, content):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, "w", encoding="utf-8") as fh:
+            fh.write(content)
+        return path
+
+    def run_import(self, path, **options):
+        stdout, stderr = StringIO(), StringIO()
+        call_command("import_catalog", path, stdout=stdout, stderr=stderr, **options)
+        return stdout.getvalue()
+
+    def test_imports_csv_feed(self):
+        Author.objects.create(first_name="Ursula", last_name="Le Guin")
+        output = self.run_import(self.write_feed("feed.csv", CSV_FEED), batch_size=2)
+
+        self.assertIn("rows/sec", output)
+        self.assertEqual(Book.objects.count(), 3)
+        self.assertEqual(Author.objects.count(), 2)
+        self.assertEqual(Language.objects.count(), 2)
+        self.assertEqual(Genre.objects.count(), 2)
+        wizard = Book.objects.get(isbn="9780547722023")
+        self.assertEqual(str(wizard.author), "Le Guin, Ursula")
+        self.assertEqual(wizard.language.name, "English")
+        self.assertEqual(
+            sorted(wizard.genre.values_list("name", flat=True)),
+            ["Classics", "Fantasy"],
+        )
+        self.assertEqual(wizard.bookinstance_set.filter(status="a").count(), 3)
+
+        stats = CatalogStats.load()
+        rebuilt = CatalogStats.rebuild()
+        self.assertEqual(stats.num_books, rebuilt.num_books)
+        self.assertEqual(stats.num_instances, rebuilt.num_instances)
+        self.assertEqual(stats.num_instances_available, 3)
+        self.assertEqual(stats.num_authors, 2)
+        self.assertEqual(stats.num_genres, 2)
+        self.assertEqual(search.search_book_ids("earthsea"), [wizard.pk])
+        self.assertFalse(Book.objects.with_copy_drift().exists())
+        self.assertEqual(
+            dict(Genre.objects.values_list("name", "book_count")),
+            {"Fantasy": 2, "Classics": 1},
+        )
+        self.assertEqual(
+            dict(Language.objects.values_list("name", "book_count")),
+            {"English": 2, "Spanish": 1},
+        )
+
+    def test_imports_jsonl_feed(self):
+        rows = [
+            {
+                "title": "Ficciones",
+                "summary": "Labyrinths",
+                "isbn": "9780802130303",
+                "author_first_name": "Jorge Luis",
+                "author_last_name": "Borges",
+                "genres": ["Short stories"],
+                "copies": 2,
+            },
+        ]
+        path = self.write_feed(
+            "feed.jsonl", "\n".join(json.dumps(row) for row in rows) + "\n"
+        )
+        self.run_import(path)
+        book = Book.objects.get(isbn="9780802130303")
+        self.assertEqual(book.genre.get().name, "Short stories")
+        self.assertEqual(book.bookinstance_set.count(), 2)
+
+    def test_existing_authors_and_namespaces_are_refreshed(self):
+        author = Author.objects.create(first_name="Ursula", last_name="Le Guin")
+        keys = [
+            fragments.version_key("author", author.pk),
+            fragments.version_key("namespace", "genre"),
+            fragments.version_key("namespace", "language"),
+        ]
+        versions = fragments.get_versions(keys)
+        self.run_import(self.write_feed("feed.csv", CSV_FEED))
+        self.assertGreater(Author.objects.get(pk=author.pk).modified, author.modified)
+        for old, new in zip(versions, fragments.get_versions(keys)):
+            self.assertGreater(new, old)
+
+    def test_isbns_are_normalized(self):
+        feed = (
+            "title,isbn,copies\n"
+            "Ficciones,0-8021-3030-5,0\n"
+            "Typo,9780802130304,0\n"
+            "Again,978-0-8021-3030-3,0\n"
+        )
+        self.run_import(self.write_feed("feed.csv", feed))
+        self.assertEqual(
+            list(Book.objects.values_list("title", "isbn")),
+            [("Ficciones", "9780802130303")],
+        )
+
+    def test_resumes_after_last_committed_batch(self):
+        path = self.write_feed("feed.csv", CSV_FEED)
+        with open(path + ".progress", "w") as fh:
+            json.dump({"source": os.path.abspath(path), "rows": 2}, fh)
+
+        output = self.run_import(path, batch_size=2)
+
+        self.assertIn("Resuming after row 2", output)
+        self.assertEqual(
+            list(Book.objects.values_list("title", flat=True)), ["Ficciones"]
+        )
+        with open(path + ".progress") as fh:
+            self.assertEqual(json.load(fh)["rows"], 4)
+
+    def test_rerun_skips_books_already_imported(self):
+        path = self.write_feed("feed.csv", CSV_FEED)
+        self.run_import(path)
+        self.run_import(path, restart=True)
+        self.assertEqual(Book.objects.count(), 3)
+        self.assertEqual(BookInstance.objects.count(), 4)
+
+
+class ExportCatalogTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name="Ursula", last_name="Le Guin")
+        fantasy = Genre.objects.create(name="Fantasy")
+        classics = Genre.objects.create(name="Classics")
+        for book_num in range(5):
+            book = Book.objects.create(
+                title="Book %s" % book_num,
+                summary="Summary",
+                isbn="97800000000%02d" % book_num,
+                author=author,
+            )
+            book.genre.add(fantasy, classics)
+            for status in "aao":
+                BookInstance.objects.create(book=book, imprint="Imprint", status=status)
+
+        cls.user = User.objects.create_user(username="librarian", password="12345")
+        cls.user.user_permissions.add(
+            Permission.objects.get(codename="can_export_catalog")
+        )
+        User.objects.create_user(username="reader", password="12345")
+
+    def test_command_exports_books_as_jsonl(self):
+        stdout = StringIO()
+        call_command(
+            "export_catalog", "books", format="jsonl", chunk_size=2, stdout=stdout
+        )
+        records = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual(len(records), 5)
+        self.assertEqual(records[0]["author"], "Le Guin, Ursula")
+        self.assertEqual(records[0]["genres"], ["Classics", "Fantasy"])
+        self.assertEqual(records[0]["copies"], 3)
+        self.assertEqual(records[0]["copies_available"], 2)
+        self.assertEqual(records[0]["copies_on_loan"], 1)
+
+    def test_command_exports_copies_as_csv(self):
+        path = os.path.join(tempfile.mkdtemp(), "copies.csv")
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        call_command("export_catalog", "copies", output=path, stdout=StringIO())
+        with open(path, encoding="utf-8") as fh:
+            lines = fh.read().splitlines()
+        self.assertEqual(lines[0], "id,book_id,isbn,imprint,status,due_back,borrower")
+        self.assertEqual(len(lines), 16)
+
+    def test_genres_are_fetched_once_per_chunk(self):
+        stdout = StringIO()
+        with self.assertNumQueries(1 + 3):
+            call_command("export_catalog", "books", chunk_size=2, stdout=stdout)
+
+    def test_view_requires_permission(self):
+        self.client.login(username="reader", password="12345")
+        resp = self.client.get(
+            reverse("catalog-export", args=["books", "csv"]), follow=False
+        )
+        self.assertEqual(resp.status_code, 302)
+
+    def test_view_streams_export(self):
+        self.client.login(username="librarian", password="12345")
+        resp = self.client.get(reverse("catalog-export", args=["books", "csv"]))
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.streaming)
+        self.assertEqual(resp["Content-Type"], "text/csv")
+        body = b"".join(resp.streaming_content).decode()
+        self.assertEqual(len(body.splitlines()), 6)
+        self.assertIn("Classics|Fantasy", body)
+
+
+class PurgeSessionsCommandTest(TestCase):
+    def test_deletes_only_expired_sessions_in_batches(self):
+        for session_num in range(7):
+            session = SessionStore()
+            session["n"] = session_num
+            session.create()
+        Session.objects.filter(
+            pk__in=list(Session.objects.values_list("pk", flat=True)[:5])
+        ).update(expire_date=timezone.now() - datetime.timedelta(days=1))
+
+        stdout = StringIO()
+        call_command("purge_sessions", batch_size=2, stdout=stdout)
+
+        self.assertIn("Deleted 5 expired sessions", stdout.getvalue())
+        self.assertEqual(Session.objects.count(), 2)
+
+
+class ProcessOverdueCommandTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = datetime.date(2024, 3, 31)
+        book = Book.objects.create(
+            title="The Left Hand of Darkness", summary="", isbn="9780441478125"
+        )
+        cls.alice = User.objects.create_user("alice", "alice@example.com", "x")
+        cls.bob = User.objects.create_user("bob", "", "x")
+        cls.loans = {}
+        for name, borrower, days_late, status in (
+            ("alice-3", cls.alice, 3, "o"),
+            ("alice-90", cls.alice, 90, "o"),
+            ("bob-1", cls.bob, 1, "o"),
+            ("bob-due-today", cls.bob, 0, "o"),
+            ("available", None, 10, "a"),
+        ):
+            cls.loans[name] = BookInstance.objects.create(
+                book=book,
+                imprint="Ace",
+                status=status,
+                borrower=borrower,
+                due_back=cls.today - datetime.timedelta(days=days_late),
+            ).pk
+
+    def run_command(self, *args):
+        stdout = StringIO()
+        call_command(
+            "process_overdue", "--date", self.today.isoformat(), *args, stdout=stdout
+        )
+        return stdout.getvalue()
+
+    def fine(self, name):
+        return BookInstance.objects.get(pk=self.loans[name]).fine
+
+    def test_assesses_fines_in_chunks(self):
+        output = self.run_command("--chunk-size", "1")
+        self.assertIn("Assessed 3 overdue loans for 2 borrowers", output)
+        self.assertEqual(self.fine("alice-3"), Decimal("0.75"))
+        self.assertEqual(self.fine("alice-90"), Decimal("10.00"))
+        self.assertEqual(self.fine("bob-1"), Decimal("0.25"))
+        self.assertEqual(self.fine("bob-due-today"), 0)
+        self.assertEqual(self.fine("available"), 0)
+        self.assertEqual(
+            BookInstance.objects.get(pk=self.loans["bob-1"]).fine_assessed_on,
+            self.today,
+        )
+
+    def test_digest_per_borrower(self):
+        output = self.run_command()
+        self.assertIn("alice: 2 overdue, 10.75 due", output)
+        self.assertIn("bob: 1 overdue, 0.25 due", output)
+
+    def test_loans_are_assessed_once_per_day(self):
+        self.run_command()
+        self.assertIn("Assessed 0 overdue loans", self.run_command())
+
+    def test_query_count_does_not_grow_with_loans(self):
+        with CaptureQueriesContext(connection) as small:
+            self.run_command()
+        BookInstance.objects.update(fine_assessed_on=None)
+        BookInstance.objects.bulk_create(
+            BookInstance(
+                imprint="Ace",
+                status="o",
+                borrower=self.bob,
+                due_back=self.today - datetime.timedelta(days=3),
+            )
+            for _ in range(20)
+        )
+        with CaptureQueriesContext(connection) as large:
+            self.run_command()
+        self.assertEqual(len(small), len(large))
+
+    def test_notify_emails_borrowers_with_an_address(self):
+        output = self.run_command("--notify")
+        self.assertIn("Sent 1 digests.", output)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["alice@example.com"])
+        self.assertIn("The Left Hand of Darkness", mail.outbox[0].body)
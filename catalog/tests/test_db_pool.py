@@ -0,0 +1,181 @@
+import json
+import os
+import tempfile
+import threading
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase
+
+from catalog.db import pool, use_pool
+from catalog.db.sqlite3.base import DatabaseWrapper
+from catalog.workers import worker_name
+
+
+class FakeConnection:
+    def __init__(self):
+        self.broken = False
+        self.closed = False
+        self.rollbacks = 0
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql):
+        if self.broken:
+            raise RuntimeError("server closed the connection unexpectedly")
+
+    def fetchone(self):
+        return (1,)
+
+    def rollback(self):
+        if self.broken:
+            raise RuntimeError("server closed the connection unexpectedly")
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    def make_pool(self, **kwargs):
+        kwargs.setdefault("timeout", 0.05)
+        return pool.ConnectionPool("default", **kwargs)
+
+    def test_reuses_checked_in_connections(self):
+        connections = pool.ConnectionPool("default")
+        first = connections.checkout(FakeConnection)
+        connections.checkin(first)
+        second = connections.checkout(FakeConnection)
+
+        self.assertIs(second.connection, first.connection)
+        self.assertEqual(first.connection.rollbacks, 1)
+        stats = connections.snapshot()
+        self.assertEqual(stats["connects"], 1)
+        self.assertEqual(stats["reuses"], 1)
+        self.assertEqual(stats["in_use"], 1)
+
+    def test_times_out_when_exhausted(self):
+        connections = self.make_pool(max_size=1)
+        connections.checkout(FakeConnection)
+        with self.assertRaises(TimeoutError):
+            connections.checkout(FakeConnection)
+        self.assertEqual(connections.snapshot()["timeouts"], 1)
+
+    def test_waits_for_a_connection(self):
+        connections = self.make_pool(max_size=1, timeout=5)
+        held = connections.checkout(FakeConnection)
+        timer = threading.Timer(0.05, connections.checkin, [held])
+        timer.start()
+        try:
+            pooled = connections.checkout(FakeConnection)
+        finally:
+            timer.join()
+
+        self.assertIs(pooled.connection, held.connection)
+        stats = connections.snapshot()
+        self.assertEqual(stats["waits"], 1)
+        self.assertEqual(stats["size"], 1)
+
+    def test_replaces_connections_that_fail_the_health_check(self):
+        connections = self.make_pool(check_interval=0)
+        pooled = connections.checkout(FakeConnection)
+        connections.checkin(pooled)
+        pooled.connection.broken = True
+
+        replacement = connections.checkout(FakeConnection)
+
+        self.assertIsNot(replacement.connection, pooled.connection)
+        self.assertTrue(pooled.connection.closed)
+        stats = connections.snapshot()
+        self.assertEqual(stats["reconnects"], 1)
+        self.assertEqual(stats["size"], 1)
+
+    def test_checks_connections_that_saw_errors(self):
+        connections = self.make_pool()
+        pooled = connections.checkout(FakeConnection)
+        connections.checkin(pooled, healthy=False)
+        with patch.object(pool, "ping") as ping:
+            connections.checkout(FakeConnection)
+        ping.assert_called_once_with(pooled.connection)
+
+    def test_recycles_old_connections(self):
+        connections = self.make_pool(max_lifetime=0)
+        pooled = connections.checkout(FakeConnection)
+        connections.checkin(pooled)
+        replacement = connections.checkout(FakeConnection)
+        self.assertIsNot(replacement.connection, pooled.connection)
+        self.assertEqual(connections.snapshot()["recycled"], 1)
+
+    def test_discards_connections_that_fail_to_roll_back(self):
+        connections = self.make_pool(max_size=1)
+        pooled = connections.checkout(FakeConnection)
+        pooled.connection.broken = True
+        connections.checkin(pooled)
+
+        stats = connections.snapshot()
+        self.assertEqual(stats["discarded"], 1)
+        self.assertEqual(stats["size"], 0)
+        connections.checkout(FakeConnection)
+
+
+class PooledBackendTest(SimpleTestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix=".sqlite3")
+        os.close(handle)
+        settings_dict = dict(connection.settings_dict, NAME=self.path)
+        use_pool(settings_dict, MAX_SIZE=1, TIMEOUT=0.05)
+        self.settings_dict = settings_dict
+        self.addCleanup(os.remove, self.path)
+        self.addCleanup(pool.pools.clear)
+
+    def wrapper(self):
+        return DatabaseWrapper(self.settings_dict, alias="pooled")
+
+    def query(self, wrapper):
+        with wrapper.cursor() as cursor:
+            cursor.execute("SELECT 1")
+            return cursor.fetchone()[0]
+
+    def test_close_checks_the_connection_in(self):
+        first = self.wrapper()
+        self.query(first)
+        raw = first.connection
+        first.close()
+
+        second = self.wrapper()
+        self.assertEqual(self.query(second), 1)
+        self.assertIs(second.connection, raw)
+        second.close()
+
+    def test_pool_size_is_enforced(self):
+        first = self.wrapper()
+        self.query(first)
+        with self.assertRaises(OperationalError):
+            self.query(self.wrapper())
+        first.close()
+
+    def test_stats_command(self):
+        cache.clear()
+        wrapper = self.wrapper()
+        self.query(wrapper)
+        wrapper.close()
+
+        out = StringIO()
+        call_command("db_pool_stats", "--json", stdout=out)
+        stats = json.loads(out.getvalue())[worker_name()]["pooled"]
+        self.assertEqual(stats["checkouts"], 1)
+        self.assertEqual(stats["idle"], 1)
+
+        out = StringIO()
+        call_command("db_pool_stats", stdout=out)
+        self.assertIn("pooled", out.getvalue())
+
+    def test_in_memory_databases_are_not_pooled(self):
+        wrapper = DatabaseWrapper(dict(self.settings_dict, NAME=":memory:"), "memory")
+        self.query(wrapper)
+        self.assertEqual(pool.pools, {})
+        wrapper.close()
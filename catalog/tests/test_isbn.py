@@ -0,0 +1,146 @@
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from catalog import isbn
+from catalog.models import Book, BookInstance, Genre, Language
+
+
+class NormalizeTest(SimpleTestCase):
+    def test_isbn13_with_separators(self):
+        self.assertEqual(isbn.normalize("978-0-306-40615-7"), "9780306406157")
+        self.assertEqual(isbn.normalize(" 978 0306 406157 "), "9780306406157")
+
+    def test_isbn10_is_converted(self):
+        self.assertEqual(isbn.normalize("0-306-40615-2"), "9780306406157")
+        self.assertEqual(isbn.normalize("080442957x"), "9780804429573")
+
+    def test_rejects_bad_check_digits_and_junk(self):
+        for value in ("9780306406158", "0306406153", "ABCDEFG", "12345", ""):
+            with self.assertRaises(ValueError):
+                isbn.normalize(value)
+
+    def test_coerce_keeps_values_that_are_not_isbns(self):
+        self.assertEqual(isbn.coerce("0-306-40615-2"), "9780306406157")
+        self.assertEqual(isbn.coerce(" ABCDEFG "), "ABCDEFG")
+
+    def test_validator(self):
+        isbn.validate_isbn("0-306-40615-2")
+        with self.assertRaises(ValidationError):
+            isbn.validate_isbn("9780306406158")
+
+
+class LRUCacheTest(SimpleTestCase):
+    def test_evicts_least_recently_used(self):
+        lru = isbn.LRUCache(max_size=2, ttl=60)
+        lru.set("a", 1)
+        lru.set("b", 2)
+        lru.get("a")
+        lru.set("c", 3)
+        self.assertEqual((lru.get("a"), lru.get("b"), lru.get("c")), (1, None, 3))
+
+    def test_entries_expire(self):
+        lru = isbn.LRUCache(max_size=2, ttl=0)
+        lru.set("a", 1)
+        self.assertIsNone(lru.get("a"))
+
+
+class ISBNLookupTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = Book.objects.create(
+            title="A Wizard of Earthsea", summary="", isbn="0-547-72202-8"
+        )
+        BookInstance.objects.create(book=cls.book, imprint="Parnassus", status="a")
+
+    def setUp(self):
+        cache.clear()
+        isbn.local_cache.clear()
+
+    def lookup(self, value):
+        return self.client.get(reverse("isbn-lookup", args=[value]))
+
+    def test_books_are_saved_normalized(self):
+        self.assertEqual(self.book.isbn, "9780547722023")
+        with self.assertRaises(ValidationError):
+            Book(title="Typo", summary="", isbn="9780547722024").full_clean()
+
+    def test_lookup_returns_id_and_availability(self):
+        resp = self.lookup("978-0-547-72202-3")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(
+            resp.json(),
+            {
+                "id": self.book.pk,
+                "isbn": "9780547722023",
+                "url": self.book.get_absolute_url(),
+                "copies": 1,
+                "available": 1,
+                "on_loan": 0,
+            },
+        )
+
+    def test_repeated_scans_skip_the_database(self):
+        self.lookup("9780547722023")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.lookup("0547722028").status_code, 200)
+        isbn.local_cache.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.lookup("0547722028").status_code, 200)
+
+    def test_copy_changes_are_seen(self):
+        self.lookup("9780547722023")
+        BookInstance.objects.create(book=self.book, imprint="Parnassus", status="o")
+        self.assertEqual(self.lookup("9780547722023").json()["on_loan"], 1)
+
+    def test_unknown_and_invalid_isbns(self):
+        self.assertEqual(self.lookup("9780306406157").status_code, 404)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.lookup("9780306406157").status_code, 404)
+        self.assertEqual(self.lookup("9780306406158").status_code, 400)
+
+    def test_new_isbns_are_found_after_a_miss(self):
+        self.assertEqual(self.lookup("9780306406157").status_code, 404)
+        self.book.isbn = "0-306-40615-2"
+        self.book.save()
+        self.assertEqual(self.lookup("9780306406157").json()["id"], self.book.pk)
+        self.assertEqual(self.lookup("9780547722023").status_code, 404)
+
+
+class ISBNFormTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = Book.objects.create(
+            title="A Wizard of Earthsea", summary="", isbn="9780547722023"
+        )
+        cls.genre = Genre.objects.create(name="Fantasy")
+        cls.language = Language.objects.create(name="English")
+        cls.librarian = User.objects.create_user(username="librarian", password="x")
+        cls.librarian.user_permissions.add(Permission.objects.get(codename="add_book"))
+
+    def create(self, value):
+        self.client.force_login(self.librarian)
+        return self.client.post(
+            reverse("book_create"),
+            {
+                "title": "The Tombs of Atuan",
+                "summary": "Priestess",
+                "isbn": value,
+                "genre": [self.genre.pk],
+                "language": self.language.pk,
+            },
+        )
+
+    def test_hyphenated_isbn13_is_accepted(self):
+        resp = self.create("978-0-306-40615-7")
+        book = Book.objects.get(isbn="9780306406157")
+        self.assertRedirects(resp, book.get_absolute_url())
+
+    def test_isbn10_of_an_existing_book_is_a_form_error(self):
+        resp = self.create("0-547-72202-8")
+        self.assertEqual(resp.status_code, 200)
+        self.assertFormError(
+            resp, "form", "isbn", "Book with this ISBN already exists."
+        )
@@ -0,0 +1,256 @@
+import datetime
+import time
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import Permission, User
+from django.db import OperationalError, connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from catalog import loans
+from catalog.models import Book, BookInstance, CatalogStats
+
+
+class LoanServiceTest(TransactionTestCase):
+    """
+    Catalog stats and modified stamps are updated once a loan commits, so
+    these run outside a test transaction.
+    """
+
+    def setUp(self):
+        self.reader = User.objects.create_user(username="reader", password="12345")
+        self.other = User.objects.create_user(username="other", password="12345")
+        self.book = Book.objects.create(
+            title="Solaris", summary="", isbn="9780156027601"
+        )
+        self.copies = [
+            BookInstance.objects.create(book=self.book, imprint="Walker", status=status)
+            for status in ("a", "a", "m")
+        ]
+
+    def copy(self, pk):
+        return BookInstance.objects.get(pk=pk)
+
+    def test_checkout_lends_an_available_copy(self):
+        pk = loans.checkout(self.book.pk, self.reader)
+        copy = self.copy(pk)
+        self.assertEqual(copy.status, "o")
+        self.assertEqual(copy.borrower, self.reader)
+        self.assertEqual(copy.due_back, datetime.date.today() + loans.LOAN_PERIOD)
+        self.assertEqual(CatalogStats.load().num_instances_available, 1)
+
+    def test_checkout_fails_when_no_copy_is_available(self):
+        loans.checkout(self.book.pk, self.reader)
+        loans.checkout(self.book.pk, self.other)
+        with self.assertRaises(loans.NoCopyAvailable):
+            loans.checkout(self.book.pk, User.objects.create_user(username="third"))
+        self.assertEqual(CatalogStats.load().num_instances_available, 0)
+
+    def test_checkout_copy_is_compare_and_swap(self):
+        pk = self.copies[0].pk
+        loans.checkout_copy(pk, self.reader)
+        with self.assertRaises(loans.CopyUnavailable):
+            loans.checkout_copy(pk, self.other)
+        self.assertEqual(self.copy(pk).borrower, self.reader)
+
+    def test_return_makes_the_copy_available(self):
+        pk = loans.checkout(self.book.pk, self.reader)
+        loans.return_copy(pk)
+        copy = self.copy(pk)
+        self.assertEqual(copy.status, "a")
+        self.assertIsNone(copy.borrower)
+        self.assertEqual(CatalogStats.load().num_instances_available, 2)
+        with self.assertRaises(loans.CopyUnavailable):
+            loans.return_copy(pk)
+
+    def test_fines_are_not_passed_to_the_next_borrower(self):
+        pk = self.copies[0].pk
+        loans.checkout_copy(pk, self.reader)
+        BookInstance.objects.filter(pk=pk).update(
+            fine=Decimal("2.50"), fine_assessed_on=datetime.date(2020, 1, 11)
+        )
+        loans.return_copy(pk)
+        loans.checkout_copy(pk, self.other)
+        copy = self.copy(pk)
+        self.assertEqual((copy.borrower, copy.fine), (self.other, Decimal("0")))
+        self.assertIsNone(copy.fine_assessed_on)
+
+    def test_renew_only_applies_to_loans(self):
+        due_back = datetime.date.today() + datetime.timedelta(weeks=3)
+        with self.assertRaises(loans.CopyUnavailable):
+            loans.renew(self.copies[0].pk, due_back)
+        pk = loans.checkout(self.book.pk, self.reader)
+        with self.assertRaises(loans.CopyUnavailable):
+            loans.renew(pk, due_back, borrower=self.other)
+        loans.renew(pk, due_back, borrower=self.reader)
+        self.assertEqual(self.copy(pk).due_back, due_back)
+
+    def test_reserved_copy_is_held_for_the_reserver(self):
+        held = loans.reserve(self.book.pk, self.reader)
+        self.assertEqual(self.copy(held).status, "r")
+        with self.assertRaises(loans.CopyUnavailable):
+            loans.checkout_copy(held, self.other)
+
+        self.assertEqual(loans.checkout(self.book.pk, self.reader), held)
+        self.assertEqual(self.copy(held).status, "o")
+        self.assertEqual(CatalogStats.load().num_instances_available, 1)
+
+    def test_one_copy_per_book_per_borrower(self):
+        loans.reserve(self.book.pk, self.reader)
+        with self.assertRaises(loans.AlreadyBorrowing):
+            loans.reserve(self.book.pk, self.reader)
+        loans.checkout(self.book.pk, self.reader)
+        with self.assertRaises(loans.AlreadyBorrowing):
+            loans.checkout(self.book.pk, self.reader)
+        with self.assertRaises(loans.AlreadyBorrowing):
+            loans.reserve(self.book.pk, self.reader)
+        self.assertEqual(BookInstance.objects.filter(borrower=self.reader).count(), 1)
+
+    def test_expired_holds_can_be_borrowed(self):
+        held = loans.reserve(self.book.pk, self.reader)
+        loans.checkout(self.book.pk, self.other)
+        with self.assertRaises(loans.NoCopyAvailable):
+            loans.checkout(self.book.pk, User.objects.create_user(username="third"))
+
+        yesterday = datetime.date.today() - datetime.timedelta(days=1)
+        BookInstance.objects.filter(pk=held).update(due_back=yesterday)
+        third = User.objects.get(username="third")
+        self.assertEqual(loans.checkout(self.book.pk, third), held)
+        self.assertEqual(self.copy(held).borrower, third)
+
+    def test_release_expired_holds(self):
+        held = loans.reserve(self.book.pk, self.reader)
+        loans.reserve(self.book.pk, self.other)
+        yesterday = datetime.date.today() - datetime.timedelta(days=1)
+        BookInstance.objects.filter(pk=held).update(due_back=yesterday)
+
+        self.assertEqual(loans.release_expired_holds(), 1)
+        copy = self.copy(held)
+        self.assertEqual((copy.status, copy.borrower), ("a", None))
+        self.assertEqual(CatalogStats.load().num_instances_available, 1)
+
+    def test_cancel_hold(self):
+        held = loans.reserve(self.book.pk, self.reader)
+        with self.assertRaises(loans.CopyUnavailable):
+            loans.cancel_hold(held, self.other)
+        loans.cancel_hold(held, self.reader)
+        self.assertEqual(self.copy(held).status, "a")
+        self.assertEqual(CatalogStats.load().num_instances_available, 2)
+
+    def test_book_counters_follow_transitions(self):
+        counters = Book.objects.values_list(
+            "copies_total", "copies_available", "copies_on_loan"
+        )
+        pk = loans.checkout(self.book.pk, self.reader)
+        loans.reserve(self.book.pk, self.other)
+        self.assertEqual(counters.get(pk=self.book.pk), (3, 0, 1))
+        loans.return_copy(pk)
+        self.assertEqual(counters.get(pk=self.book.pk), (3, 1, 0))
+        self.assertFalse(Book.objects.with_copy_drift().exists())
+
+    def test_catalog_stats_wait_for_the_commit(self):
+        with transaction.atomic():
+            loans.checkout(self.book.pk, self.reader)
+            self.assertEqual(CatalogStats.load().num_instances_available, 2)
+        self.assertEqual(CatalogStats.load().num_instances_available, 1)
+
+    def test_checkout_updates_book_stamp(self):
+        before = Book.objects.get(pk=self.book.pk).modified
+        loans.checkout(self.book.pk, self.reader)
+        self.assertGreater(Book.objects.get(pk=self.book.pk).modified, before)
+
+
+class LoanViewsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username="reader", password="12345")
+        cls.librarian = User.objects.create_user(username="librarian", password="12345")
+        cls.librarian.user_permissions.add(
+            Permission.objects.get(codename="can_mark_returned")
+        )
+        cls.book = Book.objects.create(title="Roadside Picnic", summary="", isbn="1")
+        cls.copy = BookInstance.objects.create(
+            book=cls.book, imprint="Macmillan", status="a"
+        )
+
+    def test_checkout_requires_post_and_login(self):
+        url = reverse("book-checkout", args=[self.book.pk])
+        self.assertEqual(self.client.post(url).status_code, 302)
+        self.client.login(username="reader", password="12345")
+        self.assertEqual(self.client.get(url).status_code, 405)
+
+    def test_checkout_then_return(self):
+        self.client.login(username="reader", password="12345")
+        resp = self.client.post(reverse("book-checkout", args=[self.book.pk]))
+        self.assertRedirects(resp, reverse("my-borrowed"))
+        self.assertEqual(BookInstance.objects.get(pk=self.copy.pk).status, "o")
+
+        resp = self.client.post(
+            reverse("book-checkout", args=[self.book.pk]), follow=True
+        )
+        self.assertContains(resp, "You already have a copy of this book.")
+
+        url = reverse("return-book-librarian", args=[self.copy.pk])
+        self.assertEqual(self.client.post(url).status_code, 302)
+        self.assertEqual(BookInstance.objects.get(pk=self.copy.pk).status, "o")
+        self.client.login(username="librarian", password="12345")
+        self.assertRedirects(self.client.post(url), reverse("all-borrowed"))
+        self.assertEqual(BookInstance.objects.get(pk=self.copy.pk).status, "a")
+
+    def test_reserve(self):
+        self.client.login(username="reader", password="12345")
+        resp = self.client.post(reverse("book-reserve", args=[self.book.pk]))
+        self.assertRedirects(resp, self.book.get_absolute_url())
+        copy = BookInstance.objects.get(pk=self.copy.pk)
+        self.assertEqual((copy.status, copy.borrower), ("r", self.reader))
+
+        resp = self.client.get(reverse("my-borrowed"))
+        self.assertContains(resp, "Cancel hold")
+        resp = self.client.post(reverse("cancel-hold", args=[self.copy.pk]))
+        self.assertRedirects(resp, reverse("my-borrowed"))
+        self.assertEqual(BookInstance.objects.get(pk=self.copy.pk).status, "a")
+
+
+class LoanConcurrencyTest(TransactionTestCase):
+    def test_each_copy_is_lent_once_under_contention(self):
+        book = Book.objects.create(title="Stalker", summary="", isbn="2")
+        for _ in range(5):
+            BookInstance.objects.create(book=book, imprint="Mir", status="a")
+        borrowers = [
+            User.objects.create_user(username="reader%s" % i) for i in range(20)
+        ]
+
+        def borrow(user):
+            try:
+                while True:
+                    try:
+                        return loans.checkout(book.pk, user)
+                    except loans.NoCopyAvailable:
+                        return None
+                    except OperationalError:
+                        # SQLite's shared in-memory test database reports a
+                        # conflicting writer immediately instead of waiting
+                        # out a busy timeout; retry like a real client would.
+                        time.sleep(0.001)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(borrow, borrowers))
+
+        lent = [pk for pk in results if pk is not None]
+        self.assertEqual(len(lent), 5)
+        self.assertEqual(len(set(lent)), 5)
+        self.assertEqual(
+            BookInstance.objects.filter(status="o").values("borrower").count(), 5
+        )
+        book.refresh_from_db()
+        self.assertEqual(book.copies_available, 0)
+        stats = CatalogStats.load()
+        rebuilt = CatalogStats.rebuild()
+        self.assertEqual(
+            (stats.num_instances, stats.num_instances_available),
+            (rebuilt.num_instances, rebuilt.num_instances_available),
+        )
+        self.assertEqual(stats.num_instances_available, 0)
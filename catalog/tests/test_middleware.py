@@ -0,0 +1,67 @@
+import json
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog import instrumentation
+from catalog.models import Author, Book
+
+
+class QueryTimingMiddlewareTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name="Ursula", last_name="Le Guin")
+        Book.objects.create(
+            title="The Dispossessed", summary="", isbn="9780061054884", author=author
+        )
+
+    def setUp(self):
+        cache.clear()
+        instrumentation.store.clear()
+        self.addCleanup(instrumentation.store.clear)
+
+    def test_disabled_by_default(self):
+        response = self.client.get(reverse("books"))
+        self.assertNotIn("Server-Timing", response)
+        self.assertEqual(instrumentation.store.snapshot(), {})
+
+    @override_settings(CATALOG_INSTRUMENTATION=True)
+    def test_server_timing_header(self):
+        with self.assertLogs("catalog.instrumentation", "INFO") as logs:
+            response = self.client.get(reverse("books"))
+        timing = response["Server-Timing"]
+        for metric in ("db;dur=", "tpl;dur=", "view;dur=", "total;dur="):
+            self.assertIn(metric, timing)
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["url_name"], "books")
+        self.assertEqual(record["status"], 200)
+        self.assertGreater(record["queries"], 0)
+        self.assertIn('desc="%s queries"' % record["queries"], timing)
+        self.assertGreater(record["template_ms"], 0)
+
+    @override_settings(
+        CATALOG_INSTRUMENTATION=True, CATALOG_INSTRUMENTATION_FLUSH_EVERY=2
+    )
+    def test_percentiles_dumped_by_command(self):
+        with self.assertLogs("catalog.instrumentation", "INFO"):
+            for _ in range(3):
+                self.client.get(reverse("books"))
+            self.client.get(reverse("authors"))
+
+        stdout = StringIO()
+        call_command("catalog_timings", "--json", stdout=stdout)
+        summary = json.loads(stdout.getvalue())
+        self.assertEqual(summary["books"]["requests"], 3)
+        self.assertEqual(summary["authors"]["requests"], 1)
+        self.assertLessEqual(summary["books"]["p50_ms"], summary["books"]["p99_ms"])
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(instrumentation.percentile(values, 0.5), 50)
+        self.assertEqual(instrumentation.percentile(values, 0.95), 95)
+        self.assertEqual(instrumentation.percentile(values, 0.99), 99)
+        self.assertEqual(instrumentation.percentile([], 0.5), 0.0)
@@ -1,6 +1,12 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.db import DatabaseError, IntegrityError
 from django.test import TestCase
 
-from catalog.models import Author
+from catalog import fragments
+from catalog.models import Author, Book, BookInstance, CatalogStats, Genre, Language
 
 
 class AuthorModelTest(TestCase):
@@ -31,3 +37,196 @@ class AuthorModelTest(TestCase):
     def test_get_absolute_url(self):
         author = Author.objects.get(id=1)
         self.assertEquals(author.get_absolute_url(), "/catalog/author/1")
+
+
+class BookModelTest(TestCase):
+    def test_isbn_is_unique(self):
+        Book.objects.create(title="First", summary="Summary", isbn="9780547722023")
+        with self.assertRaises(IntegrityError):
+            Book.objects.create(title="Second", summary="Summary", isbn="9780547722023")
+
+
+class BookCopyCountersTest(TestCase):
+    def setUp(self):
+        self.book = Book.objects.create(title="Kindred", summary="", isbn="1")
+        self.other = Book.objects.create(title="Dawn", summary="", isbn="2")
+
+    def counters(self, book):
+        return Book.objects.values_list(
+            "copies_total", "copies_available", "copies_on_loan"
+        ).get(pk=book.pk)
+
+    def test_created_copies_are_counted(self):
+        for status in ("a", "a", "o", "m"):
+            BookInstance.objects.create(book=self.book, imprint="Beacon", status=status)
+        self.assertEqual(self.counters(self.book), (4, 2, 1))
+
+    def test_status_changes_move_counts(self):
+        copy = BookInstance.objects.create(book=self.book, imprint="B", status="a")
+        copy.status = "o"
+        copy.save()
+        self.assertEqual(self.counters(self.book), (1, 0, 1))
+
+        copy = BookInstance.objects.only("pk").get(pk=copy.pk)
+        copy.status = "a"
+        copy.save(update_fields=["status"])
+        self.assertEqual(self.counters(self.book), (1, 1, 0))
+
+    def test_moving_a_copy_between_books(self):
+        copy = BookInstance.objects.create(book=self.book, imprint="B", status="o")
+        copy.book = self.other
+        copy.save()
+        self.assertEqual(self.counters(self.book), (0, 0, 0))
+        self.assertEqual(self.counters(self.other), (1, 0, 1))
+
+    def test_deleted_copies_are_uncounted(self):
+        for status in ("a", "o"):
+            BookInstance.objects.create(book=self.book, imprint="B", status=status)
+        BookInstance.objects.get(status="a").delete()
+        BookInstance.objects.only("pk").get(status="o").delete()
+        self.assertEqual(self.counters(self.book), (0, 0, 0))
+
+    def test_counters_are_saved_with_the_copy(self):
+        with patch.object(CatalogStats, "increment", side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                BookInstance.objects.create(book=self.book, imprint="B", status="a")
+        self.assertFalse(BookInstance.objects.exists())
+        self.assertEqual(self.counters(self.book), (0, 0, 0))
+
+    def test_recount_command_repairs_drift(self):
+        BookInstance.objects.create(book=self.book, imprint="B", status="a")
+        Book.objects.filter(pk=self.book.pk).update(copies_total=9, copies_on_loan=3)
+        stdout = StringIO()
+        call_command("recount_copies", stdout=stdout)
+        self.assertIn("Recounted copies for 1 drifted books", stdout.getvalue())
+        self.assertEqual(self.counters(self.book), (1, 1, 0))
+        self.assertEqual(self.counters(self.other), (0, 0, 0))
+
+    def test_recount_command_refreshes_cached_counts(self):
+        BookInstance.objects.create(book=self.book, imprint="B", status="a")
+        Book.objects.filter(pk=self.book.pk).update(copies_available=0)
+        key = fragments.version_key("book", self.book.pk)
+        version = fragments.get_versions([key])[0]
+        modified = Book.objects.get(pk=self.book.pk).modified
+        call_command("recount_copies", stdout=StringIO())
+        self.assertGreater(fragments.get_versions([key])[0], version)
+        self.assertGreater(Book.objects.get(pk=self.book.pk).modified, modified)
+
+
+class BrowseBookCountsTest(TestCase):
+    def setUp(self):
+        self.fantasy = Genre.objects.create(name="Fantasy")
+        self.poetry = Genre.objects.create(name="Poetry")
+        self.english = Language.objects.create(name="English")
+        self.spanish = Language.objects.create(name="Spanish")
+        self.book = Book.objects.create(
+            title="Kindred", summary="", isbn="1", language=self.english
+        )
+
+    def counts(self, model):
+        return dict(model.objects.values_list("name", "book_count"))
+
+    def test_languages_follow_books(self):
+        Book.objects.create(title="Dawn", summary="", isbn="2", language=self.english)
+        self.assertEqual(self.counts(Language), {"English": 2, "Spanish": 0})
+
+        book = Book.objects.only("title").get(pk=self.book.pk)
+        book.language = self.spanish
+        book.save()
+        self.assertEqual(self.counts(Language), {"English": 1, "Spanish": 1})
+
+        Book.objects.get(pk=self.book.pk).delete()
+        self.assertEqual(self.counts(Language), {"English": 1, "Spanish": 0})
+
+    def test_genres_follow_links(self):
+        self.book.genre.add(self.fantasy, self.poetry)
+        self.book.genre.add(self.fantasy)
+        self.assertEqual(self.counts(Genre), {"Fantasy": 1, "Poetry": 1})
+
+        self.book.genre.remove(self.poetry)
+        self.book.genre.remove(self.poetry)
+        self.assertEqual(self.counts(Genre), {"Fantasy": 1, "Poetry": 0})
+
+        other = Book.objects.create(title="Dawn", summary="", isbn="2")
+        self.fantasy.book_set.add(other)
+        self.poetry.book_set.add(self.book, other)
+        self.assertEqual(self.counts(Genre), {"Fantasy": 2, "Poetry": 2})
+
+        self.poetry.book_set.clear()
+        self.book.genre.clear()
+        self.assertEqual(self.counts(Genre), {"Fantasy": 1, "Poetry": 0})
+
+        other.delete()
+        self.assertEqual(self.counts(Genre), {"Fantasy": 0, "Poetry": 0})
+
+    def test_recount_books(self):
+        self.book.genre.add(self.fantasy)
+        Genre.objects.update(book_count=7)
+        Language.objects.update(book_count=7)
+        Genre.objects.recount_books()
+        Language.objects.recount_books()
+        self.assertEqual(self.counts(Genre), {"Fantasy": 1, "Poetry": 0})
+        self.assertEqual(self.counts(Language), {"English": 1, "Spanish": 0})
+
+
+class CatalogStatsModelTest(TestCase):
+    def setUp(self):
+        self.author = Author.objects.create(first_name="Big", last_name="Bob")
+        self.genre = Genre.objects.create(name="Fantasy")
+        self.book = Book.objects.create(
+            title="Book Title",
+            summary="My book summary",
+            isbn="ABCDEFG",
+            author=self.author,
+        )
+        self.copy = BookInstance.objects.create(
+            book=self.book, imprint="Unlikely Imprint, 2016", status="a"
+        )
+        BookInstance.objects.create(
+            book=self.book, imprint="Unlikely Imprint, 2016", status="m"
+        )
+
+    def assertStatsMatchTables(self):
+        stats = CatalogStats.load()
+        rebuilt = CatalogStats.rebuild()
+        for field in (
+            "num_books",
+            "num_instances",
+            "num_instances_available",
+            "num_authors",
+            "num_genres",
+        ):
+            self.assertEqual(getattr(stats, field), getattr(rebuilt, field), field)
+
+    def test_counters_follow_creates(self):
+        stats = CatalogStats.load()
+        self.assertEqual(stats.num_books, 1)
+        self.assertEqual(stats.num_instances, 2)
+        self.assertEqual(stats.num_instances_available, 1)
+        self.assertEqual(stats.num_authors, 1)
+        self.assertEqual(stats.num_genres, 1)
+
+    def test_counters_follow_status_changes(self):
+        copy = BookInstance.objects.get(pk=self.copy.pk)
+        copy.status = "o"
+        copy.save()
+        self.assertEqual(CatalogStats.load().num_instances_available, 0)
+        copy.status = "a"
+        copy.save()
+        self.assertEqual(CatalogStats.load().num_instances_available, 1)
+        self.assertStatsMatchTables()
+
+    def test_counters_follow_deletes(self):
+        BookInstance.objects.all().delete()
+        self.book.delete()
+        self.author.delete()
+        self.genre.delete()
+        stats = CatalogStats.load()
+        self.assertEqual(stats.num_books, 0)
+        self.assertEqual(stats.num_instances, 0)
+        self.assertEqual(stats.num_instances_available, 0)
+        self.assertStatsMatchTables()
+
+    def test_load_rebuilds_missing_row(self):
+        CatalogStats.objects.all().delete()
+        self.assertEqual(CatalogStats.load().num_instances, 2)
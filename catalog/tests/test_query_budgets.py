@@ -0,0 +1,230 @@
+import datetime
+import inspect
+
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog import isbn, urls
+from catalog.models import Author, Book, BookInstance, Genre, Language
+
+LIBRARIAN_PERMISSIONS = (
+    "can_mark_returned",
+    "can_export_catalog",
+    "add_author",
+    "change_author",
+    "delete_author",
+    "add_book",
+    "change_book",
+    "delete_book",
+)
+
+
+class QueryBudgetTest(TestCase):
+    """
+    Every catalog page is requested once against a one-of-everything catalog
+    and again after the catalog has grown past every page size; the number of
+    queries must not change.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="librarian", password="x")
+        cls.user.user_permissions.set(
+            Permission.objects.filter(codename__in=LIBRARIAN_PERMISSIONS)
+        )
+        cls.other_user = User.objects.create_user(username="reader", password="x")
+        cls.language = Language.objects.create(name="English")
+        cls.genre = Genre.objects.create(name="Fantasy")
+        cls.author = Author.objects.create(first_name="Ursula", last_name="Le Guin")
+        cls.book = cls.create_book(cls.author, "A Wizard of Earthsea", [cls.genre])
+        cls.copy = cls.create_copy(cls.book, cls.user)
+        cls.hold = BookInstance.objects.create(
+            book=Book.objects.create(title="The Farthest Shore", summary="", isbn="F"),
+            imprint="Imprint",
+            status="r",
+            borrower=cls.user,
+            due_back=datetime.date.today() + datetime.timedelta(days=3),
+        )
+        cls.create_copy(cls.book)
+
+    @classmethod
+    def create_book(cls, author, title, genres):
+        book = Book.objects.create(
+            title=title,
+            summary="Summary of %s" % title,
+            isbn=title[:13],
+            author=author,
+            language=cls.language,
+        )
+        book.genre.set(genres)
+        return book
+
+    @classmethod
+    def create_copy(cls, book, borrower=None):
+        return BookInstance.objects.create(
+            book=book,
+            imprint="Imprint",
+            status="o" if borrower else "a",
+            borrower=borrower,
+            due_back=datetime.date.today() + datetime.timedelta(days=7),
+        )
+
+    def grow(self):
+        if getattr(self, "grown", False):
+            return
+        self.grown = True
+        genres = [self.genre] + [
+            Genre.objects.create(name="Genre %s" % i) for i in range(5)
+        ]
+        for i in range(12):
+            author = Author.objects.create(
+                first_name="First", last_name="Last %02d" % i
+            )
+            for j in range(4):
+                book = self.create_book(author, "Book %02d-%s" % (i, j), genres[:3])
+                self.create_copy(book)
+                self.create_copy(book, self.user)
+                self.create_copy(book, self.other_user)
+        for i in range(15):
+            self.create_book(self.author, "Earthsea %02d" % i, genres)
+        for i in range(8):
+            self.create_copy(self.book, self.user if i % 2 else None)
+        self.book.genre.set(genres)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def count_queries(self, method, url, data=None):
+        cache.clear()
+        isbn.local_cache.clear()
+        # Roll back whatever the request changed so create/update/delete are
+        # measured against the same rows in both passes.
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as queries:
+                response = getattr(self.client, method)(url, data or {})
+                if response.streaming:
+                    b"".join(response.streaming_content)
+            transaction.set_rollback(True)
+        self.assertLess(response.status_code, 400, url)
+        return len(queries)
+
+    def assertQueriesFlat(self, method, url_name, args=(), data=None, query=""):
+        url = reverse(url_name, args=args) + query
+        small = self.count_queries(method, url, data)
+        self.grow()
+        large = self.count_queries(method, url, data)
+        self.assertEqual(
+            small, large, "%s %s: %s queries grew to %s" % (method, url, small, large)
+        )
+
+    def book_form(self):
+        return {
+            "title": "The Tombs of Atuan",
+            "author": self.author.pk,
+            "summary": "Priestess",
+            "isbn": "9780689845369",
+            "genre": [self.genre.pk],
+            "language": self.language.pk,
+        }
+
+    def author_form(self):
+        return {"first_name": "Ursula K.", "last_name": "Le Guin"}
+
+    def test_index(self):
+        self.assertQueriesFlat("get", "index")
+
+    def test_books(self):
+        self.assertQueriesFlat("get", "books")
+
+    def test_book_detail(self):
+        self.assertQueriesFlat("get", "book-detail", [self.book.pk])
+
+    def test_search(self):
+        self.assertQueriesFlat("get", "search", query="?q=earthsea")
+
+    def test_authors(self):
+        self.assertQueriesFlat("get", "authors")
+
+    def test_author_detail(self):
+        self.assertQueriesFlat("get", "author-detail", [self.author.pk])
+
+    def test_genres(self):
+        self.assertQueriesFlat("get", "genres")
+        self.assertQueriesFlat("get", "genre-detail", [self.genre.pk])
+
+    def test_languages(self):
+        self.assertQueriesFlat("get", "languages")
+        self.assertQueriesFlat("get", "language-detail", [self.language.pk])
+
+    def test_isbn_lookup(self):
+        Book.objects.filter(pk=self.book.pk).update(isbn="9780547722023")
+        self.assertQueriesFlat("get", "isbn-lookup", ["0-547-72202-8"])
+
+    def test_my_borrowed(self):
+        self.assertQueriesFlat("get", "my-borrowed")
+
+    def test_all_borrowed(self):
+        self.assertQueriesFlat("get", "all-borrowed")
+        self.assertQueriesFlat("get", "all-borrowed", query="?overdue=1&status=r")
+        self.assertQueriesFlat("get", "all-borrowed", query="?borrower=librarian")
+
+    def test_export(self):
+        self.assertQueriesFlat("get", "catalog-export", ["books", "csv"])
+        self.assertQueriesFlat("get", "catalog-export", ["copies", "jsonl"])
+
+    def test_renew(self):
+        self.assertQueriesFlat("get", "renew-book-librarian", [self.copy.pk])
+        due_back = datetime.date.today() + datetime.timedelta(weeks=2)
+        self.assertQueriesFlat(
+            "post", "renew-book-librarian", [self.copy.pk], {"due_back": due_back}
+        )
+
+    def test_loans(self):
+        self.assertQueriesFlat("post", "book-checkout", [self.book.pk])
+        self.assertQueriesFlat("post", "book-reserve", [self.book.pk])
+        self.assertQueriesFlat("post", "cancel-hold", [self.hold.pk])
+        self.assertQueriesFlat("post", "return-book-librarian", [self.copy.pk])
+
+    def test_author_create(self):
+        self.assertQueriesFlat("get", "author_create")
+        self.assertQueriesFlat("post", "author_create", data=self.author_form())
+
+    def test_author_update(self):
+        self.assertQueriesFlat("get", "author_update", [self.author.pk])
+        self.assertQueriesFlat(
+            "post", "author_update", [self.author.pk], self.author_form()
+        )
+
+    def test_author_delete(self):
+        self.assertQueriesFlat("get", "author_delete", [self.author.pk])
+        self.assertQueriesFlat("post", "author_delete", [self.author.pk])
+
+    def test_book_create(self):
+        self.assertQueriesFlat("get", "book_create")
+        self.assertQueriesFlat("post", "book_create", data=self.book_form())
+
+    def test_book_update(self):
+        self.assertQueriesFlat("get", "book_update", [self.book.pk])
+        self.assertQueriesFlat("post", "book_update", [self.book.pk], self.book_form())
+
+    def test_book_delete(self):
+        self.assertQueriesFlat("get", "book_delete", [self.book.pk])
+        self.assertQueriesFlat("post", "book_delete", [self.book.pk])
+
+    def test_api(self):
+        self.assertQueriesFlat("get", "api-books")
+        self.assertQueriesFlat("get", "api-book-detail", [self.book.pk])
+        self.assertQueriesFlat("get", "api-book-availability", [self.book.pk])
+        self.assertQueriesFlat("get", "api-authors")
+        self.assertQueriesFlat("get", "api-author-detail", [self.author.pk])
+
+    def test_every_route_has_a_budget(self):
+        source = inspect.getsource(type(self))
+        for pattern in urls.urlpatterns:
+            self.assertTrue(
+                '"%s"' % pattern.name in source, "No budget for %s" % pattern.name
+            )
@@ -0,0 +1,114 @@
+import math
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.db import connections
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog import fragments, routers
+from catalog.models import Author, Book
+
+REPLICAS = ["replica1", "replica2"]
+
+
+@override_settings(CATALOG_REPLICAS=REPLICAS)
+class ReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+        routers.monitor.clear()
+        self.addCleanup(routers.monitor.clear)
+
+    def read_from(self, alias):
+        token = routers.read_alias.set(alias)
+        self.addCleanup(routers.read_alias.reset, token)
+
+    def test_reads_follow_the_chosen_replica(self):
+        self.assertIsNone(self.router.db_for_read(Book))
+        self.read_from("replica2")
+        self.assertEqual(self.router.db_for_read(Book), "replica2")
+
+    def test_sessions_and_users_stay_on_the_primary(self):
+        self.read_from("replica2")
+        self.assertIsNone(self.router.db_for_read(User))
+
+    def test_writes_and_migrations_go_to_the_primary(self):
+        self.read_from("replica2")
+        self.assertEqual(self.router.db_for_write(Book), "default")
+        self.assertFalse(self.router.allow_migrate("replica1", "catalog"))
+        self.assertIsNone(self.router.allow_migrate("default", "catalog"))
+
+    def test_round_robin(self):
+        chosen = {routers.choose_replica() for _ in range(4)}
+        self.assertEqual(chosen, set(REPLICAS))
+
+    @override_settings(CATALOG_REPLICA_SELECTION="least-lag")
+    def test_least_lag(self):
+        lags = {"replica1": 4.0, "replica2": 0.5}
+        with patch.object(routers, "measure_lag", side_effect=lags.get) as measure:
+            self.assertEqual(routers.choose_replica(), "replica2")
+            self.assertEqual(routers.choose_replica(), "replica2")
+        # Lag is cached between measurements.
+        self.assertEqual(measure.call_count, 2)
+
+    @override_settings(CATALOG_REPLICA_SELECTION="least-lag", CATALOG_REPLICA_MAX_LAG=1)
+    def test_lagging_replicas_fall_back_to_the_primary(self):
+        lags = {"replica1": 4.0, "replica2": math.inf}
+        with patch.object(routers, "measure_lag", side_effect=lags.get):
+            self.assertIsNone(routers.choose_replica())
+
+    @override_settings(CATALOG_REPLICA_MAX_LAG=30)
+    def test_replica_fragments_expire_with_the_tolerated_lag(self):
+        self.assertGreater(fragments.fragment_timeout(), 30)
+        self.read_from("replica1")
+        self.assertEqual(fragments.fragment_timeout(), 30)
+
+
+@override_settings(CATALOG_REPLICAS=["replica"])
+class ReplicaRoutingMiddlewareTest(TransactionTestCase):
+    """
+    Runs against a "replica" alias that mirrors the test database, like two
+    SQLite files that hold the same data.
+    """
+
+    def setUp(self):
+        connections.databases["replica"] = dict(connections["default"].settings_dict)
+        self.addCleanup(connections.databases.pop, "replica")
+        self.addCleanup(connections.__delitem__, "replica")
+        self.author = Author.objects.create(first_name="Octavia", last_name="Butler")
+        User.objects.create_user(username="reader", password="12345")
+
+    def queries(self, method, url, **data):
+        with CaptureQueriesContext(connections["default"]) as primary:
+            with CaptureQueriesContext(connections["replica"]) as replica:
+                response = getattr(self.client, method)(url, data)
+        return response, len(primary), len(replica)
+
+    def test_catalog_pages_read_from_the_replica(self):
+        for url in (
+            reverse("index"),
+            reverse("authors"),
+            reverse("author-detail", args=[self.author.pk]),
+        ):
+            response, primary, replica = self.queries("get", url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(primary, 0, url)
+            self.assertGreater(replica, 0, url)
+
+    def test_other_views_use_the_primary(self):
+        self.client.login(username="reader", password="12345")
+        response, primary, replica = self.queries("get", reverse("my-borrowed"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(replica, 0)
+
+    def test_posting_pins_the_client_to_the_primary(self):
+        response, _, _ = self.queries(
+            "post", reverse("login"), username="reader", password="12345"
+        )
+        self.assertIn("catalog_primary", response.cookies)
+
+        response, primary, replica = self.queries("get", reverse("authors"))
+        self.assertContains(response, "Butler")
+        self.assertEqual(replica, 0)
+        self.assertGreater(primary, 0)
@@ -0,0 +1,102 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog import search
+from catalog.models import Author, Book, Genre
+
+
+class BookSearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name="Ursula", last_name="Le Guin")
+        cls.fantasy = Genre.objects.create(name="Fantasy")
+        cls.poetry = Genre.objects.create(name="Poetry")
+        cls.wizard = Book.objects.create(
+            title="A Wizard of Earthsea",
+            summary="A young mage learns the true names of things.",
+            isbn="9780547722023",
+            author=cls.author,
+        )
+        cls.wizard.genre.add(cls.fantasy)
+        cls.other = Book.objects.create(
+            title="Madagascar",
+            summary="An island travelogue that mentions a wizard once.",
+            isbn="9780000000001",
+        )
+        cls.other.genre.add(cls.poetry)
+
+    def test_matches_title_summary_isbn_author_and_genre(self):
+        self.assertEqual(search.search_book_ids("earthsea"), [self.wizard.pk])
+        self.assertEqual(search.search_book_ids("island"), [self.other.pk])
+        self.assertEqual(search.search_book_ids("9780547722023"), [self.wizard.pk])
+        self.assertEqual(search.search_book_ids("guin"), [self.wizard.pk])
+        self.assertEqual(search.search_book_ids("poetry"), [self.other.pk])
+
+    def test_title_matches_rank_above_summary_matches(self):
+        self.assertEqual(
+            search.search_book_ids("wizard"), [self.wizard.pk, self.other.pk]
+        )
+
+    def test_prefix_matches(self):
+        self.assertEqual(search.search_book_ids("earth"), [self.wizard.pk])
+
+    def test_postgresql_query_matches_every_token_as_a_prefix(self):
+        tokens = search.TOKEN_RE.findall("Wiz earth's")
+        self.assertEqual(search.prefix_tsquery(tokens), "'Wiz':* & 'earth':* & 's':*")
+
+    def test_index_follows_book_author_and_genre_changes(self):
+        author = Author.objects.get(pk=self.author.pk)
+        author.last_name = "LeGuin"
+        author.save()
+        self.assertEqual(search.search_book_ids("leguin"), [self.wizard.pk])
+
+        fantasy = Genre.objects.get(pk=self.fantasy.pk)
+        fantasy.name = "High Fantasy"
+        fantasy.save()
+        self.assertEqual(search.search_book_ids("high"), [self.wizard.pk])
+
+        wizard = Book.objects.get(pk=self.wizard.pk)
+        wizard.genre.remove(fantasy)
+        self.assertEqual(search.search_book_ids("high"), [])
+
+        Genre.objects.get(pk=self.poetry.pk).book_set.clear()
+        self.assertEqual(search.search_book_ids("poetry"), [])
+
+        author.delete()
+        self.assertEqual(search.search_book_ids("leguin"), [])
+
+        wizard.delete()
+        self.assertEqual(search.search_book_ids("earthsea"), [])
+
+    def test_rebuild_command(self):
+        search.unindex_books([self.wizard.pk])
+        self.assertEqual(search.search_book_ids("earthsea"), [])
+        call_command("rebuild_search_index", stdout=StringIO())
+        self.assertEqual(search.search_book_ids("earthsea"), [self.wizard.pk])
+
+    def test_search_view(self):
+        resp = self.client.get(reverse("search"), {"q": "wizard"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertTemplateUsed(resp, "books/book_search.html")
+        self.assertEqual(list(resp.context["book_list"]), [self.wizard, self.other])
+        self.assertFalse(resp.context["has_next"])
+
+    def test_search_view_paginates(self):
+        for book_num in range(12):
+            Book.objects.create(
+                title="Wizard %s" % book_num, summary="Spells", isbn="W%s" % book_num
+            )
+        resp = self.client.get(reverse("search"), {"q": "wizard"})
+        self.assertEqual(len(resp.context["book_list"]), 10)
+        self.assertTrue(resp.context["has_next"])
+        resp = self.client.get(reverse("search"), {"q": "wizard", "page": 2})
+        self.assertEqual(len(resp.context["book_list"]), 4)
+        self.assertFalse(resp.context["has_next"])
+
+    def test_search_view_ignores_punctuation_only_queries(self):
+        resp = self.client.get(reverse("search"), {"q": '"*)('})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context["book_list"], [])
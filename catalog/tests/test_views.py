@@ -1,12 +1,73 @@
-from django.test import TestCase
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
 from django.urls import reverse
 import datetime
 from django.utils import timezone
 
-from catalog.models import Author, BookInstance, Book, Genre, Language
-from django.contrib.auth.models import User
+from catalog import views
+from catalog.models import Author, BookInstance, Book, CatalogStats, Genre, Language
+from django.contrib.auth.models import Permission, User
+
+
+class IndexViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        test_author = Author.objects.create(first_name="John", last_name="Smith")
+        Genre.objects.create(name="Fantasy")
+        test_book = Book.objects.create(
+            title="Book Title",
+            summary="My book summary",
+            isbn="ABCDEFG",
+            author=test_author,
+        )
+        for status in ("a", "a", "o"):
+            BookInstance.objects.create(
+                book=test_book, imprint="Unlikely Imprint, 2016", status=status
+            )
+
+    def test_counts_come_from_catalog_stats(self):
+        resp = self.client.get(reverse("index"))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context["num_books"], 1)
+        self.assertEqual(resp.context["num_instances"], 3)
+        self.assertEqual(resp.context["num_instances_available"], 2)
+        self.assertEqual(resp.context["num_authors"], 1)
+        self.assertEqual(resp.context["num_genres"], 1)
+
+    def test_visit_counter_uses_signed_cookie(self):
+        with self.assertNumQueries(1):
+            resp = self.client.get(reverse("index"))
+        self.assertEqual(resp.context["num_visits"], 0)
+        self.assertNotIn("sessionid", resp.cookies)
+        resp = self.client.get(reverse("index"))
+        self.assertEqual(resp.context["num_visits"], 1)
+
+    def test_tampered_visit_cookie_is_ignored(self):
+        self.client.cookies["num_visits"] = "41"
+        resp = self.client.get(reverse("index"))
+        self.assertEqual(resp.context["num_visits"], 0)
 
+    @override_settings(CATALOG_VISIT_COUNTER="session")
+    def test_visit_counter_can_use_session(self):
+        self.client.get(reverse("index"))
+        resp = self.client.get(reverse("index"))
+        self.assertEqual(resp.context["num_visits"], 1)
+        self.assertEqual(self.client.session["num_visits"], 2)
 
+    def test_rebuild_command_repairs_drift(self):
+        CatalogStats.objects.update(num_books=42, num_instances_available=0)
+        call_command("rebuild_catalog_stats", stdout=StringIO())
+        resp = self.client.get(reverse("index"))
+        self.assertEqual(resp.context["num_books"], 1)
+        self.assertEqual(resp.context["num_instances_available"], 2)
+
+
+@override_settings(CATALOG_PAGINATION="offset")
 class AuthorListViewTest(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -48,6 +109,356 @@ class AuthorListViewTest(TestCase):
         self.assertTrue(is_paginated)
         self.assertTrue(len(resp.context["author_list"]) == 3)
 
+    def test_whole_table_uses_estimated_count(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        Author.objects.create(first_name="Not", last_name="Analyzed")
+        with self.settings(CATALOG_ESTIMATED_COUNT_THRESHOLD=10):
+            resp = self.client.get(reverse("authors"))
+            self.assertEqual(resp.context["paginator"].count, 13)
+            resp = self.client.get(reverse("authors") + "?page=2")
+        # The last page is counted exactly, so the new author is listed.
+        self.assertEqual(resp.context["paginator"].count, 14)
+        self.assertEqual(len(resp.context["author_list"]), 4)
+
+
+@override_settings(CATALOG_PAGINATION="keyset")
+class AuthorListViewKeysetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        number_of_authors = 23
+        for author_num in range(number_of_authors):
+            Author.objects.create(
+                first_name="Christian %s" % author_num,
+                last_name="Surname %02d" % (author_num % 7),
+            )
+
+    def walk_pages(self, query=""):
+        pages = []
+        while True:
+            resp = self.client.get(reverse("authors") + query)
+            self.assertEqual(resp.status_code, 200)
+            pages.append(resp)
+            if not resp.context["page_obj"].has_next():
+                return pages
+            query = resp.context["page_obj"].next_page_query
+
+    def test_first_page_is_ten(self):
+        resp = self.client.get(reverse("authors"))
+        self.assertTrue(resp.context["is_paginated"])
+        self.assertEqual(len(resp.context["author_list"]), 10)
+        self.assertFalse(resp.context["page_obj"].has_previous())
+
+    def test_cursors_walk_every_author_in_order(self):
+        pages = self.walk_pages()
+        self.assertEqual([len(p.context["author_list"]) for p in pages], [10, 10, 3])
+        seen = [a.pk for p in pages for a in p.context["author_list"]]
+        expected = list(
+            Author.objects.order_by("last_name", "first_name", "id").values_list(
+                "pk", flat=True
+            )
+        )
+        self.assertEqual(seen, expected)
+
+    def test_previous_cursor_returns_preceding_page(self):
+        first, second, third = self.walk_pages()
+        resp = self.client.get(
+            reverse("authors") + third.context["page_obj"].previous_page_query
+        )
+        self.assertEqual(
+            list(resp.context["author_list"]), list(second.context["author_list"])
+        )
+        self.assertTrue(resp.context["page_obj"].has_previous())
+
+    def test_page_cost_does_not_depend_on_depth(self):
+        first, second, third = self.walk_pages()
+        with self.assertNumQueries(1):
+            self.client.get(
+                reverse("authors") + second.context["page_obj"].next_page_query
+            )
+
+    def test_tampered_cursor_returns_404(self):
+        resp = self.client.get(reverse("authors") + "?cursor=not-a-cursor")
+        self.assertEqual(resp.status_code, 404)
+
+
+class AuthorDetailViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name="John", last_name="Smith")
+        for book_num in range(13):
+            book = Book.objects.create(
+                title="Book %02d" % book_num,
+                summary="My book summary",
+                isbn="ISBN%s" % book_num,
+                author=cls.author,
+            )
+            for status in "aaom"[: book_num % 5]:
+                BookInstance.objects.create(
+                    book=book, imprint="Unlikely Imprint, 2016", status=status
+                )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_view_uses_correct_template(self):
+        resp = self.client.get(reverse("author-detail", args=[self.author.pk]))
+        self.assertEqual(resp.status_code, 200)
+        self.assertTemplateUsed(resp, "authors/author_detail.html")
+
+    def test_books_show_copy_counters(self):
+        resp = self.client.get(reverse("author-detail", args=[self.author.pk]))
+        book = resp.context["book_list"][4]
+        self.assertEqual(book.title, "Book 04")
+        self.assertEqual(book.copies_total, 4)
+        self.assertEqual(book.copies_available, 2)
+        self.assertEqual(book.copies_on_loan, 1)
+
+    def test_books_are_paginated(self):
+        resp = self.client.get(reverse("author-detail", args=[self.author.pk]))
+        self.assertTrue(resp.context["is_paginated"])
+        self.assertEqual(len(resp.context["book_list"]), 10)
+
+        resp = self.client.get(
+            reverse("author-detail", args=[self.author.pk]) + "?page=2"
+        )
+        self.assertEqual(len(resp.context["book_list"]), 3)
+
+    @override_settings(CATALOG_FRAGMENT_TIMEOUT=60)
+    def test_missing_authors_leave_no_permanent_keys(self):
+        with patch.object(cache, "add", wraps=cache.add) as add:
+            resp = self.client.get(reverse("author-detail", args=[self.author.pk + 1]))
+        self.assertEqual(resp.status_code, 404)
+        self.assertTrue(add.call_args_list)
+        for call in add.call_args_list:
+            self.assertEqual(call.args[2], 60)
+
+    def test_pages_past_the_end_share_the_last_page(self):
+        url = reverse("author-detail", args=[self.author.pk])
+        self.client.get(url + "?page=2")
+        with self.assertNumQueries(0):
+            resp = self.client.get(url + "?page=99999")
+        self.assertContains(resp, "Page 2 of 2.")
+
+    def test_query_count_does_not_grow_with_books(self):
+        with self.assertNumQueries(3):
+            resp = self.client.get(reverse("author-detail", args=[self.author.pk]))
+        self.assertEqual(resp.status_code, 200)
+
+    def test_cached_fragment_follows_copy_changes(self):
+        url = reverse("author-detail", args=[self.author.pk])
+        self.assertContains(self.client.get(url), "(4)")
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        book = Book.objects.get(title="Book 09")
+        BookInstance.objects.create(book=book, imprint="Imprint", status="a")
+        self.assertContains(self.client.get(url), "Available: 3")
+
+        book.title = "Book 00 renamed"
+        book.save()
+        self.assertContains(self.client.get(url), "Book 00 renamed")
+
+
+class BookListViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for num, available in enumerate((0, 2, 1, 0, 3)):
+            book = Book.objects.create(
+                title="Book %s" % num, summary="", isbn="ISBN%s" % num
+            )
+            BookInstance.objects.create(book=book, imprint="Imprint", status="m")
+            for _ in range(available):
+                BookInstance.objects.create(book=book, imprint="Imprint", status="a")
+
+    def walk_titles(self, query):
+        titles = []
+        while True:
+            resp = self.client.get(reverse("books") + query)
+            titles += [book.title for book in resp.context["book_list"]]
+            if not resp.context["page_obj"].has_next():
+                return titles
+            query = resp.context["page_obj"].next_page_query
+
+    def test_shows_availability(self):
+        resp = self.client.get(reverse("books"))
+        self.assertContains(resp, "2 of 3 available")
+
+    def test_sort_by_availability(self):
+        self.assertEqual(
+            self.walk_titles("?sort=available"),
+            ["Book 4", "Book 1", "Book 2", "Book 0", "Book 3"],
+        )
+
+    def test_filter_available(self):
+        self.assertEqual(
+            self.walk_titles("?sort=title&available=1"), ["Book 1", "Book 2", "Book 4"]
+        )
+
+    @override_settings(CATALOG_PAGINATION="offset")
+    def test_offset_page_links_keep_the_sort_and_filter(self):
+        with patch.object(views.BookListView, "paginate_by", 1):
+            resp = self.client.get(reverse("books") + "?sort=available&available=1")
+        self.assertContains(resp, '?sort=available&amp;available=1&amp;page=2">next')
+
+
+class BrowseViewsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.fantasy = Genre.objects.create(name="Fantasy")
+        cls.poetry = Genre.objects.create(name="Poetry")
+        cls.english = Language.objects.create(name="English")
+        cls.author = Author.objects.create(first_name="Ursula", last_name="Le Guin")
+        for num in range(12):
+            book = Book.objects.create(
+                title="Earthsea %02d" % num,
+                summary="",
+                isbn=str(num),
+                author=cls.author,
+                language=cls.english if num % 2 else None,
+            )
+            book.genre.add(cls.fantasy)
+
+    def walk_titles(self, url, query=""):
+        titles = []
+        while True:
+            resp = self.client.get(url + query)
+            self.assertEqual(resp.status_code, 200)
+            titles += [book.title for book in resp.context["book_list"]]
+            if not resp.context["page_obj"].has_next():
+                return titles
+            query = resp.context["page_obj"].next_page_query
+
+    def test_genre_list_shows_counts(self):
+        resp = self.client.get(reverse("genres"))
+        self.assertTemplateUsed(resp, "books/browse_list.html")
+        self.assertContains(resp, "12 books")
+        self.assertContains(resp, "0 books")
+        self.assertContains(resp, self.fantasy.get_absolute_url())
+
+    def test_language_list_shows_counts(self):
+        resp = self.client.get(reverse("languages"))
+        self.assertContains(resp, "English")
+        self.assertContains(resp, "6 books")
+
+    def test_genre_pages_walk_its_books(self):
+        url = reverse("genre-detail", args=[self.fantasy.pk])
+        titles = self.walk_titles(url)
+        self.assertEqual(titles, ["Earthsea %02d" % num for num in range(12)])
+
+        resp = self.client.get(url)
+        self.assertContains(resp, "Le Guin")
+        self.assertEqual(len(resp.context["book_list"]), 10)
+
+    def test_language_page(self):
+        url = reverse("language-detail", args=[self.english.pk])
+        titles = self.walk_titles(url)
+        self.assertEqual(titles, ["Earthsea %02d" % num for num in range(1, 12, 2)])
+
+    @override_settings(CATALOG_PAGINATION="offset")
+    def test_page_count_comes_from_the_stored_count(self):
+        Genre.objects.filter(pk=self.fantasy.pk).update(book_count=25)
+        resp = self.client.get(reverse("genre-detail", args=[self.fantasy.pk]))
+        self.assertContains(resp, "Page 1 of 3.")
+
+    def test_empty_and_missing_genres(self):
+        resp = self.client.get(reverse("genre-detail", args=[self.poetry.pk]))
+        self.assertContains(resp, "There are no books here yet.")
+        resp = self.client.get(reverse("genre-detail", args=[self.poetry.pk + 100]))
+        self.assertEqual(resp.status_code, 404)
+
+
+class BookDetailViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        test_author = Author.objects.create(first_name="John", last_name="Smith")
+        test_language = Language.objects.create(name="English")
+        cls.small_book = Book.objects.create(
+            title="Small Book",
+            summary="My book summary",
+            isbn="ABCDEFG",
+            author=test_author,
+            language=test_language,
+        )
+        cls.small_book.genre.add(Genre.objects.create(name="Fantasy"))
+        BookInstance.objects.create(
+            book=cls.small_book, imprint="Unlikely Imprint, 2016", status="a"
+        )
+
+        cls.big_book = Book.objects.create(
+            title="Big Book",
+            summary="My book summary",
+            isbn="HIJKLMN",
+            author=test_author,
+            language=test_language,
+        )
+        for genre_num in range(8):
+            cls.big_book.genre.add(Genre.objects.create(name="Genre %s" % genre_num))
+        for copy_num in range(25):
+            BookInstance.objects.create(
+                book=cls.big_book,
+                imprint="Unlikely Imprint, 2016",
+                due_back=datetime.date.today(),
+                status="aom"[copy_num % 3],
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_view_uses_correct_template(self):
+        resp = self.client.get(reverse("book-detail", args=[self.small_book.pk]))
+        self.assertEqual(resp.status_code, 200)
+        self.assertTemplateUsed(resp, "books/book_detail.html")
+        self.assertContains(resp, "Smith, John")
+        self.assertContains(resp, "English")
+        self.assertContains(resp, "Fantasy")
+
+    def test_query_count_does_not_grow_with_copies_or_genres(self):
+        for book in (self.small_book, self.big_book):
+            with self.assertNumQueries(3):
+                resp = self.client.get(reverse("book-detail", args=[book.pk]))
+            self.assertEqual(resp.status_code, 200)
+        self.assertContains(resp, "Genre 7")
+        self.assertContains(resp, "Unlikely Imprint, 2016", count=25)
+
+    def test_missing_book_returns_404(self):
+        resp = self.client.get(reverse("book-detail", args=[9999]))
+        self.assertEqual(resp.status_code, 404)
+
+    def test_rendered_fragment_is_cached(self):
+        url = reverse("book-detail", args=[self.big_book.pk])
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(first.content, second.content)
+
+    def test_cached_fragment_follows_changes(self):
+        url = reverse("book-detail", args=[self.small_book.pk])
+        self.client.get(url)
+
+        copy = BookInstance.objects.get(book=self.small_book)
+        copy.imprint = "Second Imprint"
+        copy.save()
+        self.assertContains(self.client.get(url), "Second Imprint")
+
+        genre = Genre.objects.get(name="Fantasy")
+        genre.name = "High Fantasy"
+        genre.save()
+        self.assertContains(self.client.get(url), "High Fantasy")
+
+        language = Language.objects.get(name="English")
+        language.name = "British"
+        language.save()
+        self.assertContains(self.client.get(url), "British")
+
+        author = Author.objects.get(pk=self.small_book.author_id)
+        author.first_name = "Jane"
+        author.save()
+        self.assertContains(self.client.get(url), "Smith, Jane")
+
+        Book.objects.get(pk=self.small_book.pk).delete()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
 
 class LoanedBookInstancesByUserListViewTest(TestCase):
     def setUp(self):
@@ -145,3 +556,87 @@ class LoanedBookInstancesByUserListViewTest(TestCase):
             else:
                 self.assertTrue(last_date <= copy.due_back)
         # *********************************
+
+
+class BorrowedBooksDashboardTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.librarian = User.objects.create_user(username="librarian", password="12345")
+        cls.librarian.user_permissions.add(
+            Permission.objects.get(codename="can_mark_returned")
+        )
+        cls.reader = User.objects.create_user(username="reader", password="12345")
+        book = Book.objects.create(title="Neuromancer", summary="", isbn="1")
+        today = datetime.date.today()
+        cls.expected = []
+        for days, borrower in ((5, cls.reader), (-3, cls.librarian), (1, cls.reader)):
+            cls.expected.append(
+                BookInstance.objects.create(
+                    book=book,
+                    imprint="Ace",
+                    status="o",
+                    borrower=borrower,
+                    due_back=today + datetime.timedelta(days=days),
+                )
+            )
+        cls.expected.sort(key=lambda copy: copy.due_back)
+        cls.undated = BookInstance.objects.create(
+            book=book, imprint="Ace", status="o", borrower=cls.reader
+        )
+        cls.reserved = BookInstance.objects.create(
+            book=book,
+            imprint="Ace",
+            status="r",
+            borrower=cls.reader,
+            due_back=today,
+        )
+        BookInstance.objects.create(book=book, imprint="Ace", status="a")
+
+    def setUp(self):
+        self.client.login(username="librarian", password="12345")
+
+    def listed(self, query=""):
+        resp = self.client.get(reverse("all-borrowed") + query)
+        self.assertEqual(resp.status_code, 200)
+        return [copy.pk for copy in resp.context["bookinstance_list"]]
+
+    def test_requires_permission(self):
+        self.client.login(username="reader", password="12345")
+        self.assertEqual(self.client.get(reverse("all-borrowed")).status_code, 403)
+
+    def test_lists_loans_by_due_date(self):
+        resp = self.client.get(reverse("all-borrowed"))
+        self.assertTemplateUsed(resp, "books/bookinstance_list_borrowed_all.html")
+        self.assertEqual(
+            self.listed(), [copy.pk for copy in self.expected] + [self.undated.pk]
+        )
+
+    def test_cursor_walks_past_loans_without_due_date(self):
+        query, seen = "", []
+        with self.settings(CATALOG_PAGINATION="keyset"):
+            with patch.object(views.BorrowedBooksListView, "paginate_by", 1):
+                while True:
+                    resp = self.client.get(reverse("all-borrowed") + query)
+                    seen += [copy.pk for copy in resp.context["bookinstance_list"]]
+                    if not resp.context["page_obj"].has_next():
+                        break
+                    query = resp.context["page_obj"].next_page_query
+                previous = resp.context["page_obj"].previous_page_query
+                resp = self.client.get(reverse("all-borrowed") + previous)
+        self.assertEqual(seen, [copy.pk for copy in self.expected] + [self.undated.pk])
+        self.assertEqual(
+            [copy.pk for copy in resp.context["bookinstance_list"]],
+            [self.expected[-1].pk],
+        )
+
+    def test_filters(self):
+        self.assertEqual(self.listed("?overdue=1"), [self.expected[0].pk])
+        self.assertEqual(self.listed("?status=r"), [self.reserved.pk])
+        self.assertEqual(self.listed("?borrower=librarian"), [self.expected[0].pk])
+        self.assertEqual(self.listed("?borrower=nobody"), [])
+
+    @override_settings(CATALOG_PAGINATION="offset")
+    def test_offset_page_links_keep_the_filters(self):
+        with patch.object(views.BorrowedBooksListView, "paginate_by", 1):
+            resp = self.client.get(reverse("all-borrowed") + "?borrower=reader")
+        self.assertContains(resp, '?borrower=reader&amp;page=2">next</a>')
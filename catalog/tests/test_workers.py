@@ -0,0 +1,27 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from catalog.workers import WorkerRegistry, worker_name
+
+
+class WorkerRegistryTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.registry = WorkerRegistry("test:registry", timeout=60)
+
+    def test_collects_every_published_value(self):
+        cache.set(self.registry.workers_key, ["other-1"])
+        cache.set(self.registry.value_key % "other-1", {"n": 1})
+        self.registry.publish({"n": 2})
+        self.assertEqual(
+            self.registry.collect(), {"other-1": {"n": 1}, worker_name(): {"n": 2}}
+        )
+
+    def test_workers_whose_value_expired_are_dropped(self):
+        cache.set(self.registry.workers_key, ["gone-1", "gone-2"])
+        self.registry.publish({"n": 1})
+        self.assertEqual(cache.get(self.registry.workers_key), [worker_name()])
+
+        cache.delete(self.registry.value_key % worker_name())
+        self.assertEqual(self.registry.collect(), {})
+        self.assertEqual(cache.get(self.registry.workers_key), [])
@@ -1,20 +1,52 @@
+from django.conf import settings
 from django.conf.urls import url
 
-from . import views
+from . import api, async_views, views
+
+if settings.CATALOG_ASYNC_VIEWS:
+    index = async_views.index
+    book_detail = async_views.book_detail
+    author_detail = async_views.author_detail
+else:
+    index = views.index
+    book_detail = views.BookDetailView
+    author_detail = views.AuthorDetailView
 
 urlpatterns = [
-    url(r"^$", views.index, name="index"),
+    url(r"^$", index, name="index"),
     url(r"^books/$", views.BookListView.as_view(), name="books"),
-    url(r"^book/(?P<pk>\d+)$", views.BookDetailView, name="book-detail"),
+    url(r"^book/(?P<pk>\d+)$", book_detail, name="book-detail"),
+    url(r"^search/$", views.book_search, name="search"),
     url(r"^authors/$", views.AuthorListView.as_view(), name="authors"),
-    url(r"^author/(?P<pk>\d+)$", views.AuthorDetailView, name="author-detail"),
+    url(r"^author/(?P<pk>\d+)$", author_detail, name="author-detail"),
+    url(r"^genres/$", views.GenreListView.as_view(), name="genres"),
+    url(r"^genre/(?P<pk>\d+)$", views.BooksByGenreView.as_view(), name="genre-detail"),
+    url(r"^languages/$", views.LanguageListView.as_view(), name="languages"),
+    url(
+        r"^language/(?P<pk>\d+)$",
+        views.BooksByLanguageView.as_view(),
+        name="language-detail",
+    ),
     url(r"^mybooks/$", views.LoanedBooksByUserListView.as_view(), name="my-borrowed"),
     url(r"^borrowed/$", views.BorrowedBooksListView.as_view(), name="all-borrowed"),
+    url(
+        r"^export/(?P<dataset>books|copies)\.(?P<output_format>csv|jsonl)$",
+        views.export_catalog,
+        name="catalog-export",
+    ),
     url(
         r"^book/(?P<pk>[-\w]+)/renew/$",
         views.renew_book_librarian,
         name="renew-book-librarian",
     ),
+    url(
+        r"^book/(?P<pk>[-\w]+)/return/$",
+        views.return_book_librarian,
+        name="return-book-librarian",
+    ),
+    url(r"^book/(?P<pk>\d+)/checkout/$", views.checkout_book, name="book-checkout"),
+    url(r"^book/(?P<pk>\d+)/reserve/$", views.reserve_book, name="book-reserve"),
+    url(r"^book/(?P<pk>[-\w]+)/cancel-hold/$", views.cancel_hold, name="cancel-hold"),
     url(r"^author/create/$", views.AuthorCreate.as_view(), name="author_create"),
     url(
         r"^author/(?P<pk>\d+)/update/$",
@@ -26,6 +58,16 @@ urlpatterns = [
         views.AuthorDelete.as_view(),
         name="author_delete",
     ),
+    url(r"^api/books/$", api.book_list, name="api-books"),
+    url(r"^api/books/(?P<pk>\d+)/$", api.book_detail, name="api-book-detail"),
+    url(
+        r"^api/books/(?P<pk>\d+)/availability/$",
+        api.book_availability,
+        name="api-book-availability",
+    ),
+    url(r"^isbn/(?P<value>[-\dXx]+)/$", api.isbn_lookup, name="isbn-lookup"),
+    url(r"^api/authors/$", api.author_list, name="api-authors"),
+    url(r"^api/authors/(?P<pk>\d+)/$", api.author_detail, name="api-author-detail"),
     url(r"^book/create/$", views.BookCreate.as_view(), name="book_create"),
     url(r"^book/(?P<pk>\d+)/update/$", views.BookUpdate.as_view(), name="book_update"),
     url(r"^book/(?P<pk>\d+)/delete/$", views.BookDelete.as_view(), name="book_delete"),
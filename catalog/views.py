@@ -1,82 +1,341 @@
 import datetime
+from django.conf import settings
+from django.core.paginator import Paginator
 from django.shortcuts import render
+from django.template.loader import render_to_string
 from django.views.generic import ListView
 from django.shortcuts import get_object_or_404
 from django.urls import reverse, reverse_lazy
-from django.http import HttpResponseRedirect
+from django.http import HttpResponseRedirect, StreamingHttpResponse
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
-from django.contrib.auth.decorators import permission_required
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required, permission_required
+from django.contrib.auth.models import User
+from django.db.models import Exists, OuterRef
+from django.views.decorators.http import require_POST
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 
-from .models import Book, Author, BookInstance, Genre
+from .models import Book, Author, BookInstance, CatalogStats, Genre, Language
 from .forms import RenewBookModelForm
+from .pagination import EstimatedCountPaginator, KeysetPaginationMixin
+from . import export, fragments, loans, search
 
 
-def index(request):
-    num_books = Book.objects.all().count()
-    num_instances = BookInstance.objects.all().count()
-    num_instances_available = BookInstance.objects.filter(status__exact="a").count()
-    num_authors = Author.objects.count()
-    num_genres = Genre.objects.count()
-    books_madagascar = Book.objects.filter(title__iexact="madagascar")
-
-    num_visits = request.session.get("num_visits", 0)
-    request.session["num_visits"] = num_visits + 1
-
-    context = {
-        "num_books": num_books,
-        "num_instances": num_instances,
-        "num_instances_available": num_instances_available,
-        "num_authors": num_authors,
-        "num_genres": num_genres,
+VISITS_COOKIE = "num_visits"
+VISITS_COOKIE_SALT = "catalog.visits"
+VISITS_COOKIE_MAX_AGE = 60 * 60 * 24 * 365
+AUTHOR_BOOKS_PER_PAGE = 10
+
+
+def get_num_visits(request):
+    if settings.CATALOG_VISIT_COUNTER == "session":
+        return request.session.get("num_visits", 0)
+    try:
+        return int(
+            request.get_signed_cookie(VISITS_COOKIE, default=0, salt=VISITS_COOKIE_SALT)
+        )
+    except ValueError:
+        return 0
+
+
+def record_visit(request, response, num_visits):
+    if settings.CATALOG_VISIT_COUNTER == "session":
+        request.session["num_visits"] = num_visits + 1
+    else:
+        response.set_signed_cookie(
+            VISITS_COOKIE,
+            num_visits + 1,
+            salt=VISITS_COOKIE_SALT,
+            max_age=VISITS_COOKIE_MAX_AGE,
+            httponly=True,
+            samesite="Lax",
+        )
+
+
+def index_context(stats, num_visits):
+    return {
+        "num_books": stats.num_books,
+        "num_instances": stats.num_instances,
+        "num_instances_available": stats.num_instances_available,
+        "num_authors": stats.num_authors,
+        "num_genres": stats.num_genres,
         "num_visits": num_visits,
     }
 
-    return render(
+
+def index(request):
+    stats = CatalogStats.load()
+    num_visits = get_num_visits(request)
+
+    response = render(
         request,
         "index.html",
-        context=context,
+        context=index_context(stats, num_visits),
     )
+    record_visit(request, response, num_visits)
+    return response
 
 
-class AuthorListView(ListView):
+class AuthorListView(KeysetPaginationMixin, ListView):
     model = Author
     paginate_by = 10
+    keyset_ordering = ("last_name", "first_name", "id")
     template_name = "authors/author_list.html"
 
 
+def get_page_number(request):
+    try:
+        return max(int(request.GET.get("page", 1)), 1)
+    except ValueError:
+        return 1
+
+
+def author_books(author_id):
+    return (
+        Book.objects.filter(author=author_id)
+        .only(
+            "title",
+            "summary",
+            "copies_total",
+            "copies_available",
+            "copies_on_loan",
+        )
+        .order_by("title", "id")
+    )
+
+
+def author_page_number(request, author_id):
+    """
+    The requested page of an author's books, clamped to their page count so
+    that arbitrary ?page= values don't each cache a fragment. The page count
+    is cached under the author's fragment version too.
+    """
+    page_number = get_page_number(request)
+    if page_number == 1:
+        return page_number
+    num_pages = fragments.get_or_render(
+        "author",
+        author_id,
+        lambda: Paginator(author_books(author_id), AUTHOR_BOOKS_PER_PAGE).num_pages,
+        variant="pages",
+    )
+    return min(page_number, num_pages)
+
+
+def render_author_content(request, author, paginator, page_obj):
+    return render_to_string(
+        "authors/author_detail_content.html",
+        {
+            "author": author,
+            "book_list": page_obj.object_list,
+            "paginator": paginator,
+            "page_obj": page_obj,
+            "is_paginated": page_obj.has_other_pages(),
+        },
+        request,
+    )
+
+
 def AuthorDetailView(request, pk):
-    author_id = get_object_or_404(Author, pk=pk)
+    page_number = author_page_number(request, pk)
+
+    def render_content():
+        author_id = get_object_or_404(Author, pk=pk)
+        paginator = Paginator(author_books(author_id), AUTHOR_BOOKS_PER_PAGE)
+        page_obj = paginator.get_page(page_number)
+        return render_author_content(request, author_id, paginator, page_obj)
 
+    content = fragments.get_or_render("author", pk, render_content, variant=page_number)
     return render(
         request,
         "authors/author_detail.html",
         context={
-            "author": author_id,
+            "content": content,
         },
     )
 
 
-class BookListView(ListView):
+class BookListView(KeysetPaginationMixin, ListView):
     model = Book
     paginate_by = 3
+    keyset_ordering = ("title", "id")
     context_object_name = "book_list"
     template_name = "books/book_list.html"
+    sort_orderings = {
+        "title": ("title", "id"),
+        "available": ("-copies_available", "title", "id"),
+    }
+
+    def get_sort(self):
+        sort = self.request.GET.get("sort")
+        return sort if sort in self.sort_orderings else "title"
+
+    def get_keyset_ordering(self):
+        return self.sort_orderings[self.get_sort()]
+
+    def get_queryset(self):
+        queryset = Book.objects.select_related("author")
+        if self.request.GET.get("available"):
+            queryset = queryset.filter(copies_available__gt=0)
+        return queryset
 
     def get_context_data(self, **kwargs):
         context = super(BookListView, self).get_context_data(**kwargs)
         context["some_data"] = "This is just some data"
+        context["sort"] = self.get_sort()
+        context["available_only"] = bool(self.request.GET.get("available"))
+        return context
+
+
+class BrowseListView(KeysetPaginationMixin, ListView):
+    """Genres or languages with their denormalized book counts."""
+
+    paginate_by = 20
+    keyset_ordering = ("name", "id")
+    context_object_name = "browse_list"
+    template_name = "books/browse_list.html"
+    heading = None
+
+    def get_queryset(self):
+        return self.model.objects.only("name", "book_count")
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["heading"] = self.heading
         return context
 
 
+class GenreListView(BrowseListView):
+    model = Genre
+    heading = "Genres"
+
+
+class LanguageListView(BrowseListView):
+    model = Language
+    heading = "Languages"
+
+
+class BrowseBooksView(KeysetPaginationMixin, ListView):
+    """
+    One genre's or language's books by title, with the page count taken from
+    the stored book_count instead of a COUNT.
+    """
+
+    paginate_by = 10
+    keyset_ordering = ("title", "id")
+    context_object_name = "book_list"
+    template_name = "books/book_list_browse.html"
+    browse_model = None
+    # The Book field that points at browse_model.
+    browse_lookup = None
+
+    def get(self, request, *args, **kwargs):
+        self.browse_object = get_object_or_404(
+            self.browse_model.objects.only("name", "book_count"), pk=kwargs["pk"]
+        )
+        return super().get(request, *args, **kwargs)
+
+    def filter_books(self, books):
+        return books.filter(**{self.browse_lookup: self.browse_object})
+
+    def get_queryset(self):
+        return self.filter_books(Book.objects.select_related("author")).only(
+            "title",
+            "copies_total",
+            "copies_available",
+            "author__first_name",
+            "author__last_name",
+        )
+
+    def get_paginator(self, queryset, per_page, **kwargs):
+        paginator = super().get_paginator(queryset, per_page, **kwargs)
+        paginator.count = self.browse_object.book_count
+        return paginator
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["browse_object"] = self.browse_object
+        return context
+
+
+class BooksByLanguageView(BrowseBooksView):
+    browse_model = Language
+    # book_language_title_idx is already in page order.
+    browse_lookup = "language"
+
+
+class BooksByGenreView(BrowseBooksView):
+    browse_model = Genre
+    browse_lookup = "genre"
+
+    def filter_books(self, books):
+        """
+        A small genre is joined through the (genre_id, book_id) index and
+        sorted; a large one walks the title index and probes the through
+        table's (book_id, genre_id) index, which finds a page after about
+        page size x books / book_count rows. Picking the cheaper of the two
+        keeps a page under ~sqrt(page size x books) rows however big the
+        genre is.
+        """
+        genre = self.browse_object
+        books_total = CatalogStats.load().num_books
+        if genre.book_count**2 < (self.paginate_by + 1) * books_total:
+            return super().filter_books(books)
+        links = Book.genre.through.objects.filter(book=OuterRef("pk"), genre=genre)
+        return books.filter(Exists(links))
+
+
+def render_book_content(request, book, genres, copies):
+    return render_to_string(
+        "books/book_detail_content.html",
+        {"book": book, "genres": genres, "copies": copies},
+        request,
+    )
+
+
 def BookDetailView(request, pk):
-    book_id = get_object_or_404(Book, pk=pk)
+    def render_content():
+        book_id = get_object_or_404(Book.objects.with_detail(), pk=pk)
+        return render_book_content(
+            request, book_id, book_id.genre.all(), book_id.bookinstance_set.all()
+        )
 
+    content = fragments.get_or_render(
+        "book", pk, render_content, namespaces=("genre", "language")
+    )
     return render(
         request,
         "books/book_detail.html",
         context={
-            "book": book_id,
+            "content": content,
+            "book_id": pk,
+        },
+    )
+
+
+def book_search(request):
+    query = request.GET.get("q", "").strip()
+    try:
+        page = max(int(request.GET.get("page", 1)), 1)
+    except ValueError:
+        page = 1
+    per_page = 10
+
+    book_list = []
+    if query:
+        book_list = search.search_books(
+            query, offset=(page - 1) * per_page, limit=per_page + 1
+        )
+
+    return render(
+        request,
+        "books/book_search.html",
+        context={
+            "query": query,
+            "book_list": book_list[:per_page],
+            "page": page,
+            "has_previous": page > 1,
+            "has_next": len(book_list) > per_page,
         },
     )
 
@@ -85,23 +344,85 @@ class LoanedBooksByUserListView(LoginRequiredMixin, ListView):
     model = BookInstance
     template_name = "books/bookinstance_list_borrowed_user.html"
     paginate_by = 10
+    paginator_class = EstimatedCountPaginator
 
     def get_queryset(self):
         return (
             BookInstance.objects.filter(borrower=self.request.user)
             .filter(status__exact="o")
+            .select_related("book", "borrower")
+            .order_by("due_back")
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["holds"] = (
+            BookInstance.objects.filter(borrower=self.request.user, status="r")
+            .select_related("book")
+            .only("due_back", "book__title")
             .order_by("due_back")
         )
+        return context
 
 
-class BorrowedBooksListView(PermissionRequiredMixin, ListView):
+class BorrowedBooksListView(PermissionRequiredMixin, KeysetPaginationMixin, ListView):
     model = BookInstance
-    template_name = "books/bookinstance_list_borrowed_user.html"
+    template_name = "books/bookinstance_list_borrowed_all.html"
     paginate_by = 10
+    keyset_ordering = ("due_back", "id")
     permission_required = "catalog.can_mark_returned"
+    statuses = {"o": "On loan", "r": "Reserved"}
+
+    def get_filters(self):
+        status = self.request.GET.get("status")
+        return {
+            "status": status if status in self.statuses else "o",
+            "overdue": bool(self.request.GET.get("overdue")),
+            "borrower": self.request.GET.get("borrower", "").strip(),
+        }
 
     def get_queryset(self):
-        return BookInstance.objects.order_by("id")
+        filters = self.get_filters()
+        queryset = BookInstance.objects.filter(status=filters["status"])
+        if filters["overdue"]:
+            queryset = queryset.filter(due_back__lt=datetime.date.today())
+        if filters["borrower"]:
+            # Resolve the user first so the copy lookup can use the
+            # (borrower, status, due_back) index instead of joining on username.
+            borrower_id = (
+                User.objects.filter(username=filters["borrower"])
+                .values_list("pk", flat=True)
+                .first()
+            )
+            if borrower_id is None:
+                return BookInstance.objects.none()
+            queryset = queryset.filter(borrower_id=borrower_id)
+        return queryset.select_related("book", "borrower").only(
+            "due_back",
+            "status",
+            "fine",
+            "book__title",
+            "borrower__username",
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["filters"] = self.get_filters()
+        context["statuses"] = self.statuses
+        return context
+
+
+@permission_required("catalog.can_export_catalog")
+def export_catalog(request, dataset, output_format):
+    content_type = "text/csv" if output_format == "csv" else "application/x-ndjson"
+    response = StreamingHttpResponse(
+        export.iter_export(dataset, output_format), content_type=content_type
+    )
+    response["Content-Disposition"] = 'attachment; filename="%s.%s"' % (
+        dataset,
+        output_format,
+    )
+    return response
 
 
 @permission_required("catalog.can_mark_returned")
@@ -112,9 +433,12 @@ def renew_book_librarian(request, pk):
         form = RenewBookModelForm(request.POST)
 
         if form.is_valid():
-            book_inst.due_back = form.cleaned_data["due_back"]
-            book_inst.save()
-            return HttpResponseRedirect(reverse("all-borrowed"))
+            try:
+                loans.renew(book_inst.pk, form.cleaned_data["due_back"])
+            except loans.LoanError as error:
+                form.add_error(None, str(error))
+            else:
+                return HttpResponseRedirect(reverse("all-borrowed"))
 
     else:
         proposed_due_back = datetime.date.today() + datetime.timedelta(weeks=2)
@@ -131,6 +455,58 @@ def renew_book_librarian(request, pk):
     )
 
 
+@login_required
+@require_POST
+def checkout_book(request, pk):
+    book = get_object_or_404(Book.objects.only("pk"), pk=pk)
+    try:
+        loans.checkout(book.pk, request.user)
+    except loans.LoanError as error:
+        messages.error(request, str(error))
+        return HttpResponseRedirect(book.get_absolute_url())
+    messages.success(request, "You have borrowed a copy of this book.")
+    return HttpResponseRedirect(reverse("my-borrowed"))
+
+
+@login_required
+@require_POST
+def reserve_book(request, pk):
+    book = get_object_or_404(Book.objects.only("pk"), pk=pk)
+    try:
+        loans.reserve(book.pk, request.user)
+    except loans.LoanError as error:
+        messages.error(request, str(error))
+    else:
+        messages.success(request, "A copy is being held for you.")
+    return HttpResponseRedirect(book.get_absolute_url())
+
+
+@login_required
+@require_POST
+def cancel_hold(request, pk):
+    hold = get_object_or_404(BookInstance.objects.only("pk"), pk=pk)
+    try:
+        loans.cancel_hold(hold.pk, request.user)
+    except loans.LoanError as error:
+        messages.error(request, str(error))
+    else:
+        messages.success(request, "Your hold has been cancelled.")
+    return HttpResponseRedirect(reverse("my-borrowed"))
+
+
+@permission_required("catalog.can_mark_returned")
+@require_POST
+def return_book_librarian(request, pk):
+    book_inst = get_object_or_404(BookInstance.objects.only("pk"), pk=pk)
+    try:
+        loans.return_copy(book_inst.pk)
+    except loans.LoanError as error:
+        messages.error(request, str(error))
+    else:
+        messages.success(request, "The copy has been returned.")
+    return HttpResponseRedirect(reverse("all-borrowed"))
+
+
 class AuthorCreate(PermissionRequiredMixin, CreateView):
     model = Author
     template_name = "authors/author_form.html"
@@ -0,0 +1,63 @@
+"""
+Per-worker values published to the shared cache, such as the request timings
+in :mod:`catalog.instrumentation`, for a management command to merge.
+
+Each worker process stores its value under its own key, which expires unless
+the worker publishes again, and lists itself in the registry's worker list.
+The list expires too, and workers whose value has expired are dropped from
+it whenever a worker registers or the values are collected, so workers that
+exited or restarted don't pile up. Updating the list is a read-modify-write;
+a worker whose registration is lost to a concurrent one registers again on
+its next publish.
+"""
+import os
+
+from django.conf import settings
+from django.core.cache import caches
+
+TIMEOUT = 60 * 60 * 24
+
+
+def get_cache():
+    return caches[getattr(settings, "CATALOG_CACHE", "default")]
+
+
+def worker_name():
+    return "%s-%s" % (os.uname().nodename, os.getpid())
+
+
+class WorkerRegistry:
+    def __init__(self, prefix, timeout=TIMEOUT):
+        self.workers_key = "%s:workers" % prefix
+        self.value_key = ("%s:" % prefix) + "%s"
+        self.timeout = timeout
+
+    def publish(self, value):
+        cache = get_cache()
+        worker = worker_name()
+        cache.set(self.value_key % worker, value, self.timeout)
+        workers = cache.get(self.workers_key) or []
+        if worker in workers:
+            cache.touch(self.workers_key, self.timeout)
+        else:
+            self.save_workers(cache, list(self.live_values(cache, workers)) + [worker])
+
+    def collect(self):
+        """Return each live worker's value by worker name."""
+        cache = get_cache()
+        workers = cache.get(self.workers_key) or []
+        values = self.live_values(cache, workers)
+        if len(values) < len(workers):
+            self.save_workers(cache, list(values))
+        return values
+
+    def live_values(self, cache, workers):
+        values = cache.get_many([self.value_key % worker for worker in workers])
+        return {
+            worker: values[self.value_key % worker]
+            for worker in workers
+            if self.value_key % worker in values
+        }
+
+    def save_workers(self, cache, workers):
+        cache.set(self.workers_key, workers, self.timeout)